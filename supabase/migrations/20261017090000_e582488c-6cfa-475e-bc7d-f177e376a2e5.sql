@@ -0,0 +1,89 @@
+-- Membership cache support for the Telegram userbot
+-- The bot keeps premium group / admin membership in memory and polls
+-- cache_versions to find out when the underlying tables changed
+
+CREATE TABLE IF NOT EXISTS public.cache_versions (
+  name TEXT NOT NULL PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.cache_versions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Admins can view cache versions" 
+ON public.cache_versions 
+FOR SELECT 
+USING (has_role(auth.uid(), 'admin'::app_role));
+
+INSERT INTO public.cache_versions (name) VALUES ('premium_groups'), ('telegram_admins')
+ON CONFLICT (name) DO NOTHING;
+
+-- Bump the version named by the trigger argument on any change
+CREATE OR REPLACE FUNCTION public.bump_cache_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+BEGIN
+  INSERT INTO public.cache_versions (name, version, updated_at)
+  VALUES (TG_ARGV[0], 1, now())
+  ON CONFLICT (name) DO UPDATE
+  SET version = public.cache_versions.version + 1,
+      updated_at = now();
+  RETURN NULL;
+END;
+$function$;
+
+CREATE TRIGGER bump_premium_groups_cache_version
+AFTER INSERT OR UPDATE OR DELETE ON public.premium_groups
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.bump_cache_version('premium_groups');
+
+CREATE TRIGGER bump_admin_telegram_users_cache_version
+AFTER INSERT OR UPDATE OR DELETE ON public.admin_telegram_users
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.bump_cache_version('telegram_admins');
+
+-- Admin status also depends on the admin role in user_roles
+CREATE TRIGGER bump_user_roles_cache_version
+AFTER INSERT OR UPDATE OR DELETE ON public.user_roles
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.bump_cache_version('telegram_admins');
+
+-- Same membership rule as is_telegram_admin(), returned as a full list
+CREATE OR REPLACE FUNCTION public.get_telegram_admin_ids()
+RETURNS TABLE(telegram_user_id BIGINT)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+BEGIN
+  RETURN QUERY
+  SELECT DISTINCT atu.telegram_user_id
+  FROM public.admin_telegram_users atu
+  JOIN public.user_roles ur ON atu.user_id = ur.user_id
+  WHERE atu.is_active = true
+  AND ur.role = 'admin'::app_role;
+END;
+$function$;
+
+-- Admin ids and version bumps are for the bot's service role only
+DO $$
+DECLARE
+  r TEXT;
+BEGIN
+  FOREACH r IN ARRAY ARRAY['anon', 'authenticated'] LOOP
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = r) THEN
+      EXECUTE format('REVOKE ALL ON FUNCTION public.get_telegram_admin_ids() FROM %I', r);
+      EXECUTE format('REVOKE ALL ON FUNCTION public.bump_cache_version() FROM %I', r);
+    END IF;
+  END LOOP;
+  IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'service_role') THEN
+    GRANT EXECUTE ON FUNCTION public.get_telegram_admin_ids() TO service_role;
+  END IF;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.get_telegram_admin_ids() FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.bump_cache_version() FROM PUBLIC;
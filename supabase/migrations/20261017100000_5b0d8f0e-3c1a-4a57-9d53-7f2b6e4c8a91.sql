@@ -0,0 +1,176 @@
+-- Shared upload job queue for running several Telegram userbot instances
+-- In shared mode ingestion only enqueues a pending telegram_uploads row;
+-- workers on any instance claim jobs with a lease (FOR UPDATE SKIP LOCKED),
+-- extend it with heartbeats and a job whose lease expires is picked up again
+
+ALTER TABLE public.telegram_uploads
+  ADD COLUMN IF NOT EXISTS job_payload JSONB,
+  ADD COLUMN IF NOT EXISTS claimed_by TEXT,
+  ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE,
+  ADD COLUMN IF NOT EXISTS claim_attempts INTEGER NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_telegram_uploads_claimable
+ON public.telegram_uploads (created_at)
+WHERE job_payload IS NOT NULL AND upload_status IN ('pending', 'processing');
+
+-- Insert a pending job; a file that is already logged is not queued twice
+CREATE OR REPLACE FUNCTION public.enqueue_telegram_upload(p_upload JSONB)
+RETURNS TABLE(upload_id UUID, created BOOLEAN)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+DECLARE
+  v_id UUID;
+BEGIN
+  INSERT INTO public.telegram_uploads (
+    telegram_file_id, telegram_file_unique_id, telegram_message_id, telegram_chat_id,
+    telegram_user_id, original_filename, file_size, mime_type, upload_status, job_payload
+  )
+  VALUES (
+    p_upload->>'telegram_file_id',
+    p_upload->>'telegram_file_unique_id',
+    (p_upload->>'telegram_message_id')::BIGINT,
+    (p_upload->>'telegram_chat_id')::BIGINT,
+    (p_upload->>'telegram_user_id')::BIGINT,
+    p_upload->>'original_filename',
+    (p_upload->>'file_size')::BIGINT,
+    p_upload->>'mime_type',
+    'pending',
+    p_upload->'job_payload'
+  )
+  ON CONFLICT (telegram_file_unique_id) DO NOTHING
+  RETURNING id INTO v_id;
+
+  IF v_id IS NOT NULL THEN
+    RETURN QUERY SELECT v_id, true;
+    RETURN;
+  END IF;
+
+  RETURN QUERY
+  SELECT tu.id, false
+  FROM public.telegram_uploads tu
+  WHERE tu.telegram_file_unique_id = p_upload->>'telegram_file_unique_id';
+END;
+$function$;
+
+-- Claim up to p_limit jobs for a worker; rows locked by another claimer are skipped
+CREATE OR REPLACE FUNCTION public.claim_telegram_upload_jobs(
+  p_worker_id TEXT,
+  p_limit INTEGER DEFAULT 1,
+  p_lease_seconds INTEGER DEFAULT 300,
+  p_max_attempts INTEGER DEFAULT 3
+)
+RETURNS SETOF public.telegram_uploads
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+BEGIN
+  -- Jobs whose worker died too many times are failed rather than claimed again
+  UPDATE public.telegram_uploads tu
+  SET upload_status = 'failed',
+      error_message = 'Upload lease expired after ' || tu.claim_attempts || ' attempts',
+      claimed_by = NULL,
+      lease_expires_at = NULL,
+      processed_at = now(),
+      updated_at = now()
+  WHERE tu.id IN (
+    SELECT s.id
+    FROM public.telegram_uploads s
+    WHERE s.job_payload IS NOT NULL
+    AND s.upload_status = 'processing'
+    AND s.lease_expires_at < now()
+    AND s.claim_attempts >= p_max_attempts
+    FOR UPDATE SKIP LOCKED
+  );
+
+  RETURN QUERY
+  UPDATE public.telegram_uploads tu
+  SET upload_status = 'processing',
+      claimed_by = p_worker_id,
+      lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+      claim_attempts = tu.claim_attempts + 1,
+      updated_at = now()
+  WHERE tu.id IN (
+    SELECT c.id
+    FROM public.telegram_uploads c
+    WHERE c.job_payload IS NOT NULL
+    AND (
+      c.upload_status = 'pending'
+      OR (c.upload_status = 'processing' AND c.lease_expires_at < now() AND c.claim_attempts < p_max_attempts)
+    )
+    ORDER BY c.created_at
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING tu.*;
+END;
+$function$;
+
+-- Extend the lease on jobs a worker still holds; ids missing from the result were lost
+CREATE OR REPLACE FUNCTION public.heartbeat_telegram_upload_jobs(
+  p_worker_id TEXT,
+  p_ids UUID[],
+  p_lease_seconds INTEGER DEFAULT 300
+)
+RETURNS TABLE(upload_id UUID)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+BEGIN
+  RETURN QUERY
+  UPDATE public.telegram_uploads tu
+  SET lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+  WHERE tu.id = ANY(p_ids)
+  AND tu.claimed_by = p_worker_id
+  RETURNING tu.id;
+END;
+$function$;
+
+-- Hand unfinished jobs back to the queue on graceful shutdown
+CREATE OR REPLACE FUNCTION public.release_telegram_upload_jobs(p_worker_id TEXT, p_ids UUID[])
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+DECLARE
+  v_count INTEGER;
+BEGIN
+  UPDATE public.telegram_uploads tu
+  SET upload_status = 'pending',
+      claimed_by = NULL,
+      lease_expires_at = NULL,
+      claim_attempts = GREATEST(tu.claim_attempts - 1, 0),
+      updated_at = now()
+  WHERE tu.id = ANY(p_ids)
+  AND tu.claimed_by = p_worker_id
+  AND tu.upload_status = 'processing';
+
+  GET DIAGNOSTICS v_count = ROW_COUNT;
+  RETURN v_count;
+END;
+$function$;
+
+-- Queue functions are for the bot's service role only
+DO $$
+DECLARE
+  r TEXT;
+BEGIN
+  FOREACH r IN ARRAY ARRAY['anon', 'authenticated'] LOOP
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = r) THEN
+      EXECUTE format('REVOKE EXECUTE ON FUNCTION public.enqueue_telegram_upload(JSONB) FROM %I', r);
+      EXECUTE format('REVOKE EXECUTE ON FUNCTION public.claim_telegram_upload_jobs(TEXT, INTEGER, INTEGER, INTEGER) FROM %I', r);
+      EXECUTE format('REVOKE EXECUTE ON FUNCTION public.heartbeat_telegram_upload_jobs(TEXT, UUID[], INTEGER) FROM %I', r);
+      EXECUTE format('REVOKE EXECUTE ON FUNCTION public.release_telegram_upload_jobs(TEXT, UUID[]) FROM %I', r);
+    END IF;
+  END LOOP;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.enqueue_telegram_upload(JSONB) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION public.claim_telegram_upload_jobs(TEXT, INTEGER, INTEGER, INTEGER) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION public.heartbeat_telegram_upload_jobs(TEXT, UUID[], INTEGER) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION public.release_telegram_upload_jobs(TEXT, UUID[]) FROM PUBLIC;
@@ -0,0 +1,63 @@
+-- Upload counts per time bucket for seeding the userbot's rolling /stats counters
+-- Buckets are floor(epoch(created_at) / p_bucket_seconds), the same numbering the bot uses,
+-- so the bot loads one small row per bucket instead of every telegram_uploads row of the week
+
+CREATE INDEX IF NOT EXISTS idx_telegram_uploads_created_at
+ON public.telegram_uploads (created_at);
+
+CREATE OR REPLACE FUNCTION public.get_upload_stat_buckets(
+  p_since TIMESTAMP WITH TIME ZONE,
+  p_bucket_seconds INTEGER DEFAULT 3600
+)
+RETURNS TABLE(
+  bucket BIGINT,
+  uploads BIGINT,
+  bytes BIGINT,
+  pending BIGINT,
+  processing BIGINT,
+  retrying BIGINT,
+  completed BIGINT,
+  failed BIGINT,
+  processing_seconds DOUBLE PRECISION,
+  timed BIGINT
+)
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+BEGIN
+  RETURN QUERY
+  SELECT
+    floor(extract(epoch FROM tu.created_at) / p_bucket_seconds)::BIGINT,
+    count(*),
+    COALESCE(sum(tu.file_size), 0)::BIGINT,
+    count(*) FILTER (WHERE tu.upload_status = 'pending'),
+    count(*) FILTER (WHERE tu.upload_status = 'processing'),
+    count(*) FILTER (WHERE tu.upload_status = 'retrying'),
+    count(*) FILTER (WHERE tu.upload_status = 'completed'),
+    count(*) FILTER (WHERE tu.upload_status = 'failed'),
+    COALESCE(sum(extract(epoch FROM tu.processed_at - tu.created_at))
+      FILTER (WHERE tu.upload_status = 'completed' AND tu.processed_at IS NOT NULL), 0)::DOUBLE PRECISION,
+    count(*) FILTER (WHERE tu.upload_status = 'completed' AND tu.processed_at IS NOT NULL)
+  FROM public.telegram_uploads tu
+  WHERE tu.created_at >= p_since
+  GROUP BY 1
+  ORDER BY 1;
+END;
+$function$;
+
+-- Upload statistics are for the bot's service role only
+DO $$
+DECLARE
+  r TEXT;
+BEGIN
+  FOREACH r IN ARRAY ARRAY['anon', 'authenticated'] LOOP
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = r) THEN
+      EXECUTE format('REVOKE EXECUTE ON FUNCTION public.get_upload_stat_buckets(TIMESTAMP WITH TIME ZONE, INTEGER) FROM %I', r);
+    END IF;
+  END LOOP;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.get_upload_stat_buckets(TIMESTAMP WITH TIME ZONE, INTEGER) FROM PUBLIC;
@@ -0,0 +1,202 @@
+-- Aggregate functions for the userbot's health checks, /stats and analytics
+-- Each returns grouped counts, sums and percentiles in one round-trip, so the bot
+-- no longer downloads telegram_uploads / analytics_events rows to count them in Python
+
+-- Upload queue depth and the failure rate of uploads created in the last p_window_seconds
+CREATE OR REPLACE FUNCTION public.get_upload_health_metrics(p_window_seconds INTEGER DEFAULT 3600)
+RETURNS TABLE(
+  active_uploads BIGINT,
+  queue_size BIGINT,
+  retrying_uploads BIGINT,
+  window_uploads BIGINT,
+  window_failed BIGINT,
+  error_rate DOUBLE PRECISION
+)
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+DECLARE
+  v_since TIMESTAMP WITH TIME ZONE := now() - make_interval(secs => p_window_seconds);
+BEGIN
+  RETURN QUERY
+  SELECT
+    s.active_uploads,
+    s.queue_size,
+    s.retrying_uploads,
+    s.window_uploads,
+    s.window_failed,
+    CASE WHEN s.window_uploads > 0 THEN s.window_failed * 100.0 / s.window_uploads ELSE 0 END::DOUBLE PRECISION
+  FROM (
+    SELECT
+      count(*) FILTER (WHERE tu.upload_status = 'processing') AS active_uploads,
+      count(*) FILTER (WHERE tu.upload_status = 'pending') AS queue_size,
+      count(*) FILTER (WHERE tu.upload_status = 'retrying') AS retrying_uploads,
+      count(*) FILTER (WHERE tu.created_at >= v_since) AS window_uploads,
+      count(*) FILTER (WHERE tu.created_at >= v_since AND tu.upload_status = 'failed') AS window_failed
+    FROM public.telegram_uploads tu
+    WHERE tu.upload_status IN ('processing', 'pending', 'retrying')
+    OR tu.created_at >= v_since
+  ) s;
+END;
+$function$;
+
+-- Groups with the most uploads since p_since (titles from premium_groups when known)
+CREATE OR REPLACE FUNCTION public.get_top_upload_groups(
+  p_since TIMESTAMP WITH TIME ZONE,
+  p_limit INTEGER DEFAULT 5
+)
+RETURNS TABLE(
+  telegram_chat_id BIGINT,
+  chat_title TEXT,
+  uploads BIGINT,
+  completed BIGINT,
+  bytes BIGINT
+)
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+BEGIN
+  RETURN QUERY
+  SELECT
+    tu.telegram_chat_id,
+    max(pg.chat_title),
+    count(*),
+    count(*) FILTER (WHERE tu.upload_status = 'completed'),
+    COALESCE(sum(tu.file_size), 0)::BIGINT
+  FROM public.telegram_uploads tu
+  LEFT JOIN public.premium_groups pg ON pg.chat_id = tu.telegram_chat_id
+  WHERE tu.created_at >= p_since
+  GROUP BY tu.telegram_chat_id
+  ORDER BY count(*) DESC
+  LIMIT p_limit;
+END;
+$function$;
+
+-- Upload event analytics since p_since: totals, duration percentiles, top file and error types, daily completions
+CREATE OR REPLACE FUNCTION public.get_upload_event_analytics(p_since TIMESTAMP WITH TIME ZONE)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+DECLARE
+  v_result JSONB;
+BEGIN
+  WITH events AS (
+    SELECT ae.event_type, ae.event_data, ae.recorded_at
+    FROM public.analytics_events ae
+    WHERE ae.event_type IN ('upload_started', 'upload_completed', 'upload_error')
+    AND ae.recorded_at >= p_since
+  ),
+  completed AS (
+    SELECT
+      (e.event_data->>'file_size')::NUMERIC AS file_size,
+      (e.event_data->>'duration_seconds')::DOUBLE PRECISION AS duration,
+      COALESCE(
+        e.event_data->>'file_extension',
+        lower(substring(e.event_data->>'file_name' FROM '\.([^.]+)$')),
+        'unknown'
+      ) AS file_extension,
+      e.recorded_at
+    FROM events e
+    WHERE e.event_type = 'upload_completed'
+  )
+  SELECT jsonb_build_object(
+    'summary', (
+      SELECT jsonb_build_object(
+        'uploads_started', count(*) FILTER (WHERE e.event_type = 'upload_started'),
+        'uploads_completed', count(*) FILTER (WHERE e.event_type = 'upload_completed'),
+        'uploads_failed', count(*) FILTER (WHERE e.event_type = 'upload_error')
+      )
+      FROM events e
+    ) || (
+      SELECT jsonb_build_object(
+        'total_size', COALESCE(sum(c.file_size), 0),
+        'avg_duration_seconds', COALESCE(avg(c.duration), 0),
+        'p50_duration_seconds', COALESCE(percentile_cont(0.5) WITHIN GROUP (ORDER BY c.duration), 0),
+        'p95_duration_seconds', COALESCE(percentile_cont(0.95) WITHIN GROUP (ORDER BY c.duration), 0)
+      )
+      FROM completed c
+    ),
+    'file_types', (
+      SELECT COALESCE(jsonb_object_agg(t.file_extension, t.uploads), '{}'::JSONB)
+      FROM (
+        SELECT c.file_extension, count(*) AS uploads
+        FROM completed c
+        GROUP BY c.file_extension
+        ORDER BY count(*) DESC
+        LIMIT 10
+      ) t
+    ),
+    'error_types', (
+      SELECT COALESCE(jsonb_object_agg(t.error_type, t.errors), '{}'::JSONB)
+      FROM (
+        SELECT e.event_data->>'error_type' AS error_type, count(*) AS errors
+        FROM events e
+        WHERE e.event_type = 'upload_error'
+        AND e.event_data ? 'error_type'
+        GROUP BY 1
+        ORDER BY count(*) DESC
+        LIMIT 5
+      ) t
+    ),
+    'daily_uploads', (
+      SELECT COALESCE(jsonb_object_agg(d.day, d.uploads), '{}'::JSONB)
+      FROM (
+        SELECT to_char(c.recorded_at AT TIME ZONE 'UTC', 'YYYY-MM-DD') AS day, count(*) AS uploads
+        FROM completed c
+        GROUP BY 1
+      ) d
+    )
+  ) INTO v_result;
+
+  RETURN v_result;
+END;
+$function$;
+
+-- Messages per group from group_activity events since p_since
+CREATE OR REPLACE FUNCTION public.get_group_activity(p_since TIMESTAMP WITH TIME ZONE)
+RETURNS TABLE(group_name TEXT, messages BIGINT)
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+BEGIN
+  RETURN QUERY
+  SELECT
+    COALESCE(ae.event_data->>'group_name', 'Unknown'),
+    sum(COALESCE((ae.event_data->>'message_count')::BIGINT, 1))::BIGINT
+  FROM public.analytics_events ae
+  WHERE ae.event_type = 'group_activity'
+  AND ae.recorded_at >= p_since
+  GROUP BY 1
+  ORDER BY 2 DESC;
+END;
+$function$;
+
+-- Aggregates are for the bot's service role only
+DO $$
+DECLARE
+  r TEXT;
+BEGIN
+  FOREACH r IN ARRAY ARRAY['anon', 'authenticated'] LOOP
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = r) THEN
+      EXECUTE format('REVOKE EXECUTE ON FUNCTION public.get_upload_health_metrics(INTEGER) FROM %I', r);
+      EXECUTE format('REVOKE EXECUTE ON FUNCTION public.get_top_upload_groups(TIMESTAMP WITH TIME ZONE, INTEGER) FROM %I', r);
+      EXECUTE format('REVOKE EXECUTE ON FUNCTION public.get_upload_event_analytics(TIMESTAMP WITH TIME ZONE) FROM %I', r);
+      EXECUTE format('REVOKE EXECUTE ON FUNCTION public.get_group_activity(TIMESTAMP WITH TIME ZONE) FROM %I', r);
+    END IF;
+  END LOOP;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.get_upload_health_metrics(INTEGER) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION public.get_top_upload_groups(TIMESTAMP WITH TIME ZONE, INTEGER) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION public.get_upload_event_analytics(TIMESTAMP WITH TIME ZONE) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION public.get_group_activity(TIMESTAMP WITH TIME ZONE) FROM PUBLIC;
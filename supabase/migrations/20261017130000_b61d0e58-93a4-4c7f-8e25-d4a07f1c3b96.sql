@@ -0,0 +1,53 @@
+-- Batched telegram_uploads updates for the userbot's write-behind buffer
+-- p_rows is a JSON array of {"id": ..., <column>: <value>, ...}; only the keys present in a
+-- row are written, so one call applies the coalesced status/field changes of many uploads
+
+CREATE OR REPLACE FUNCTION public.update_telegram_uploads(p_rows JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path TO 'public'
+AS $function$
+DECLARE
+  v_count INTEGER;
+BEGIN
+  UPDATE public.telegram_uploads tu
+  SET upload_status = CASE WHEN u.fields ? 'upload_status' THEN u.upload_status ELSE tu.upload_status END,
+      error_message = CASE WHEN u.fields ? 'error_message' THEN u.error_message ELSE tu.error_message END,
+      processed_at = CASE WHEN u.fields ? 'processed_at' THEN u.processed_at ELSE tu.processed_at END,
+      doodstream_file_code = CASE WHEN u.fields ? 'doodstream_file_code' THEN u.doodstream_file_code ELSE tu.doodstream_file_code END,
+      video_id = CASE WHEN u.fields ? 'video_id' THEN u.video_id ELSE tu.video_id END,
+      updated_at = now()
+  FROM (
+    SELECT r.*, e.fields
+    FROM jsonb_array_elements(p_rows) AS e(fields)
+    CROSS JOIN LATERAL jsonb_to_record(e.fields) AS r(
+      id UUID,
+      upload_status TEXT,
+      error_message TEXT,
+      processed_at TIMESTAMP WITH TIME ZONE,
+      doodstream_file_code TEXT,
+      video_id UUID
+    )
+  ) u
+  WHERE tu.id = u.id;
+
+  GET DIAGNOSTICS v_count = ROW_COUNT;
+  RETURN v_count;
+END;
+$function$;
+
+-- Writes are for the bot's service role only
+DO $$
+DECLARE
+  r TEXT;
+BEGIN
+  FOREACH r IN ARRAY ARRAY['anon', 'authenticated'] LOOP
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = r) THEN
+      EXECUTE format('REVOKE EXECUTE ON FUNCTION public.update_telegram_uploads(JSONB) FROM %I', r);
+    END IF;
+  END LOOP;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.update_telegram_uploads(JSONB) FROM PUBLIC;
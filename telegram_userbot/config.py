@@ -19,6 +19,10 @@ class Config:
         self.SUPABASE_URL: str = os.getenv('SUPABASE_URL', 'https://agsqdznjjxptiyorljtv.supabase.co')
         self.SUPABASE_SERVICE_ROLE_KEY: str = os.getenv('SUPABASE_SERVICE_ROLE_KEY', '')
         self.SUPABASE_ANON_KEY: str = os.getenv('SUPABASE_ANON_KEY', '')
+        self.SUPABASE_MAX_CONNECTIONS: int = int(os.getenv('SUPABASE_MAX_CONNECTIONS', '20'))
+        # Buffered telegram_uploads updates are written every N seconds or once this many rows are pending
+        self.UPLOAD_WRITE_INTERVAL: float = float(os.getenv('UPLOAD_WRITE_INTERVAL', '1.0'))
+        self.UPLOAD_WRITE_BATCH: int = int(os.getenv('UPLOAD_WRITE_BATCH', '50'))
         
         # Doodstream API Keys
         self.DOODSTREAM_API_KEY: str = os.getenv('DOODSTREAM_API_KEY', '')
@@ -1,89 +1,595 @@
+import logging
 import os
+import random
+import secrets
+import time
 from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, AsyncIterator, Optional
 import asyncio
 
 import httpx
 from dotenv import load_dotenv
 
+from utils.circuit_breaker import CircuitBreaker
+from utils.metrics import REGISTRY, MetricFamily
+
 HERE = Path(__file__).parent
 load_dotenv(HERE / ".env")
 
+logger = logging.getLogger(__name__)
+
 DOOD_1 = os.environ.get("DOODSTREAM_API_KEY", "").strip()
 DOOD_2 = os.environ.get("DOODSTREAM_PREMIUM_API_KEY", "").strip()
 DOOD_DOMAIN = "https://doodapi.com"  # default
 
+# Streaming relay: number of in-memory chunk slots between Telegram and Doodstream
+# (Pyrogram stream_media yields 1 MiB chunks, so this is roughly the buffer size in MiB)
+RELAY_BUFFER_CHUNKS = int(os.environ.get("DOOD_RELAY_BUFFER_CHUNKS", "8"))
+# Read size for local files uploaded with dood_upload_file_all
+FILE_CHUNK_SIZE = 1024 * 1024
+# Seconds an /api/upload/server answer is reused for the same account
+UPLOAD_SERVER_TTL = int(os.environ.get("DOOD_UPLOAD_SERVER_TTL", "600"))
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# -------- Pooled HTTP clients ----------
+# Created lazily inside the running event loop and reused for every call, so
+# DNS/TCP/TLS setup is paid once per connection instead of once per request.
+# API calls and uploads use separate pools so long uploads never starve API calls.
+_api_client: Optional[httpx.AsyncClient] = None
+_upload_client: Optional[httpx.AsyncClient] = None
+
+_http_stats = {
+    "requests": 0,
+    "new_connections": 0,
+    "tls_handshakes": 0,
+    "http2_requests": 0,
+    "upload_server_hits": 0,
+    "upload_server_misses": 0,
+    "upload_server_invalidations": 0,
+}
+
+async def _trace(event_name: str, info: Dict[str, Any]) -> None:
+    # httpcore trace events: a connect means a new connection, a send means a request
+    if event_name == "connection.connect_tcp.complete":
+        _http_stats["new_connections"] += 1
+    elif event_name == "connection.start_tls.complete":
+        _http_stats["tls_handshakes"] += 1
+    elif event_name == "http11.send_request_headers.started":
+        _http_stats["requests"] += 1
+    elif event_name == "http2.send_request_headers.started":
+        _http_stats["requests"] += 1
+        _http_stats["http2_requests"] += 1
+
+_TRACE = {"trace": _trace}
+
+def _api() -> httpx.AsyncClient:
+    global _api_client
+    if _api_client is None or _api_client.is_closed:
+        _api_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60, connect=10),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+            http2=HTTP2_AVAILABLE,
+        )
+    return _api_client
+
+def _uploads() -> httpx.AsyncClient:
+    global _upload_client
+    if _upload_client is None or _upload_client.is_closed:
+        _upload_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(None, connect=15),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+            http2=HTTP2_AVAILABLE,
+        )
+    return _upload_client
+
+async def aclose_clients() -> None:
+    """Close the pooled clients (call on shutdown)"""
+    global _api_client, _upload_client
+    for client in (_api_client, _upload_client):
+        if client is not None:
+            await client.aclose()
+    _api_client = None
+    _upload_client = None
+
+def get_http_stats() -> Dict[str, Any]:
+    """Request / connection counters for the pooled clients"""
+    stats = dict(_http_stats)
+    stats["reused_connections"] = max(0, stats["requests"] - stats["new_connections"])
+    stats["reuse_ratio"] = (stats["reused_connections"] / stats["requests"]) if stats["requests"] else 0.0
+    stats["http2"] = HTTP2_AVAILABLE
+    return stats
+
+# -------- Account pool ----------
+# DOODSTREAM_API_KEY / DOODSTREAM_PREMIUM_API_KEY stay acc1 / acc2 (mirrors). More
+# accounts come from DOODSTREAM_ACCOUNTS, comma separated
+#   label:api_key[:role[:weight[:concurrency]]]
+# role "mirror" receives every upload; each upload also goes to ONE "shard",
+# picked at random in proportion to weight x live throughput x health, among
+# shards with enough remaining storage.
+DOOD_ACCOUNTS = os.environ.get("DOODSTREAM_ACCOUNTS", "").strip()
+ACCOUNT_INFO_TTL = int(os.environ.get("DOOD_ACCOUNT_INFO_TTL", "900"))
+# Per-account circuit breaker: open after N consecutive failures, probe again after the timeout
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_SECONDS = float(os.environ.get("BREAKER_RECOVERY_SECONDS", "60"))
+
+ROLE_MIRROR = "mirror"
+ROLE_SHARD = "shard"
+
+# Pool accounts behind the upload pipeline's two providers (the edge function's
+# dual upload sends "regular" to DOODSTREAM_API_KEY and "premium" to the premium key)
+PROVIDER_ACCOUNTS = {
+    "regular": os.environ.get("DOOD_REGULAR_ACCOUNT", "acc1").strip(),
+    "premium": os.environ.get("DOOD_PREMIUM_ACCOUNT", "acc2").strip(),
+}
+
+EWMA_ALPHA = 0.3
+DEFAULT_THROUGHPUT = 5 * 1024 * 1024  # bytes/s assumed until an account has history
+
+class DoodAccount:
+    """One Doodstream API key with its routing settings and live upload stats"""
+
+    def __init__(self, label: str, api_key: str, role: str = ROLE_MIRROR, weight: float = 1.0, concurrency: int = 2):
+        self.label = label
+        self.api_key = api_key
+        self.role = role if role in (ROLE_MIRROR, ROLE_SHARD) else ROLE_MIRROR
+        self.weight = max(0.0, weight)
+        self.concurrency = max(1, concurrency)
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.in_flight = 0
+        self.breaker = CircuitBreaker(f"dood:{label}", BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_SECONDS)
+
+        self.uploads = 0
+        self.failures = 0
+        self.throughput: Optional[float] = None  # EWMA bytes/s of successful uploads
+        self.error_rate = 0.0                     # EWMA of failures (0..1)
+        self.storage_left: Optional[int] = None   # bytes; None = unknown / unlimited
+        self.info_fetched_at = 0.0
+
+    def record(self, success: bool, nbytes: Optional[int] = None, seconds: float = 0.0) -> None:
+        self.uploads += 1
+        self.error_rate = EWMA_ALPHA * (0.0 if success else 1.0) + (1 - EWMA_ALPHA) * self.error_rate
+        if not success:
+            self.failures += 1
+            self.breaker.record_failure()
+            return
+        self.breaker.record_success()
+        if nbytes and seconds > 0:
+            rate = nbytes / seconds
+            self.throughput = rate if self.throughput is None else EWMA_ALPHA * rate + (1 - EWMA_ALPHA) * self.throughput
+        if nbytes and self.storage_left is not None:
+            self.storage_left = max(0, self.storage_left - nbytes)
+
+    def has_room_for(self, size: Optional[int]) -> bool:
+        return self.storage_left is None or not size or self.storage_left >= size
+
+    def score(self) -> float:
+        """Expected share of work: faster, healthier, less busy accounts score higher"""
+        throughput = self.throughput or DEFAULT_THROUGHPUT
+        # Keep a floor so a failing account still gets the odd probe and can recover
+        health = 1.0 - 0.9 * self.error_rate
+        free = (self.concurrency - min(self.in_flight, self.concurrency - 1)) / self.concurrency
+        return self.weight * throughput * health * free
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "label": self.label,
+            "role": self.role,
+            "weight": self.weight,
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "uploads": self.uploads,
+            "failures": self.failures,
+            "throughput_mbps": round((self.throughput or 0) * 8 / 1_000_000, 2),
+            "error_rate": round(self.error_rate, 3),
+            "storage_left": self.storage_left,
+            "circuit": self.breaker.state,
+        }
+
+def _parse_account_spec(spec: str) -> Optional[DoodAccount]:
+    parts = [p.strip() for p in spec.split(":")]
+    if len(parts) < 2 or not parts[0] or not parts[1]:
+        return None
+    try:
+        role = parts[2] if len(parts) > 2 and parts[2] else ROLE_MIRROR
+        weight = float(parts[3]) if len(parts) > 3 and parts[3] else 1.0
+        concurrency = int(parts[4]) if len(parts) > 4 and parts[4] else 2
+    except ValueError:
+        return None
+    return DoodAccount(parts[0], parts[1], role, weight, concurrency)
+
+_pool: Optional[List[DoodAccount]] = None
+
+def _account_pool() -> List[DoodAccount]:
+    global _pool
+    if _pool is None:
+        pool = []
+        if DOOD_1:
+            pool.append(DoodAccount("acc1", DOOD_1))
+        if DOOD_2:
+            pool.append(DoodAccount("acc2", DOOD_2))
+        for spec in filter(None, (s.strip() for s in DOOD_ACCOUNTS.split(","))):
+            account = _parse_account_spec(spec)
+            if account is None:
+                logger.warning(f"Ignoring invalid DOODSTREAM_ACCOUNTS entry: {spec.split(':')[0]}")
+                continue
+            if any(a.label == account.label or a.api_key == account.api_key for a in pool):
+                continue
+            pool.append(account)
+        _pool = pool
+    return _pool
+
 def _accounts() -> List[Tuple[str, str]]:
-    accs = []
-    if DOOD_1:
-        accs.append(("acc1", DOOD_1))
-    if DOOD_2:
-        accs.append(("acc2", DOOD_2))
-    return accs
+    return [(a.label, a.api_key) for a in _account_pool()]
+
+def get_account(label: str) -> Optional[DoodAccount]:
+    for account in _account_pool():
+        if account.label == label:
+            return account
+    return None
 
 def has_any_dood_account() -> bool:
     return len(_accounts()) > 0
 
+def get_account_stats() -> List[Dict[str, Any]]:
+    return [a.stats() for a in _account_pool()]
+
+# -------- Metrics ----------
+UPLOAD_SECONDS = REGISTRY.histogram("doodstream_upload_duration_seconds", "Doodstream file upload time per account", ("account",))
+UPLOAD_BYTES = REGISTRY.counter("doodstream_upload_bytes_total", "Bytes uploaded to Doodstream per account", ("account",))
+
+_CIRCUIT_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+def _collect_metrics() -> List[MetricFamily]:
+    """Account pool and HTTP pool state, read at scrape time"""
+    uploads = MetricFamily("doodstream_account_uploads_total", "counter", "Uploads per account and outcome")
+    in_flight = MetricFamily("doodstream_account_in_flight", "gauge", "Uploads currently running per account")
+    throughput = MetricFamily("doodstream_account_throughput_bytes", "gauge", "EWMA upload throughput per account (bytes/s)")
+    storage = MetricFamily("doodstream_account_storage_left_bytes", "gauge", "Remaining storage per account (unknown accounts omitted)")
+    circuit = MetricFamily("doodstream_account_circuit_state", "gauge", "Account circuit breaker (0 closed, 1 half-open, 2 open)")
+    for account in _account_pool():
+        uploads.add(account.uploads - account.failures, account=account.label, outcome="success")
+        uploads.add(account.failures, account=account.label, outcome="failure")
+        in_flight.add(account.in_flight, account=account.label)
+        throughput.add(account.throughput or 0.0, account=account.label)
+        if account.storage_left is not None:
+            storage.add(account.storage_left, account=account.label)
+        circuit.add(_CIRCUIT_VALUES.get(account.breaker.state, 0), account=account.label)
+
+    http = get_http_stats()
+    return [
+        uploads, in_flight, throughput, storage, circuit,
+        MetricFamily("doodstream_http_requests_total", "counter", "Requests sent by the pooled Doodstream clients").add(http["requests"]),
+        MetricFamily("doodstream_http_new_connections_total", "counter", "New TCP connections opened").add(http["new_connections"]),
+        MetricFamily("doodstream_upload_server_lookups_total", "counter", "Upload server lookups by cache result")
+            .add(http["upload_server_hits"], result="hit")
+            .add(http["upload_server_misses"], result="miss"),
+    ]
+
+REGISTRY.add_collector(_collect_metrics)
+
+# Result reported for an account skipped because its circuit breaker is open
+_CIRCUIT_OPEN = {"success": False, "error": "Circuit open - account is failing, upload skipped", "circuit_open": True}
+
 # -------- Remote upload (URL) ----------
-async def _remote_upload_one(label: str, api_key: str, url: str) -> Dict[str, Any]:
-    try:
-        async with httpx.AsyncClient(timeout=60) as client:
-            r = await client.post(
+async def _remote_upload_one(account: DoodAccount, url: str) -> Dict[str, Any]:
+    if not account.breaker.allow_request():
+        return dict(_CIRCUIT_OPEN)
+    async with account.slots:
+        account.in_flight += 1
+        try:
+            r = await _api().post(
                 f"{DOOD_DOMAIN}/api/upload/url",
-                data={"key": api_key, "url": url}
+                data={"key": account.api_key, "url": url},
+                extensions=_TRACE,
             )
             data = r.json()
             # response biasanya: {"status":200,"msg":"OK","result":{"filecode":"..."}}
             if data.get("status") == 200:
                 filecode = (data.get("result") or {}).get("filecode")
                 if filecode:
-                    return {"success": True, "url": f"https://doodstream.com/d/{filecode}"}
-                return {"success": False, "error": "No filecode in result"}
-            return {"success": False, "error": data.get("msg") or str(data)}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+                    result = {"success": True, "url": f"https://doodstream.com/d/{filecode}"}
+                else:
+                    result = {"success": False, "error": "No filecode in result"}
+            else:
+                result = {"success": False, "error": data.get("msg") or str(data)}
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        finally:
+            account.in_flight -= 1
+    account.record(result["success"])
+    return result
 
 async def dood_remote_upload_all(url: str) -> List[Tuple[str, Dict[str, Any]]]:
-    tasks = []
-    for label, key in _accounts():
-        tasks.append(_remote_upload_one(label, key, url))
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    return list(zip([lbl for lbl, _ in _accounts()], results))
+    """Remote-upload a URL to every mirror account and the best shard"""
+    accounts, skipped = await _route_upload()
+    results = await asyncio.gather(*(_remote_upload_one(a, url) for a in accounts), return_exceptions=True)
+    return list(zip([a.label for a in accounts], results)) + [(a.label, dict(_CIRCUIT_OPEN)) for a in skipped]
 
 # -------- File upload ----------
+# api_key -> (server url, fetched at)
+_upload_servers: Dict[str, Tuple[str, float]] = {}
+
 async def _get_upload_server(api_key: str) -> str:
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(f"{DOOD_DOMAIN}/api/upload/server", params={"key": api_key})
+    cached = _upload_servers.get(api_key)
+    if cached and time.monotonic() - cached[1] < UPLOAD_SERVER_TTL:
+        _http_stats["upload_server_hits"] += 1
+        return cached[0]
+
+    _http_stats["upload_server_misses"] += 1
+    r = await _api().get(f"{DOOD_DOMAIN}/api/upload/server", params={"key": api_key}, timeout=30, extensions=_TRACE)
+    data = r.json()
+    if data.get("status") == 200:
+        server = (data.get("result") or {}).get("server", "")
+        if server:
+            _upload_servers[api_key] = (server, time.monotonic())
+        return server
+    raise RuntimeError(data.get("msg") or "Failed to get upload server")
+
+def _invalidate_upload_server(api_key: str) -> None:
+    """Forget an account's upload server after a failed upload so the next one asks again"""
+    if _upload_servers.pop(api_key, None):
+        _http_stats["upload_server_invalidations"] += 1
+
+def _parse_storage(value: Any) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        # "inf", "unlimited" or missing
+        return None
+
+async def _refresh_account_info(account: DoodAccount) -> None:
+    """Update remaining storage from /api/account/info"""
+    try:
+        r = await _api().get(f"{DOOD_DOMAIN}/api/account/info", params={"key": account.api_key}, timeout=30, extensions=_TRACE)
         data = r.json()
         if data.get("status") == 200:
-            return (data.get("result") or {}).get("server", "")
-        raise RuntimeError(data.get("msg") or "Failed to get upload server")
+            account.storage_left = _parse_storage((data.get("result") or {}).get("storage_left"))
+    except Exception:
+        pass
+    account.info_fetched_at = time.monotonic()
+
+async def _route_upload(size: Optional[int] = None) -> Tuple[List[DoodAccount], List[DoodAccount]]:
+    """Accounts for one upload: every mirror plus one shard.
+
+    Returns (targets, skipped); mirrors whose circuit is open are skipped (fail
+    fast), shards whose circuit is open are simply routed around.
+    """
+    pool = _account_pool()
+    now = time.monotonic()
+    stale = [a for a in pool if now - a.info_fetched_at > ACCOUNT_INFO_TTL]
+    if stale:
+        await asyncio.gather(*(_refresh_account_info(a) for a in stale))
+
+    mirrors = [a for a in pool if a.role == ROLE_MIRROR and a.has_room_for(size)]
+    targets = [a for a in mirrors if a.breaker.available()]
+    skipped = [a for a in mirrors if not a.breaker.available()]
+    shards = [a for a in pool if a.role == ROLE_SHARD and a.has_room_for(size) and a.weight > 0 and a.breaker.available()]
+    if shards:
+        # Spread shard uploads in proportion to score rather than always taking the top one
+        scores = [a.score() for a in shards]
+        if sum(scores) > 0:
+            targets.append(random.choices(shards, weights=scores)[0])
+        else:
+            targets.append(random.choice(shards))
+    if not targets and not skipped:
+        # Everything looks full; let the mirrors try rather than skip the upload
+        targets = [a for a in pool if a.role == ROLE_MIRROR and a.breaker.available()]
+    return targets, skipped
+
+def _parse_upload_response(data: Dict[str, Any]) -> Dict[str, Any]:
+    # response: {"status":200,"msg":"OK","result":[{"filecode":"..."}]}
+    if data.get("status") == 200:
+        arr = data.get("result") or []
+        if arr and arr[0].get("filecode"):
+            fc = arr[0]["filecode"]
+            return {"success": True, "file_code": fc, "url": f"https://doodstream.com/d/{fc}"}
+        return {"success": False, "error": "No filecode in result array"}
+    return {"success": False, "error": data.get("msg") or str(data)}
+
+async def _file_chunks(path: str, chunk_size: int = FILE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Read a local file in chunks without blocking the event loop"""
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+async def dood_upload_file_all(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Upload a local file to the routed accounts, reading it from disk only once"""
+    return await _tee_upload_all(_file_chunks(path), Path(path).name, os.path.getsize(path))
+
+# -------- Streaming relay (Telegram -> Doodstream, no temp file) ----------
+_EOF = object()
+
+class _ChunkTee:
+    """Reads a chunk stream once and fans each chunk out to several upload bodies.
+
+    Every consumer has a bounded queue of `slots` chunks: the source runs ahead
+    of the slowest consumer by at most that much, so download and uploads
+    overlap while memory stays fixed. A slow consumer applies backpressure to
+    the read instead of causing a second read; a consumer that gives up is
+    detached so it no longer holds the others back.
+    """
+
+    def __init__(self, source: AsyncIterator[bytes], consumers: int, slots: int = RELAY_BUFFER_CHUNKS):
+        self._source = source
+        self._queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=max(1, slots)) for _ in range(consumers)]
+        self._detached = set()
+        self._task: Optional[asyncio.Task] = None
+        self.bytes_read = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._pump())
 
-async def _upload_file_one(label: str, api_key: str, path: str) -> Dict[str, Any]:
+    def _live_queues(self):
+        return [q for i, q in enumerate(self._queues) if i not in self._detached]
+
+    async def _pump(self):
+        final: Any = _EOF
+        try:
+            async for chunk in self._source:
+                self.bytes_read += len(chunk)
+                for index, queue in enumerate(self._queues):
+                    if index not in self._detached:
+                        await queue.put(chunk)
+                if not self._live_queues():
+                    # Every upload gave up; stop reading
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Surface read errors to the upload bodies so the requests abort
+            final = e
+        for queue in self._live_queues():
+            await queue.put(final)
+
+    async def body(self, index: int, head: bytes, tail: bytes) -> AsyncIterator[bytes]:
+        queue = self._queues[index]
+        yield head
+        while True:
+            item = await queue.get()
+            if item is _EOF:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        yield tail
+
+    def detach(self, index: int):
+        """Stop feeding a consumer (its upload finished or failed)"""
+        if index in self._detached:
+            return
+        self._detached.add(index)
+        # Free a pump blocked on this consumer's full queue
+        queue = self._queues[index]
+        while not queue.empty():
+            queue.get_nowait()
+
+    async def aclose(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        # Stop the download (e.g. when every upload failed part-way)
+        close = getattr(self._source, "aclose", None)
+        if close:
+            try:
+                await close()
+            except Exception:
+                pass
+
+def _multipart_envelope(api_key: str, filename: str) -> Tuple[str, bytes, bytes]:
+    """Boundary plus the bytes around the file part of a multipart/form-data body"""
+    boundary = secrets.token_hex(16)
+    safe_name = filename.replace('"', "_").replace("\r", "_").replace("\n", "_")
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="key"\r\n\r\n'
+        f"{api_key}\r\n"
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{safe_name}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return boundary, head, tail
+
+async def _stream_upload_one(account: DoodAccount, tee: _ChunkTee, index: int, filename: str, size: Optional[int]) -> Dict[str, Any]:
+    """Upload one tee consumer to an account whose slot and circuit call the caller already holds"""
+    api_key = account.api_key
+    started = None
+    account.in_flight += 1
     try:
+        # server biasanya berupa URL, contoh: https://upload.doodapi.com/upload
         server = await _get_upload_server(api_key)
         if not server:
-            return {"success": False, "error": "No upload server"}
-        # server biasanya berupa URL, contoh: https://upload.doodapi.com/upload
-        async with httpx.AsyncClient(timeout=None) as client:
-            with open(path, "rb") as f:
-                files = {"file": (Path(path).name, f)}
-                r = await client.post(server, data={"key": api_key}, files=files)
-            data = r.json()
-            # response: {"status":200,"msg":"OK","result":[{"filecode":"..."}]}
-            if data.get("status") == 200:
-                arr = data.get("result") or []
-                if arr and arr[0].get("filecode"):
-                    fc = arr[0]["filecode"]
-                    return {"success": True, "url": f"https://doodstream.com/d/{fc}"}
-                return {"success": False, "error": "No filecode in result array"}
-            return {"success": False, "error": data.get("msg") or str(data)}
+            result = {"success": False, "error": "No upload server"}
+        else:
+            boundary, head, tail = _multipart_envelope(api_key, filename)
+            headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+            if size:
+                # Known size lets the upload go out with Content-Length instead of chunked encoding
+                headers["Content-Length"] = str(len(head) + size + len(tail))
+
+            started = time.monotonic()
+            r = await _uploads().post(server, content=tee.body(index, head, tail), headers=headers, extensions=_TRACE)
+            result = _parse_upload_response(r.json())
+            if not result.get("success"):
+                _invalidate_upload_server(api_key)
     except Exception as e:
-        return {"success": False, "error": str(e)}
+        _invalidate_upload_server(api_key)
+        result = {"success": False, "error": str(e)}
+    finally:
+        account.in_flight -= 1
+        tee.detach(index)
 
-async def dood_upload_file_all(path: str) -> List[Tuple[str, Dict[str, Any]]]:
-    tasks = []
-    for label, key in _accounts():
-        tasks.append(_upload_file_one(label, key, path))
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    return list(zip([lbl for lbl, _ in _accounts()], results))
\ No newline at end of file
+    elapsed = time.monotonic() - started if started else 0.0
+    account.record(result.get("success", False), size or tee.bytes_read, elapsed)
+    if started:
+        UPLOAD_SECONDS.labels(account.label).observe(elapsed)
+        if result.get("success"):
+            UPLOAD_BYTES.labels(account.label).inc(size or tee.bytes_read)
+    return result
+
+async def _tee_upload_all(source: AsyncIterator[bytes], filename: str, size: Optional[int]) -> List[Tuple[str, Dict[str, Any]]]:
+    accounts, skipped = await _route_upload(size)
+    skipped_results = [(a.label, dict(_CIRCUIT_OPEN)) for a in skipped]
+    if not accounts:
+        return skipped_results
+    return await _tee_upload(accounts, source, filename, size) + skipped_results
+
+async def _acquire_slots(accounts: List[DoodAccount]) -> None:
+    """Take one upload slot on every account, in label order so concurrent tees never wait on each other in a cycle"""
+    held: List[DoodAccount] = []
+    try:
+        for account in sorted(accounts, key=lambda a: a.label):
+            await account.slots.acquire()
+            held.append(account)
+    except BaseException:
+        for account in held:
+            account.slots.release()
+        raise
+
+async def _tee_upload(accounts: List[DoodAccount], source: AsyncIterator[bytes], filename: str, size: Optional[int]) -> List[Tuple[str, Dict[str, Any]]]:
+    # Every consumer holds its slot before the source is read: one still waiting for
+    # a slot would not drain its queue and would stall the others' uploads behind it
+    allowed = [a for a in accounts if a.breaker.allow_request()]
+    results = {a.label: dict(_CIRCUIT_OPEN) for a in accounts}
+    tee = _ChunkTee(source, len(allowed))
+    try:
+        if allowed:
+            await _acquire_slots(allowed)
+            try:
+                tasks = [
+                    _stream_upload_one(account, tee, index, filename, size)
+                    for index, account in enumerate(allowed)
+                ]
+                tee.start()
+                for account, r in zip(allowed, await asyncio.gather(*tasks, return_exceptions=True)):
+                    results[account.label] = r if isinstance(r, dict) else {"success": False, "error": str(r)}
+            finally:
+                for account in allowed:
+                    account.slots.release()
+    finally:
+        await tee.aclose()
+    return [(a.label, results[a.label]) for a in accounts]
+
+async def dood_stream_upload_all(source: AsyncIterator[bytes], filename: str, size: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """Upload a chunk stream (e.g. Pyrogram stream_media) to the routed accounts without touching disk"""
+    return await _tee_upload_all(source, filename, size)
+
+async def dood_stream_upload_to(labels: List[str], source: AsyncIterator[bytes], filename: str, size: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """Upload a chunk stream to the named accounts only, bypassing routing (e.g. the failed half of a dual upload)"""
+    accounts = [a for a in (get_account(label) for label in labels) if a]
+    missing = [(label, {"success": False, "error": f"Doodstream account {label} is not configured"})
+               for label in labels if not get_account(label)]
+    if not accounts:
+        return missing
+    return await _tee_upload(accounts, source, filename, size) + missing
@@ -4,17 +4,20 @@ Handles admin commands and management
 """
 
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional
 from pyrogram import Client
 from pyrogram.types import Message
 from utils.supabase_client import SupabaseManager
+from utils.aggregates import top_upload_groups
+import doodstream_client
 
 logger = logging.getLogger(__name__)
 
 class AdminHandler:
-    def __init__(self, supabase: SupabaseManager):
+    def __init__(self, supabase: SupabaseManager, upload_handler=None, membership_cache=None):
         self.supabase = supabase
+        self.upload_handler = upload_handler
+        self.membership_cache = membership_cache
 
     async def handle_start(self, client: Client, message: Message):
         """Handle /start command"""
@@ -63,8 +66,10 @@ Need help? Contact your system administrator.
             # Get premium groups
             groups = await self._get_premium_groups()
             
-            # Get recent uploads
+            # Get recent uploads (counts come from the rolling counters)
             recent_uploads = await self._get_recent_uploads()
+            day = self.supabase.upload_stats.window('24h')
+            hour = self.supabase.upload_stats.window('1h')
             
             status_text = f"""
 📊 **Bot Status Report**
@@ -75,7 +80,8 @@ Need help? Contact your system administrator.
 🆔 ID: {me.id}
 
 **Premium Groups:** {len(groups)}
-**Recent Uploads (24h):** {len(recent_uploads)}
+**Recent Uploads (24h):** {day['total_uploads']} ({day['successful_uploads']} ✅ / {day['failed_uploads']} ❌)
+**Last Hour:** {hour['total_uploads']} ({hour['processing_uploads'] + hour['pending_uploads']} in progress)
 
 **Groups Status:**
 """
@@ -95,11 +101,64 @@ Need help? Contact your system administrator.
             
             if recent_uploads:
                 for upload in recent_uploads[:3]:  # Show max 3 recent
-                    status = "✅" if upload['upload_status'] == 'completed' else "⏳" if upload['upload_status'] == 'processing' else "❌"
+                    status = "✅" if upload['upload_status'] == 'completed' else "⏳" if upload['upload_status'] == 'processing' else "🔁" if upload['upload_status'] == 'retrying' else "❌"
                     status_text += f"{status} {upload.get('original_filename', 'Unknown')}\n"
             else:
                 status_text += "• No recent uploads\n"
                 
+            if self.upload_handler:
+                queue_stats = self.upload_handler.get_queue_stats()
+                status_text += f"""
+**Upload Queue:**
+• Queued: {queue_stats['queue_depth']}/{queue_stats['queue_capacity']}
+• Workers busy: {queue_stats['busy_workers']}/{queue_stats['workers']}
+• Avg wait: {queue_stats['avg_wait_seconds']:.1f}s (max {queue_stats['max_wait_seconds']:.1f}s)
+• Completed: {queue_stats['completed']} | Rejected: {queue_stats['rejected']}
+• Messages dropped (queue full): {queue_stats['dropped_messages']} | Filtered: {queue_stats['filtered_messages']}
+• Shared in-flight uploads: {self.upload_handler.get_single_flight_stats()['hits']}
+"""
+                status_text += "\n**Circuit Breakers:**\n"
+                for breaker in self.upload_handler.get_breaker_stats():
+                    status_text += self._format_breaker(breaker['name'], breaker['state'], breaker['retry_in_seconds'], breaker['trips'])
+                for account in doodstream_client.get_account_stats():
+                    status_text += self._format_breaker(f"dood:{account['label']}", account['circuit'])
+
+                retry_stats = self.upload_handler.get_retry_stats()
+                decisions = retry_stats['decisions']
+                status_text += f"""
+**Retry Policy:**
+• Failures: {decisions.get('transient', 0)} transient | {decisions.get('throttled', 0)} throttled | {decisions.get('permanent', 0)} permanent
+• Retries: {retry_stats['retries']} | Dead-lettered: {retry_stats['dead_lettered']}
+• Saved: {retry_stats['attempts_saved']} attempts (~{retry_stats['seconds_saved']:.0f}s)
+"""
+                if retry_stats['scheduler']:
+                    status_text += f"• Scheduled: {retry_stats['scheduler']['pending']} pending | {retry_stats['scheduler']['dispatched']} re-queued (`/retries`)\n"
+
+                http_stats = doodstream_client.get_http_stats()
+                status_text += f"""
+**Doodstream HTTP:**
+• Requests: {http_stats['requests']} | New connections: {http_stats['new_connections']} ({http_stats['reuse_ratio']:.0%} reused{', HTTP/2' if http_stats['http2'] else ''})
+• Upload server cache: {http_stats['upload_server_hits']} hits / {http_stats['upload_server_misses']} misses
+"""
+                for account in doodstream_client.get_account_stats():
+                    status_text += f"• {account['label']} ({account['role']}): {account['in_flight']}/{account['concurrency']} busy, {account['throughput_mbps']} Mbit/s, {account['error_rate']:.0%} errors\n"
+                if self.upload_handler.notification_bot:
+                    notify_stats = self.upload_handler.notification_bot.get_stats()
+                    status_text += f"""
+**Admin Notifications:**
+• Sent: {notify_stats['sent']} | Failed: {notify_stats['send_failures']} | FloodWaits: {notify_stats['flood_waits']}
+• Immediate: {notify_stats['immediate_alerts']} | Coalesced: {notify_stats['coalesced']} into {notify_stats['digests_sent']} digests ({notify_stats['digest_pending']} pending)
+• Retry buttons: {notify_stats['callbacks']['entries']}/{notify_stats['callbacks']['capacity']} | Evicted: {notify_stats['callbacks']['evicted']} | Expired: {notify_stats['callbacks']['expired']}
+"""
+                shared_stats = self.upload_handler.get_shared_queue_stats()
+                if shared_stats:
+                    status_text += f"""
+**Shared Job Queue ({shared_stats['worker_id']}):**
+• Running: {shared_stats['active']}/{shared_stats['concurrency']}
+• Claimed: {shared_stats['claimed']} | Completed: {shared_stats['completed']}
+• Lost leases: {shared_stats['lost_leases']} | Released: {shared_stats['released']}
+"""
+
             status_text += f"""
 Use `/groups` to manage premium groups
 Use `/sync` to manually sync Doodstream
@@ -111,6 +170,16 @@ Use `/sync` to manually sync Doodstream
             logger.error(f"Error in status command: {e}")
             await message.reply_text("❌ Error getting status")
 
+    def _format_breaker(self, name: str, state: str, retry_in: float = 0.0, trips: Optional[int] = None) -> str:
+        """One /status line for a circuit breaker"""
+        icon = {'closed': '🟢', 'half_open': '🟡', 'open': '🔴'}.get(state, '⚪')
+        line = f"{icon} {name}: {state.replace('_', '-')}"
+        if state == 'open' and retry_in:
+            line += f" (probe in {retry_in:.0f}s)"
+        if trips:
+            line += f" | trips: {trips}"
+        return line + "\n"
+
     async def handle_groups(self, client: Client, message: Message):
         """Handle /groups command"""
         try:
@@ -152,7 +221,7 @@ Use `/sync` to manually sync Doodstream
                 return
             
             # Check if group already exists
-            existing = self.supabase.client.table('premium_groups').select('*').eq('chat_id', chat_id).execute()
+            existing = await self.supabase.client.table('premium_groups').select('*').eq('chat_id', chat_id).execute()
             
             if existing.data:
                 await message.reply_text(f"⚠️ Group {chat_id} is already in premium groups list")
@@ -172,7 +241,10 @@ Use `/sync` to manually sync Doodstream
                 'auto_upload_enabled': True
             }
             
-            result = self.supabase.client.table('premium_groups').insert(group_data).execute()
+            result = await self.supabase.client.table('premium_groups').insert(group_data).execute()
+            
+            if self.membership_cache:
+                self.membership_cache.invalidate()
             
             if result.data:
                 await message.reply_text(f"✅ Added premium group: **{chat_title}**\nID: `{chat_id}`\nAuto upload: 🟢 Enabled")
@@ -189,7 +261,7 @@ Use `/sync` to manually sync Doodstream
             await message.reply_text("🔄 Starting manual sync with Doodstream...")
             
             # Call sync edge function
-            result = self.supabase.client.functions.invoke(
+            result = await self.supabase.client.functions.invoke(
                 'doodstream-api',
                 {
                     'action': 'syncVideos'
@@ -290,46 +362,12 @@ Use `/failures` to get upload IDs
             logger.error(f"Error in retry command: {e}")
             await message.reply_text("❌ Error during retry")
     
-    async def _retry_by_upload_id(self, upload_id: str, provider: str) -> bool:
-        """Retry upload by failure ID with specific provider"""
-        try:
-            # Get upload failure data
-            failure_data = await self.supabase.get_upload_failure_by_id(upload_id)
-            if not failure_data:
-                return False
-            
-            # Get original upload data
-            upload_data = await self.supabase.get_upload_by_failure_id(upload_id)
-            if not upload_data:
-                return False
-            
-            # Increment attempt count
-            attempt_count = failure_data.get('attempt_count', 0) + 1
-            if attempt_count > 3:
-                await self.supabase.mark_upload_manual_required(upload_id)
-                return False
-            
-            # Update attempt count
-            await self.supabase.update_failure_attempt_count(upload_id, attempt_count)
-            
-            # Trigger retry with specific provider
-            success = await self.supabase.retry_upload_with_provider(upload_data.get('id'), provider)
-            
-            # Log retry result
-            retry_result = {
-                'timestamp': datetime.now().isoformat(),
-                'provider': provider,
-                'attempt': attempt_count,
-                'success': success
-            }
-            
-            await self.supabase.add_retry_history(upload_id, retry_result)
-            
-            return success
-            
-        except Exception as e:
-            logger.error(f"Error retrying upload by ID {upload_id}: {e}")
+    async def _retry_by_upload_id(self, failure_id: str, provider: str) -> bool:
+        """Retry an upload failure, re-uploading only to the provider(s) that failed"""
+        if not self.upload_handler:
+            logger.error(f"Upload handler not available - cannot retry failure {failure_id}")
             return False
+        return await self.upload_handler.retry_failed_upload(failure_id, provider)
     
     async def _retry_by_message(self, client: Client, chat_id: int, message_id: int) -> bool:
         """Legacy retry by original message"""
@@ -339,13 +377,15 @@ Use `/failures` to get upload IDs
             if not original_message:
                 return False
             
-            # Import upload handler to retry the upload
-            from .upload_handler import UploadHandler
-            upload_handler = UploadHandler(self.supabase)
-            upload_handler.set_client(client)  # Set client for notifications
+            upload_handler = self.upload_handler
+            if not upload_handler:
+                # Import upload handler to retry the upload
+                from .upload_handler import UploadHandler
+                upload_handler = UploadHandler(self.supabase)
+                upload_handler.set_client(client)  # Set client for notifications
             
-            # Process the upload again
-            return await upload_handler.handle_group_upload(client, original_message)
+            # Process the upload again inline so the result can be reported
+            return await upload_handler.process_group_upload(client, original_message)
             
         except Exception as e:
             logger.error(f"Error retrying by message {chat_id}/{message_id}: {e}")
@@ -425,6 +465,32 @@ Use `/failures` to get upload IDs
             logger.error(f"Error in failures command: {e}")
             await message.reply_text("❌ Error getting failures list")
 
+    async def handle_retries(self, client: Client, message: Message):
+        """Handle /retries command to list scheduled upload retries"""
+        try:
+            retries = self.upload_handler.get_pending_retries() if self.upload_handler else []
+
+            if not retries:
+                await message.reply_text("⏱️ No upload retries scheduled.")
+                return
+
+            retries_text = f"⏱️ **Scheduled Upload Retries ({len(retries)})**\n\n"
+            for i, retry in enumerate(retries[:15], 1):
+                due_in = retry['due_in_seconds']
+                due_text = f"in {due_in / 60:.0f}m" if due_in >= 120 else f"in {due_in:.0f}s" if due_in >= 1 else "now"
+                retries_text += f"{i}. **{retry.get('original_name') or 'Unknown'}**\n"
+                retries_text += f"   Upload: `{retry['upload_id'][:8]}...` | Retry #{retry['retry_count'] + 1} {due_text}\n"
+                retries_text += f"   Class: {retry.get('failure_class') or 'unknown'} - {(retry.get('reason') or '')[:50]}\n\n"
+
+            if len(retries) > 15:
+                retries_text += f"... and {len(retries) - 15} more\n"
+
+            await message.reply_text(retries_text)
+
+        except Exception as e:
+            logger.error(f"Error in retries command: {e}")
+            await message.reply_text("❌ Error getting scheduled retries")
+
     async def handle_stats(self, client: Client, message: Message):
         """Handle /stats command to show detailed statistics"""
         try:
@@ -439,6 +505,7 @@ Use `/failures` to get upload IDs
 • Successful: {stats.get('successful_uploads', 0)} ({stats.get('success_rate', 0):.1f}%)
 • Failed: {stats.get('failed_uploads', 0)}
 • Processing: {stats.get('processing_uploads', 0)}
+• Last 24h: {stats.get('uploads_24h', 0)} ({stats.get('success_rate_24h', 0):.1f}% ok) | Last hour: {stats.get('uploads_1h', 0)}
 
 **File Statistics:**
 • Total Size: {stats.get('total_size_gb', 0):.2f} GB
@@ -466,7 +533,7 @@ Use `/groups` to manage premium groups
     async def _get_premium_groups(self) -> List[Dict]:
         """Get premium groups from database"""
         try:
-            result = self.supabase.client.table('premium_groups').select('*').order('created_at', desc=True).execute()
+            result = await self.supabase.client.table('premium_groups').select('*').order('created_at', desc=True).execute()
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting premium groups: {e}")
@@ -475,7 +542,7 @@ Use `/groups` to manage premium groups
     async def _get_recent_uploads(self) -> List[Dict]:
         """Get recent uploads from database"""
         try:
-            result = self.supabase.client.table('telegram_uploads').select('*').order('created_at', desc=True).limit(10).execute()
+            result = await self.supabase.client.table('telegram_uploads').select('*').order('created_at', desc=True).limit(10).execute()
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting recent uploads: {e}")
@@ -484,7 +551,7 @@ Use `/groups` to manage premium groups
     async def _get_recent_failures(self) -> List[Dict]:
         """Get recent upload failures"""
         try:
-            result = self.supabase.client.table('upload_failures').select('*').order('created_at', desc=True).limit(20).execute()
+            result = await self.supabase.client.table('upload_failures').select('*').order('created_at', desc=True).limit(20).execute()
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting recent failures: {e}")
@@ -493,40 +560,28 @@ Use `/groups` to manage premium groups
     async def _get_comprehensive_stats(self) -> Dict:
         """Get comprehensive statistics for the bot"""
         try:
-            stats = {}
-            
-            # Upload statistics (last 7 days)
-            week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-            
-            uploads_result = self.supabase.client.table('telegram_uploads').select('*').gte('created_at', week_ago).execute()
-            uploads = uploads_result.data or []
-            
-            stats['total_uploads'] = len(uploads)
-            stats['successful_uploads'] = len([u for u in uploads if u.get('upload_status') == 'completed'])
-            stats['failed_uploads'] = len([u for u in uploads if u.get('upload_status') == 'failed'])
-            stats['processing_uploads'] = len([u for u in uploads if u.get('upload_status') == 'processing'])
-            
-            stats['success_rate'] = (stats['successful_uploads'] / stats['total_uploads'] * 100) if stats['total_uploads'] > 0 else 0
-            
-            # File statistics
-            total_size = sum(u.get('file_size', 0) for u in uploads if u.get('file_size'))
-            stats['total_size_gb'] = total_size / (1024 * 1024 * 1024)
-            stats['avg_size_mb'] = (total_size / len(uploads) / (1024 * 1024)) if uploads else 0
-            
-            # Group statistics
-            groups_result = self.supabase.client.table('premium_groups').select('*').eq('auto_upload_enabled', True).execute()
-            stats['active_groups'] = len(groups_result.data) if groups_result.data else 0
-            
-            # Most active group (placeholder)
-            stats['most_active_group'] = 'Analysis pending'
+            # Upload, file and group statistics (last 7 days) from the rolling counters
+            stats = await self.supabase.get_comprehensive_stats()
+            
+            day = self.supabase.upload_stats.window('24h')
+            stats['uploads_24h'] = day['total_uploads']
+            stats['success_rate_24h'] = day['success_rate']
+            stats['uploads_1h'] = self.supabase.upload_stats.window('1h')['total_uploads']
+            
+            # Most active group (grouped in the database)
+            top_groups = await top_upload_groups(self.supabase.client, 7 * 86400, limit=1)
+            if top_groups:
+                top = top_groups[0]
+                stats['most_active_group'] = f"{top.get('chat_title') or top['telegram_chat_id']} ({top['uploads']} uploads)"
+            else:
+                stats['most_active_group'] = 'N/A'
             
             # System health metrics (placeholder)
             stats['retry_success_rate'] = 85.0  # Would calculate from actual retry data
-            stats['avg_processing_time'] = 45.0  # Would calculate from actual processing times
             stats['avg_duration_min'] = 12.5  # Would calculate from video durations
             
             return stats
             
         except Exception as e:
             logger.error(f"Error getting comprehensive stats: {e}")
-            return {}
\ No newline at end of file
+            return {}
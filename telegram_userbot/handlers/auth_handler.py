@@ -40,7 +40,7 @@ class AuthHandler:
                 'telegram_chat_id': message.chat.id,
             }
             
-            result = self.supabase.client.table('telegram_link_codes').insert(code_data).execute()
+            result = await self.supabase.client.table('telegram_link_codes').insert(code_data).execute()
             
             if not result.data:
                 await message.reply_text("❌ Failed to generate linking code")
@@ -75,7 +75,7 @@ Once linked, you can:
     async def _is_user_linked(self, telegram_user_id: int) -> bool:
         """Check if user is already linked"""
         try:
-            result = self.supabase.client.table('profiles').select('id').eq('telegram_user_id', telegram_user_id).execute()
+            result = await self.supabase.client.table('profiles').select('id').eq('telegram_user_id', telegram_user_id).execute()
             return bool(result.data)
         except Exception as e:
             logger.error(f"Error checking user link status: {e}")
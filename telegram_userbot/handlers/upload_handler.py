@@ -12,20 +12,98 @@ import json
 import httpx
 import time
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pyrogram import Client
-from pyrogram.types import Message
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.types import Message, ChatMemberUpdated
 from utils.supabase_client import SupabaseManager
 from utils.monitoring import PerformanceMonitor
 from utils.analytics_client import AnalyticsClient
+from utils.upload_queue import UploadQueue
+from utils.membership_cache import MembershipCache
+from utils.duplicate_index import DuplicateIndex
+from utils.single_flight import SingleFlight
+from utils.upload_journal import UploadJournal, portable_file_info, STAGE_LOGGED, STAGE_UPLOADED, STAGE_RECORDED
+from utils.shared_upload_queue import SharedUploadQueue
+from utils.circuit_breaker import CircuitBreaker
+from utils.retry_policy import RetryEngine, classify_failure, PERMANENT
+from utils.retry_scheduler import RetryScheduler
+from utils.metrics import REGISTRY, MetricFamily
+import doodstream_client
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_ATTEMPTS = REGISTRY.counter('upload_attempts_total', 'Doodstream dual-upload attempts')
+UPLOAD_FAILURES = REGISTRY.counter('upload_failures_total', 'Doodstream dual-upload attempts that failed')
+UPLOAD_ATTEMPT_SECONDS = REGISTRY.histogram('upload_attempt_duration_seconds', 'Time per dual-upload attempt', ('outcome',))
+UPLOAD_JOBS = REGISTRY.counter('upload_jobs_total', 'Upload pipeline runs by outcome', ('outcome',))
+UPLOAD_JOB_SECONDS = REGISTRY.histogram('upload_job_duration_seconds', 'Upload pipeline run time by outcome', ('outcome',))
+
+_CIRCUIT_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
 class UploadHandler:
-    def __init__(self, supabase: SupabaseManager, performance_monitor: Optional[PerformanceMonitor] = None, analytics_client: Optional[AnalyticsClient] = None):
+    # Journaled jobs interrupted this many times are failed instead of resumed again
+    MAX_JOURNAL_RESUMES = 3
+    # Admin-triggered retries of a logged failure before it needs a manual upload
+    MAX_FAILURE_RETRIES = 3
+
+    def __init__(self, supabase: SupabaseManager, performance_monitor: Optional[PerformanceMonitor] = None, analytics_client: Optional[AnalyticsClient] = None,
+                 upload_workers: int = 3, upload_queue_size: int = 100, membership_cache: Optional[MembershipCache] = None,
+                 duplicate_index: Optional[DuplicateIndex] = None, upload_journal: Optional[UploadJournal] = None,
+                 upload_mode: str = 'local', worker_id: Optional[str] = None, job_lease_seconds: int = 300,
+                 job_poll_interval: float = 5.0, job_max_attempts: int = 3,
+                 breaker_failure_threshold: int = 5, breaker_recovery_seconds: float = 60.0,
+                 retry_scheduler: Optional[RetryScheduler] = None):
         self.supabase = supabase
         self.performance_monitor = performance_monitor
         self.analytics_client = analytics_client
+        self.membership_cache = membership_cache
+        self.duplicate_index = duplicate_index
+        self.upload_journal = upload_journal
+        
+        # Shared admin notification service (wired from main via set_notification_bot)
+        self.notification_bot = None
+        
+        # Own identity (resolved once at startup) and own membership status per chat
+        self._me = None
+        self._chat_member_status: Dict[int, ChatMemberStatus] = {}
+        
+        # Uploads run on a worker pool so the message callback returns immediately
+        self.upload_queue = UploadQueue(self._run_upload_job, workers=upload_workers, maxsize=upload_queue_size)
+        self.filtered_messages = 0  # turned away by the cached checks before queueing
+        self.dropped_messages = 0   # accepted but lost to a full queue
+        
+        # Concurrent arrivals of the same file share one upload
+        self.upload_flights = SingleFlight('upload')
+        
+        # Shared mode: ingestion only queues a telegram_uploads row and workers on
+        # every bot instance claim jobs from the database under a lease
+        self.shared_queue: Optional[SharedUploadQueue] = None
+        if upload_mode == 'shared':
+            self.shared_queue = SharedUploadQueue(
+                supabase,
+                self._run_claimed_job,
+                worker_id or 'userbot',
+                concurrency=upload_workers,
+                lease_seconds=job_lease_seconds,
+                poll_interval=job_poll_interval,
+                max_attempts=job_max_attempts
+            )
+        
+        # Per-provider circuit breakers for the dual upload (regular / premium)
+        self.provider_breakers: Dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(name, breaker_failure_threshold, breaker_recovery_seconds)
+            for name in ('regular', 'premium')
+        }
+        
+        # Failed attempts are classified (transient / throttled / permanent) and retried per class
+        self.retry_engine = RetryEngine()
+        
+        # Backoff waits are handed to the persistent scheduler, which re-queues the job when due
+        self.retry_scheduler = retry_scheduler
+        if retry_scheduler:
+            retry_scheduler.dispatch = self._dispatch_retry
+            retry_scheduler.abandon = self._abandon_retry
         
         # Supported video formats
         self.supported_video_formats = {
@@ -41,48 +119,339 @@ class UploadHandler:
         }
 
     async def handle_group_upload(self, client: Client, message: Message):
-        """Handle group upload messages with enhanced filtering"""
+        """Queue group upload messages for the upload workers (after the cheap cached checks)"""
+        if not message.from_user or not message.chat:
+            return
+        
+        reason = await self._prefilter_upload(message)
+        if reason:
+            self.filtered_messages += 1
+            logger.debug(f"Upload not queued - {reason} (message {message.id} in chat {message.chat.id})")
+            return
+        
+        if not self.upload_queue.submit(('message', client, message)):
+            self.dropped_messages += 1
+            logger.warning(f"Upload queue full ({self.upload_queue.maxsize} jobs) - dropping message {message.id} from chat {message.chat.id}")
+
+    async def _prefilter_upload(self, message: Message) -> Optional[str]:
+        """Why a message need not be queued, from in-memory state only (None = queue it)
+
+        Only definite answers turn a message away; anything unknown (cache not
+        loaded, Bloom filter hit) is left to the worker's full checks.
+        """
+        media = message.video or message.document
+        if not media:
+            return "no video or document"
+        
+        if self.membership_cache:
+            if await self.membership_cache.is_premium_group(message.chat.id) is False:
+                return "group not premium"
+            if await self.membership_cache.is_admin(message.from_user.id) is False:
+                return "sender not admin"
+        
+        index = self.duplicate_index
+        file_unique_id = getattr(media, 'file_unique_id', None)
+        if index and index.ready and file_unique_id and index.might_contain(file_unique_id) and index.contains(file_unique_id):
+            return "already uploaded"
+        return None
+
+    async def _run_upload_job(self, job):
+        """Upload worker entry point"""
+        kind, client, payload = job
+        if kind == 'resume':
+            await self.resume_upload(client, payload)
+        else:
+            await self.process_group_upload(client, payload)
+
+    def start_workers(self):
+        """Start the upload worker pool (and the shared job claimer in shared mode)"""
+        self.upload_queue.start()
+        if self.shared_queue:
+            self.shared_queue.start()
+        if self.retry_scheduler:
+            self.retry_scheduler.start()
+
+    async def stop_workers(self):
+        """Stop the upload worker pool"""
+        if self.retry_scheduler:
+            await self.retry_scheduler.stop()
+        if self.shared_queue:
+            await self.shared_queue.stop()
+        await self.upload_queue.stop()
+
+    def get_queue_stats(self) -> Dict[str, Any]:
+        """Upload queue depth, worker utilisation and wait-time metrics"""
+        stats = self.upload_queue.get_stats()
+        stats['filtered_messages'] = self.filtered_messages
+        stats['dropped_messages'] = self.dropped_messages
+        return stats
+
+    def get_single_flight_stats(self) -> Dict[str, Any]:
+        """In-flight upload sharing metrics"""
+        return self.upload_flights.get_stats()
+
+    def get_breaker_stats(self) -> List[Dict[str, Any]]:
+        """Regular / premium provider circuit breaker states"""
+        return [breaker.get_stats() for breaker in self.provider_breakers.values()]
+
+    def get_retry_stats(self) -> Dict[str, Any]:
+        """Retry decisions per failure class and scheduler state"""
+        stats = self.retry_engine.get_stats()
+        stats['scheduler'] = self.retry_scheduler.get_stats() if self.retry_scheduler else None
+        return stats
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Queue, breaker and retry state for the metrics exporter (read at scrape time)"""
+        queue = self.upload_queue.get_stats()
+        families = [
+            MetricFamily('upload_queue_size', 'gauge', 'Upload jobs waiting for a worker').add(queue['queue_depth']),
+            MetricFamily('upload_queue_capacity', 'gauge', 'Upload queue capacity').add(queue['queue_capacity']),
+            MetricFamily('upload_workers_busy', 'gauge', 'Upload workers running a job').add(queue['busy_workers']),
+            MetricFamily('upload_workers', 'gauge', 'Upload workers').add(queue['workers']),
+            MetricFamily('upload_queue_rejected_total', 'counter', 'Upload jobs dropped because the queue was full').add(queue['rejected']),
+            MetricFamily('upload_messages_dropped_total', 'counter', 'Group upload messages dropped because the queue was full').add(self.dropped_messages),
+            MetricFamily('upload_messages_filtered_total', 'counter', 'Group upload messages turned away before queueing (not premium, not admin, duplicate)').add(self.filtered_messages),
+            MetricFamily('upload_queue_wait_seconds_max', 'gauge', 'Longest time a job waited for a worker').add(queue['max_wait_seconds']),
+            MetricFamily('upload_shared_flights_total', 'counter', 'Duplicate arrivals that joined an in-flight upload').add(self.upload_flights.hits),
+        ]
+        
+        circuit = MetricFamily('upload_provider_circuit_state', 'gauge', 'Provider circuit breaker (0 closed, 1 half-open, 2 open)')
+        trips = MetricFamily('upload_provider_circuit_trips_total', 'counter', 'Times a provider circuit opened')
+        for name, breaker in self.provider_breakers.items():
+            circuit.add(_CIRCUIT_VALUES.get(breaker.state, 0), provider=name)
+            trips.add(breaker.trips, provider=name)
+        families += [circuit, trips]
+        # Uploads cannot go anywhere while every provider circuit is open
+        families.append(MetricFamily('doodstream_api_status', 'gauge', '0 while every Doodstream provider circuit is open')
+                        .add(int(any(b.state != 'open' for b in self.provider_breakers.values()))))
+        
+        retry = self.retry_engine.get_stats()
+        decisions = MetricFamily('upload_retry_decisions_total', 'counter', 'Retry decisions per failure class')
+        for category, count in retry['decisions'].items():
+            decisions.add(count, **{'class': category})
+        families += [
+            decisions,
+            MetricFamily('upload_dead_lettered_total', 'counter', 'Uploads given up without further retries').add(retry['dead_lettered']),
+        ]
+        if self.retry_scheduler:
+            families.append(MetricFamily('upload_retries_pending', 'gauge', 'Retries waiting in the scheduler').add(self.retry_scheduler.get_stats()['pending']))
+        
+        writes = self.supabase.upload_writes.get_stats()
+        families += [
+            MetricFamily('upload_writes_pending', 'gauge', 'Buffered telegram_uploads rows waiting to be written').add(writes['pending']),
+            MetricFamily('upload_writes_coalesced_total', 'counter', 'Upload row updates merged into an already buffered write').add(writes['coalesced']),
+            MetricFamily('upload_write_batches_total', 'counter', 'Batched telegram_uploads writes').add(writes['batches']),
+            MetricFamily('upload_write_errors_total', 'counter', 'Batched telegram_uploads writes that failed').add(writes['errors']),
+            MetricFamily('upload_writes_dropped_total', 'counter', 'Buffered upload row updates dropped after repeated rejected writes').add(writes['dropped']),
+        ]
+        
+        if self.shared_queue:
+            shared = self.shared_queue.get_stats()
+            families += [
+                MetricFamily('upload_shared_jobs_active', 'gauge', 'Claimed shared-queue jobs running on this worker').add(shared['active']),
+                MetricFamily('upload_shared_jobs_claimed_total', 'counter', 'Shared-queue jobs claimed').add(shared['claimed']),
+                MetricFamily('upload_shared_lost_leases_total', 'counter', 'Shared-queue leases lost to other workers').add(shared['lost_leases']),
+            ]
+        return families
+
+    def get_pending_retries(self) -> List[Dict[str, Any]]:
+        """Retries waiting in the persistent scheduler, soonest first"""
+        return self.retry_scheduler.pending() if self.retry_scheduler else []
+
+    def _dispatch_retry(self, entry: Dict) -> bool:
+        """Scheduler callback: queue a due retry (the telegram_uploads row is the logged stage)"""
+        return self.upload_queue.submit(('resume', self._client, {
+            'job_key': entry['job_key'],
+            'stage': STAGE_LOGGED,
+            'file_info': entry['file_info'],
+            'source': entry['source'],
+            'upload_id': entry['upload_id'],
+            'doodstream_result': None,
+            'video_id': None,
+            'retry_count': entry['retry_count']
+        }))
+
+    def _abandon_retry(self, entry: Dict):
+        """Scheduler callback: a retry kept dying with the process and is out of attempts"""
+        if self.upload_journal:
+            self.upload_journal.finish(entry['job_key'])
+        asyncio.create_task(self._update_upload_status(
+            entry['upload_id'], 'failed',
+            error_message=f"Retry interrupted {entry['retry_count']} times - giving up"
+        ))
+
+    def get_shared_queue_stats(self) -> Optional[Dict[str, Any]]:
+        """Shared job queue metrics (None in local mode)"""
+        return self.shared_queue.get_stats() if self.shared_queue else None
+
+    async def _enqueue_shared_upload(self, file_info: Dict, source: Dict) -> bool:
+        """Queue an accepted upload for whichever worker claims it first"""
+        upload_data = self._build_upload_row(file_info, source, 'pending')
+        upload_data['job_payload'] = {
+            'file_info': portable_file_info(file_info),
+            'source': source
+        }
+        
+        result = await self.supabase.enqueue_upload_job(upload_data)
+        if not result:
+            logger.error("Failed to queue upload job")
+            await self._log_upload_failure(file_info, "Database logging failed")
+            return False
+        
+        if self.duplicate_index:
+            self.duplicate_index.add(file_info['file_unique_id'])
+        
+        if result.get('created'):
+            logger.info(f"Queued upload job {result['upload_id']} for {file_info['original_name']}")
+            self.shared_queue.notify()
+        else:
+            logger.info(f"Upload of {file_info['file_unique_id']} already queued by another instance")
+        return True
+
+    async def _run_claimed_job(self, row: Dict):
+        """Shared worker entry point: run the pipeline for a claimed telegram_uploads row"""
+        payload = row.get('job_payload') or {}
+        if not payload.get('file_info') or not payload.get('source'):
+            logger.error(f"Claimed upload job {row['id']} has no job payload")
+            await self._update_upload_status(row['id'], 'failed', error_message="Missing job payload")
+            return
+        
+        # The row is the logged stage; the pipeline continues from the Doodstream upload
+        await self.resume_upload(self._client, {
+            'job_key': row['telegram_file_unique_id'],
+            'stage': STAGE_LOGGED,
+            'file_info': payload['file_info'],
+            'source': payload['source'],
+            'upload_id': row['id'],
+            'doodstream_result': None,
+            'video_id': None
+        })
+
+    async def resume_unfinished_uploads(self, client: Client) -> int:
+        """Queue jobs a previous run left unfinished in the upload journal"""
+        if not self.upload_journal:
+            return 0
+        
+        resumed = 0
+        for entry in self.upload_journal.unfinished():
+            job_key = entry['job_key']
+            if entry['resume_count'] >= self.MAX_JOURNAL_RESUMES:
+                logger.error(f"Giving up on journaled upload {job_key} after {entry['resume_count']} interrupted attempts")
+                if entry.get('upload_id'):
+                    await self._update_upload_status(entry['upload_id'], 'failed', error_message="Upload interrupted repeatedly by restarts")
+                self.upload_journal.finish(job_key)
+                continue
+            
+            if not self.upload_queue.submit(('resume', client, entry)):
+                logger.warning(f"Upload queue full - journaled upload {job_key} will resume on next start")
+                continue
+            self.upload_journal.mark_resumed(job_key)
+            resumed += 1
+        
+        self.upload_journal.resumed += resumed
+        if resumed:
+            logger.info(f"Resuming {resumed} unfinished uploads from the upload journal")
+        return resumed
+
+    async def resume_upload(self, client: Client, entry: Dict) -> bool:
+        """Continue a journaled upload from its last completed stage"""
+        file_info = entry['file_info']
+        source = entry['source']
+        try:
+            logger.info(f"Resuming upload {file_info.get('original_name')} from stage '{entry['stage']}'")
+            success, shared = await self.upload_flights.run(
+                entry['job_key'],
+                lambda: self._process_group_upload_enhanced(client, file_info, source, entry)
+            )
+            
+            if success is None:
+                logger.info(f"Upload {file_info.get('original_name')} deferred to a scheduled retry")
+                return False
+            
+            await self._react(client, source, "✅" if success else "❌")
+            if success and not shared:
+                await self._notify_admin_success(file_info, source.get('chat_title') or "Unknown Group")
+            return success
+            
+        except Exception as e:
+            logger.error(f"Error resuming upload {entry['job_key']}: {e}")
+            return False
+
+    def _message_source(self, message: Message) -> Dict[str, Any]:
+        """The parts of a message the pipeline needs (kept in the journal for resume)"""
+        return {
+            'chat_id': message.chat.id,
+            'chat_title': message.chat.title,
+            'user_id': message.from_user.id,
+            'message_id': message.id
+        }
+
+    async def _react(self, client: Client, source: Dict, emoji: str):
+        """React to the source message by id (used when the Message object is gone)"""
+        try:
+            await client.send_reaction(source['chat_id'], source['message_id'], emoji)
+        except Exception as e:
+            logger.warning(f"Could not react to message {source.get('message_id')} in chat {source.get('chat_id')}: {e}")
+
+    async def process_group_upload(self, client: Client, message: Message) -> bool:
+        """Run the full upload pipeline for a group message with enhanced filtering"""
         try:
             # Enhanced message filtering
             if not await self._validate_message_context(client, message):
-                return
+                return False
                 
             # Check if sender is admin
             if not await self._is_sender_admin(message.from_user.id):
                 logger.info(f"Upload ignored - sender {message.from_user.id} is not admin")
-                return
+                return False
             
             # Check if group is premium with auto-upload enabled
             if not await self.is_premium_group(message.chat.id):
                 logger.info(f"Upload ignored - group {message.chat.id} not premium or auto-upload disabled")
-                return
+                return False
             
             # Get file information with enhanced validation
             file_info = await self._get_file_info_enhanced(message)
             if not file_info:
                 logger.warning("No valid file found in message or validation failed")
-                return
+                return False
                 
             # Enhanced duration validation with content type check
             if not await self._validate_file_criteria(file_info):
-                return
+                return False
             
             # React to show processing
             await message.react("⏳")
+            source = self._message_source(message)
+            
+            if self.shared_queue:
+                # The claiming worker (on any instance) runs the pipeline and reacts when done
+                queued = await self._enqueue_shared_upload(file_info, source)
+                if not queued:
+                    await message.react("❌")
+                return queued
             
-            # Process the upload with enhanced tracking
-            success = await self._process_group_upload_enhanced(client, message, file_info)
+            # Process the upload with enhanced tracking (or attach to an in-flight upload of the same file)
+            success, shared = await self.upload_flights.run(
+                file_info['file_unique_id'],
+                lambda: self._process_group_upload_enhanced(client, file_info, source)
+            )
             
             if success:
-                logger.info("Group upload completed successfully")
+                logger.info("Group upload completed successfully" + (" (shared in-flight upload)" if shared else ""))
                 await message.react("✅")
-                await self._notify_admin_success(file_info, message.chat.title or "Unknown Group")
+                if not shared:
+                    await self._notify_admin_success(file_info, message.chat.title or "Unknown Group")
+            elif success is None:
+                logger.info("Group upload deferred to a scheduled retry")
             else:
                 logger.error("Group upload failed")
                 await message.react("❌")
+            
+            return bool(success)
                 
         except Exception as e:
-            logger.error(f"Error in handle_group_upload: {e}")
+            logger.error(f"Error in process_group_upload: {e}")
             try:
                 await message.react("❌")
             except:
@@ -91,13 +460,9 @@ class UploadHandler:
             await self._notify_admin_of_failure(
                 file_info.get('original_name', 'Unknown file') if 'file_info' in locals() else "Unknown file", 
                 f"Upload handler error: {str(e)}",
-                {
-                    'chat_id': message.chat.id,
-                    'chat_title': message.chat.title,
-                    'user_id': message.from_user.id,
-                    'message_id': message.id
-                }
+                self._message_source(message)
             )
+            return False
 
     async def _validate_message_context(self, client: Client, message: Message) -> bool:
         """Enhanced message context validation"""
@@ -111,10 +476,10 @@ class UploadHandler:
                 logger.debug("Message has no chat info")
                 return False
                 
-            # Check if bot has proper permissions in the group
+            # Check if bot has proper permissions in the group (cached per chat)
             try:
-                chat_member = await client.get_chat_member(message.chat.id, (await client.get_me()).id)
-                if not chat_member or chat_member.status in ['kicked', 'left']:
+                status = await self._get_own_member_status(client, message.chat.id)
+                if status in (ChatMemberStatus.BANNED, ChatMemberStatus.LEFT):
                     logger.warning(f"Bot not properly joined in chat {message.chat.id}")
                     return False
             except Exception as e:
@@ -127,9 +492,58 @@ class UploadHandler:
             logger.error(f"Error validating message context: {e}")
             return False
 
+    async def load_identity(self, client: Client):
+        """Resolve own account identity once at startup"""
+        try:
+            self._me = await client.get_me()
+            logger.info(f"Upload handler running as {self._me.id}")
+        except Exception as e:
+            logger.error(f"Error resolving own identity: {e}")
+
+    async def _get_own_member_status(self, client: Client, chat_id: int) -> Optional[ChatMemberStatus]:
+        """Own membership status in a chat; only asks Telegram on the first message from a chat"""
+        status = self._chat_member_status.get(chat_id)
+        if status is not None:
+            return status
+        
+        if not self._me:
+            await self.load_identity(client)
+        
+        chat_member = await client.get_chat_member(chat_id, self._me.id)
+        status = chat_member.status if chat_member else ChatMemberStatus.LEFT
+        self._chat_member_status[chat_id] = status
+        return status
+
+    async def handle_chat_member_updated(self, client: Client, update: ChatMemberUpdated):
+        """Keep own cached membership current from chat member update events"""
+        try:
+            if not self._me or not update.chat:
+                return
+            
+            member = update.new_chat_member or update.old_chat_member
+            if not member or not member.user or member.user.id != self._me.id:
+                return
+            
+            if update.new_chat_member:
+                status = update.new_chat_member.status
+            else:
+                # Member record removed entirely (left the chat)
+                status = ChatMemberStatus.LEFT
+            
+            self._chat_member_status[update.chat.id] = status
+            logger.info(f"Own membership in chat {update.chat.id} is now {status}")
+            
+        except Exception as e:
+            logger.error(f"Error handling chat member update: {e}")
+
     async def _is_sender_admin(self, telegram_user_id: int) -> bool:
-        """Check if sender is admin using Supabase RPC"""
+        """Check if sender is admin (membership cache first, Supabase RPC as fallback)"""
         try:
+            if self.membership_cache:
+                cached = await self.membership_cache.is_admin(telegram_user_id)
+                if cached is not None:
+                    return cached
+            
             result = await self.supabase.is_user_admin(telegram_user_id)
             return result
         except Exception as e:
@@ -137,10 +551,14 @@ class UploadHandler:
             return False
 
     async def is_premium_group(self, chat_id: int) -> bool:
-        """Check if chat is premium group with auto-upload enabled using Supabase RPC"""
+        """Check if chat is premium group with auto-upload enabled (membership cache first, Supabase RPC as fallback)"""
         try:
-            result = self.supabase.client.rpc('is_premium_group_with_autoupload', {'chat_id_param': chat_id}).execute()
-            return result.data if result.data is not None else False
+            if self.membership_cache:
+                cached = await self.membership_cache.is_premium_group(chat_id)
+                if cached is not None:
+                    return cached
+            
+            return await self.supabase.is_premium_group(chat_id)
         except Exception as e:
             logger.error(f"Error checking premium group status for {chat_id}: {e}")
             return False
@@ -248,9 +666,19 @@ class UploadHandler:
             return False
 
     async def _is_duplicate_upload(self, file_unique_id: str) -> bool:
-        """Check if file was already uploaded"""
+        """Check if file was already uploaded (local index first, database on a possible hit or an unconfirmed miss)"""
         try:
+            index = self.duplicate_index
+            if index and index.ready:
+                if index.might_contain(file_unique_id):
+                    if index.contains(file_unique_id):
+                        return True
+                elif not index.confirm_negatives:
+                    return False
+            
             result = await self.supabase.check_duplicate_upload(file_unique_id)
+            if result and index and index.ready:
+                index.add(file_unique_id)
             return result
         except Exception as e:
             logger.error(f"Error checking duplicate upload: {e}")
@@ -277,59 +705,65 @@ class UploadHandler:
             logger.error(f"Error generating random filename: {e}")
             return f"upload_{secrets.token_hex(6)}"
 
-    async def _process_group_upload_enhanced(self, client: Client, message: Message, file_info: Dict) -> bool:
-        """Process group upload to Doodstream with enhanced tracking and retry logic"""
-        upload_id = None
+    async def _process_group_upload_enhanced(self, client: Client, file_info: Dict, source: Dict, entry: Optional[Dict] = None) -> Optional[bool]:
+        """Run the upload pipeline and record its outcome and duration"""
+        started = time.monotonic()
+        success = await self._run_upload_pipeline(client, file_info, source, entry)
+        outcome = 'deferred' if success is None else ('completed' if success else 'failed')
+        UPLOAD_JOBS.labels(outcome).inc()
+        UPLOAD_JOB_SECONDS.labels(outcome).observe(time.monotonic() - started)
+        return success
+
+    async def _run_upload_pipeline(self, client: Client, file_info: Dict, source: Dict, entry: Optional[Dict] = None) -> Optional[bool]:
+        """Process group upload to Doodstream with enhanced tracking and retry logic
+
+        Each completed stage is written to the upload journal; a resumed job
+        (entry from the journal) skips the stages it already finished.
+        Returns None when the job was handed to the retry scheduler.
+        """
+        job_key = file_info['file_unique_id']
+        journal = self.upload_journal
+        upload_id = entry.get('upload_id') if entry else None
+        doodstream_result = entry.get('doodstream_result') if entry else None
+        video_id = entry.get('video_id') if entry else None
         try:
             # Generate filename with enhanced metadata
             filename = file_info['random_filename']
             
-            # Enhanced upload logging with metadata
-            upload_data = {
-                'telegram_file_id': file_info['file_id'],
-                'telegram_file_unique_id': file_info['file_unique_id'],
-                'telegram_chat_id': message.chat.id,
-                'telegram_user_id': message.from_user.id,
-                'telegram_message_id': message.id,
-                'original_filename': file_info['original_name'],
-                'file_size': file_info['file_size'],
-                'mime_type': file_info['mime_type'],
-                'upload_status': 'processing'
-            }
+            if journal and not entry:
+                journal.begin(job_key, file_info, source)
             
-            upload_id = await self.supabase.log_upload(upload_data)
             if not upload_id:
-                logger.error("Failed to log upload to database")
-                await self._log_upload_failure(file_info, "Database logging failed")
-                return False
-            
-            # Stream upload to Doodstream with retry mechanism
-            doodstream_result = await self._stream_to_doodstream_with_retry(client, message, file_info, filename, upload_id)
-            
-            if doodstream_result and doodstream_result.get('success'):
-                # Update upload status to completed
-                await self._update_upload_status(upload_id, 'completed', file_code=doodstream_result.get('file_code'))
+                # An interrupted run may have logged the row without journaling it
+                if entry:
+                    upload_id = await self.supabase.get_upload_id_by_file_unique_id(job_key)
                 
-                # Create video record in database with enhanced metadata
-                video_id = await self._create_video_record_enhanced(file_info, doodstream_result, message, upload_id)
+                if not upload_id:
+                    upload_id = await self.supabase.log_upload(self._build_upload_row(file_info, source, 'processing'))
                 
-                if video_id:
-                    logger.info(f"Successfully created video record: {video_id}")
-                    
-                    # Update telegram upload with video_id reference
-                    await self.supabase.update_upload_with_video_id(upload_id, video_id)
-                    
-                    return True
-                else:
-                    logger.error("Failed to create video record")
-                    await self._update_upload_status(upload_id, 'failed', error_message="Failed to create video record")
-                    await self._log_upload_failure(file_info, "Video record creation failed", upload_id)
+                if not upload_id:
+                    logger.error("Failed to log upload to database")
+                    await self._log_upload_failure(file_info, "Database logging failed")
+                    self._journal_finish(job_key)
                     return False
-            else:
-                # Enhanced error handling with provider-specific categorization
-                error_context = {}
                 
-                if doodstream_result:
+                if journal:
+                    journal.advance(job_key, STAGE_LOGGED, upload_id=upload_id)
+                if self.duplicate_index:
+                    self.duplicate_index.add(file_info['file_unique_id'])
+            
+            if not doodstream_result:
+                # Stream upload to Doodstream with retry mechanism
+                attempt = (entry.get('retry_count') or 0) + 1 if entry else 1
+                doodstream_result = await self._stream_to_doodstream_with_retry(client, file_info, filename, upload_id, attempt)
+                
+                if not doodstream_result.get('success'):
+                    if doodstream_result.get('retry_in') is not None and await self._schedule_retry(file_info, source, upload_id, doodstream_result):
+                        return None
+                    
+                    # Enhanced error handling with provider-specific categorization
+                    error_context = {}
+                    
                     # Parse dual upload results for categorized errors
                     regular_result = doodstream_result.get('regular_result', {})
                     premium_result = doodstream_result.get('premium_result', {})
@@ -339,62 +773,253 @@ class UploadHandler:
                     
                     if not premium_result.get('success'):
                         error_context['premium_error'] = premium_result.get('error', 'Unknown premium upload error')
+                    
+                    # Kept so a provider-targeted retry can finish the job without redoing this half
+                    error_context['file_codes'] = {
+                        name: provider_result.get('file_code')
+                        for name, provider_result in (('regular', regular_result), ('premium', premium_result))
+                        if provider_result.get('success') and provider_result.get('file_code')
+                    }
                         
                     error_msg = doodstream_result.get('error', 'Dual upload failed')
-                else:
-                    error_msg = 'No response from Doodstream'
-                    error_context['general_error'] = error_msg
+                    
+                    if doodstream_result.get('failure_class'):
+                        error_context['failure_class'] = doodstream_result['failure_class']
+                        error_context['retry_decisions'] = doodstream_result.get('retry_decisions', [])
+                    
+                    await self._update_upload_status(upload_id, 'failed', error_message=error_msg)
+                    await self._log_upload_failure(file_info, error_msg, upload_id, error_context)
+                    logger.error(f"Doodstream upload failed: {error_msg}")
+                    self._journal_finish(job_key)
+                    return False
                 
-                await self._update_upload_status(upload_id, 'failed', error_message=error_msg)
-                await self._log_upload_failure(file_info, error_msg, upload_id, error_context)
-                logger.error(f"Doodstream upload failed: {error_msg}")
-                return False
+                if journal:
+                    journal.advance(job_key, STAGE_UPLOADED, doodstream_result=doodstream_result)
+            
+            # Update upload status to completed (written together with the video_id below). Also on
+            # a resumed job: the buffered write may have been lost with the process that uploaded it
+            await self._update_upload_status(upload_id, 'completed', file_code=doodstream_result.get('file_code'), flush=False)
+            
+            if not video_id:
+                # Create video record in database with enhanced metadata
+                video_id = await self._create_video_record_enhanced(file_info, doodstream_result, source, upload_id)
+                
+                if not video_id:
+                    logger.error("Failed to create video record")
+                    await self._update_upload_status(upload_id, 'failed', error_message="Failed to create video record")
+                    await self._log_upload_failure(file_info, "Video record creation failed", upload_id)
+                    self._journal_finish(job_key)
+                    return False
+                
+                logger.info(f"Successfully created video record: {video_id}")
+                if journal:
+                    journal.advance(job_key, STAGE_RECORDED, video_id=video_id)
+            
+            # Update telegram upload with video_id reference; flushed before the journal forgets the job
+            await self.supabase.update_upload_with_video_id(upload_id, video_id, flush=True)
+            self._journal_finish(job_key)
+            return True
                 
         except Exception as e:
             logger.error(f"Error processing enhanced group upload: {e}")
             if upload_id:
                 await self._update_upload_status(upload_id, 'failed', error_message=str(e))
                 await self._log_upload_failure(file_info, str(e), upload_id)
+            self._journal_finish(job_key)
+            return False
+
+    def _build_upload_row(self, file_info: Dict, source: Dict, status: str) -> Dict[str, Any]:
+        """telegram_uploads row with enhanced metadata"""
+        return {
+            'telegram_file_id': file_info['file_id'],
+            'telegram_file_unique_id': file_info['file_unique_id'],
+            'telegram_chat_id': source['chat_id'],
+            'telegram_user_id': source['user_id'],
+            'telegram_message_id': source['message_id'],
+            'original_filename': file_info['original_name'],
+            'file_size': file_info['file_size'],
+            'mime_type': file_info['mime_type'],
+            'upload_status': status
+        }
+
+    def _journal_finish(self, job_key: str, retry_pending: bool = False):
+        """Drop a job from the upload journal (and retry schedule) once its outcome is recorded in the database"""
+        try:
+            if self.upload_journal:
+                self.upload_journal.finish(job_key)
+            if self.retry_scheduler and not retry_pending:
+                self.retry_scheduler.complete(job_key)
+        except Exception as e:
+            logger.error(f"Error updating upload journal: {e}")
+
+    async def _schedule_retry(self, file_info: Dict, source: Dict, upload_id: str, result: Dict) -> bool:
+        """Hand a failed attempt to the retry scheduler; False once the job is out of retries"""
+        if not self.retry_scheduler:
+            return False
+        job_key = file_info['file_unique_id']
+        delay = result['retry_in']
+        try:
+            scheduled = self.retry_scheduler.schedule(
+                job_key, delay, file_info, source, upload_id,
+                failure_class=result.get('failure_class'),
+                reason=result.get('error')
+            )
+        except Exception as e:
+            logger.error(f"Error scheduling retry for {job_key}: {e}")
+            return False
+        
+        if not scheduled:
+            logger.warning(f"Upload {job_key} used all {self.retry_scheduler.max_total_retries} scheduled retries")
             return False
+        
+        # Not 'processing': shared-mode workers must not reclaim the row while it waits
+        await self._update_upload_status(upload_id, 'retrying', error_message=f"Retry scheduled in {delay:.0f}s ({result.get('failure_class')})")
+        self._journal_finish(job_key, retry_pending=True)
+        return True
 
-    async def _stream_to_doodstream_with_retry(self, client: Client, message: Message, file_info: Dict, filename: str, upload_id: str) -> Optional[Dict]:
-        """Stream file to Doodstream with retry logic"""
-        max_retries = 3
-        retry_delay = 5  # seconds
+    async def _stream_to_doodstream_with_retry(self, client: Client, file_info: Dict, filename: str, upload_id: str, attempt: int = 1) -> Dict:
+        """Stream file to Doodstream, retrying each failure according to its class
+
+        Transient failures back off with jitter, throttled ones wait for the
+        provider's retry-after and permanent ones are dead-lettered at once.
+        Providers whose circuit is open are skipped and failed fast while the
+        others are still uploaded to. With a retry scheduler
+        the wait is not slept here: the result carries 'retry_in' and the job
+        is re-queued when due.
+        """
+        result = None
+        decisions = []
         
-        for attempt in range(max_retries):
+        while True:
+            # Reserve a call on each provider; an open circuit refuses it
+            allowed = {name: breaker.allow_request() for name, breaker in self.provider_breakers.items()}
+            if not any(allowed.values()):
+                logger.warning(f"All Doodstream provider circuits open - failing {filename} fast")
+                return self._circuit_open_result()
+            
+            providers = [name for name, ok in allowed.items() if ok]
+            if len(providers) < len(allowed):
+                logger.warning(f"Doodstream circuit open ({', '.join(name for name, ok in allowed.items() if not ok)}) - uploading {filename} to {', '.join(providers)} only")
+            
+            started = time.monotonic()
             try:
-                logger.info(f"Doodstream upload attempt {attempt + 1}/{max_retries} for {filename}")
-                
-                # Update status to show current attempt
-                if attempt > 0:
-                    await self._update_upload_status(upload_id, 'processing', error_message=f"Retry attempt {attempt + 1}/{max_retries}")
-                
-                result = await self._stream_to_doodstream(client, message, file_info, filename)
-                
-                if result and result.get('success'):
-                    logger.info(f"Doodstream upload successful on attempt {attempt + 1}")
-                    return result
-                    
-                if attempt < max_retries - 1:
-                    logger.warning(f"Doodstream upload failed on attempt {attempt + 1}, retrying in {retry_delay}s...")
-                    await asyncio.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    
+                logger.info(f"Doodstream upload attempt {attempt} for {filename}")
+                result = await self._stream_to_doodstream(client, file_info, filename, providers)
             except Exception as e:
-                logger.error(f"Error on upload attempt {attempt + 1}: {e}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay)
-                    retry_delay *= 2
+                logger.error(f"Error on upload attempt {attempt}: {e}")
+                result = {'success': False, 'error': str(e), 'exception_type': type(e).__name__}
+            elapsed = time.monotonic() - started
+            UPLOAD_ATTEMPTS.inc()
+            UPLOAD_ATTEMPT_SECONDS.labels('success' if result and result.get('success') else 'failure').observe(elapsed)
+            if not (result and result.get('success')):
+                UPLOAD_FAILURES.inc()
+            
+            outcomes = self._provider_outcomes(result)
+            for name, succeeded in outcomes.items():
+                if allowed[name]:
+                    if succeeded:
+                        self.provider_breakers[name].record_success()
+                    else:
+                        self.provider_breakers[name].record_failure()
+            
+            if result and result.get('success'):
+                logger.info(f"Doodstream upload successful on attempt {attempt}")
+                return result
+            
+            classification = classify_failure(result)
+            delay = self.retry_engine.decide(classification, attempt, elapsed)
+            
+            # Retrying cannot help while every failing provider's circuit is open
+            failing = [name for name, succeeded in outcomes.items() if not succeeded]
+            if delay is not None and failing and not any(self.provider_breakers[name].available() for name in failing):
+                logger.warning(f"Doodstream provider circuit open ({', '.join(failing)}) - not retrying {filename}")
+                delay = None
+            
+            decisions.append({
+                'attempt': attempt,
+                'class': classification.category,
+                'reason': classification.reason,
+                'retry_in': round(delay, 1) if delay is not None else None
+            })
+            
+            if delay is None:
+                break
+            
+            logger.warning(f"Doodstream upload failed on attempt {attempt} ({classification.category}: {classification.reason}), retrying in {delay:.1f}s...")
+            if self.retry_scheduler:
+                break
+            
+            await self._update_upload_status(upload_id, 'processing', error_message=f"Retry attempt {attempt + 1} ({classification.category})", flush=False)
+            await asyncio.sleep(delay)
+            attempt += 1
         
-        logger.error(f"All {max_retries} upload attempts failed for {filename}")
-        return None
+        if delay is None:
+            if classification.category == PERMANENT:
+                logger.error(f"Permanent failure for {filename} ({classification.reason}) - dead-lettered without retrying")
+            else:
+                logger.error(f"Upload attempts failed for {filename}")
+        
+        result = dict(result or {'success': False, 'error': 'No response from Doodstream'})
+        result['failure_class'] = classification.category
+        result['retry_decisions'] = decisions
+        result['retry_in'] = delay
+        return result
+
+    def _provider_outcomes(self, result: Optional[Dict]) -> Dict[str, bool]:
+        """Per-provider success of a dual upload result"""
+        if result and result.get('success'):
+            return {name: True for name in self.provider_breakers}
+        outcomes = {}
+        for name in self.provider_breakers:
+            provider_result = (result or {}).get(f'{name}_result') or {}
+            outcomes[name] = bool(provider_result.get('success'))
+        return outcomes
+
+    def _circuit_open_result(self) -> Dict:
+        error = 'Provider circuit open - upload skipped'
+        return {
+            'success': False,
+            'error': f"Doodstream circuit open ({', '.join(self.provider_breakers)})",
+            'circuit_open': True,
+            'regular_result': {'success': False, 'error': error, 'circuit_open': True},
+            'premium_result': {'success': False, 'error': error, 'circuit_open': True}
+        }
+
+    async def _stream_to_providers(self, client: Client, file_info: Dict, filename: str, providers: List[str]) -> Dict:
+        """Stream the file to some providers' pool accounts only; the others are reported as skipped"""
+        labels = {name: doodstream_client.PROVIDER_ACCOUNTS[name] for name in providers}
+        results = dict(await doodstream_client.dood_stream_upload_to(
+            list(labels.values()),
+            client.stream_media(file_info['file_id']),
+            filename,
+            file_info.get('file_size')
+        ))
+        
+        result: Dict[str, Any] = {'success': False}
+        errors = []
+        for name in self.provider_breakers:
+            if name in labels:
+                provider_result = results.get(labels[name]) or {'success': False, 'error': 'No result'}
+            else:
+                provider_result = {'success': False, 'error': 'Provider circuit open - upload skipped', 'circuit_open': True}
+            result[f'{name}_result'] = provider_result
+            if not provider_result.get('success'):
+                errors.append(f"{name}: {provider_result.get('error', 'Unknown error')}")
+        result['error'] = '; '.join(errors)
+        return result
 
-    async def _stream_to_doodstream(self, client: Client, message: Message, file_info: Dict, filename: str) -> Optional[Dict]:
-        """Stream file data directly to Doodstream via Supabase edge function"""
+    async def _stream_to_doodstream(self, client: Client, file_info: Dict, filename: str, providers: Optional[List[str]] = None) -> Optional[Dict]:
+        """Stream file data directly to Doodstream via Supabase edge function
+
+        With `providers` set to a subset (the others' circuits are open) only
+        those are uploaded to, straight from Telegram to their pool accounts.
+        """
         try:
+            if providers is not None and set(providers) != set(self.provider_breakers):
+                return await self._stream_to_providers(client, file_info, filename, providers)
+            
             # Call the doodstream-premium edge function for dual upload
-            result = self.supabase.client.functions.invoke(
+            result = await self.supabase.client.functions.invoke(
                 'doodstream-premium',
                 {
                     'action': 'upload_dual',
@@ -422,27 +1047,152 @@ class UploadHandler:
             else:
                 error_message = result.data.get('error', 'Unknown error') if result.data else 'No response'
                 logger.error(f"Doodstream upload failed: {error_message}")
-                return {'success': False, 'error': error_message}
+                return {
+                    'success': False,
+                    'error': error_message,
+                    'status_code': result.status_code,
+                    'retry_after': result.headers.get('retry-after') or (result.data or {}).get('retry_after'),
+                    'regular_result': (result.data or {}).get('regular_result') or {},
+                    'premium_result': (result.data or {}).get('premium_result') or {}
+                }
                 
         except Exception as e:
             logger.error(f"Error streaming to Doodstream: {e}")
-            return {'success': False, 'error': str(e)}
+            return {
+                'success': False,
+                'error': str(e),
+                'status_code': getattr(e, 'status_code', None),
+                'exception_type': type(e).__name__
+            }
 
-    async def _update_upload_status(self, upload_id: str, status: str, error_message: Optional[str] = None, file_code: Optional[str] = None):
-        """Update upload status in database"""
+    async def retry_failed_upload(self, failure_id: str, provider: str = 'both') -> bool:
+        """Re-upload a logged failure to only the provider(s) that failed, streaming the stored telegram_file_id"""
         try:
-            update_data = {
-                'upload_status': status,
-                'processed_at': datetime.now().isoformat() if status in ['completed', 'failed'] else None
-            }
-            
-            if error_message:
-                update_data['error_message'] = error_message
-                
-            if file_code:
-                update_data['doodstream_file_code'] = file_code
-            
-            await self.supabase.update_upload_status(upload_id, status, error_message)
+            success, _ = await self.upload_flights.run(
+                f"retry:{failure_id}",
+                lambda: self._retry_failed_providers(failure_id, provider)
+            )
+            return success
+        except Exception as e:
+            logger.error(f"Error retrying upload failure {failure_id}: {e}")
+            return False
+
+    async def _retry_failed_providers(self, failure_id: str, provider: str) -> bool:
+        failure = await self.supabase.get_upload_failure_by_id(failure_id)
+        if not failure:
+            logger.error(f"Upload failure {failure_id} not found")
+            return False
+        
+        attempt_count = failure.get('attempt_count', 0) + 1
+        if attempt_count > self.MAX_FAILURE_RETRIES:
+            await self.supabase.mark_upload_manual_required(failure_id)
+            return False
+        await self.supabase.update_failure_attempt_count(failure_id, attempt_count)
+        
+        error_details = dict(failure.get('error_details') or {})
+        upload = await self.supabase.get_upload_by_failure_id(failure_id)
+        if not upload or not upload.get('telegram_file_id'):
+            logger.error(f"No telegram upload with a file id recorded for failure {failure_id}")
+            return False
+        
+        # Only providers that actually failed are re-uploaded; the successful half is kept
+        failed = [name for name in ('regular', 'premium') if error_details.get(f'{name}_error')] or ['regular', 'premium']
+        targets = failed if provider == 'both' else [name for name in failed if name == provider]
+        if not targets:
+            logger.info(f"{provider.title()} upload for failure {failure_id} did not fail - nothing to retry")
+            return True
+        
+        file_info = dict(error_details.get('file_info') or {})
+        filename = file_info.get('random_filename') or self._generate_random_filename(upload.get('original_filename') or 'video.mp4')
+        labels = {name: doodstream_client.PROVIDER_ACCOUNTS[name] for name in targets}
+        logger.info(f"Retrying {', '.join(targets)} upload of {filename} for failure {failure_id}")
+        
+        results = dict(await doodstream_client.dood_stream_upload_to(
+            list(labels.values()),
+            self._client.stream_media(upload['telegram_file_id']),
+            filename,
+            upload.get('file_size')
+        ))
+        
+        context = dict(error_details.get('context') or {})
+        file_codes = dict(context.get('file_codes') or {})
+        for name, label in labels.items():
+            result = results.get(label) or {'success': False, 'error': 'No result'}
+            if result.get('success'):
+                file_codes[name] = result.get('file_code')
+                error_details[f'{name}_error'] = None
+                context.pop(f'{name}_error', None)
+            else:
+                error_details[f'{name}_error'] = result.get('error', f'Unknown {name} upload error')
+        context['file_codes'] = file_codes
+        error_details['context'] = context
+        
+        remaining = [name for name in ('regular', 'premium') if error_details.get(f'{name}_error')]
+        if len(remaining) == 2:
+            error_details['error_category'] = 'both_failed'
+        elif remaining:
+            error_details['error_category'] = f'{remaining[0]}_failed'
+        else:
+            error_details['error_category'] = 'resolved'
+        
+        resolved = False
+        if not remaining:
+            if file_codes.get('regular'):
+                resolved = await self._complete_retried_upload(upload, file_info, file_codes)
+            else:
+                logger.warning(f"Both providers now hold {filename} but the regular file code was not recorded - create the video record manually")
+        await self.supabase.update_failure_after_retry(failure_id, error_details, resolved)
+        
+        succeeded = all(results.get(label, {}).get('success') for label in labels.values())
+        await self.supabase.add_retry_history(failure_id, {
+            'timestamp': datetime.now().isoformat(),
+            'provider': provider,
+            'targets': targets,
+            'attempt': attempt_count,
+            'success': succeeded
+        })
+        logger.info(f"Retry for failure {failure_id}: {'succeeded' if succeeded else 'failed'} ({', '.join(targets)})"
+                    + (" - upload completed" if resolved else ""))
+        return succeeded
+
+    async def _complete_retried_upload(self, upload: Dict, file_info: Dict, file_codes: Dict[str, str]) -> bool:
+        """Mark the telegram upload completed and create its video record once both halves exist"""
+        upload_id = upload['id']
+        file_info.update({
+            'file_id': upload['telegram_file_id'],
+            'original_name': file_info.get('original_name') or upload.get('original_filename'),
+            'file_size': file_info.get('file_size') or upload.get('file_size')
+        })
+        source = {
+            'chat_id': upload.get('telegram_chat_id'),
+            'chat_title': None,
+            'user_id': upload.get('telegram_user_id'),
+            'message_id': upload.get('telegram_message_id')
+        }
+        doodstream_result = {
+            'success': True,
+            'file_code': file_codes['regular'],
+            'premium_file_code': file_codes.get('premium'),
+            'retried': True
+        }
+        
+        await self._update_upload_status(upload_id, 'completed', file_code=file_codes['regular'], flush=False)
+        video_id = await self._create_video_record_enhanced(file_info, doodstream_result, source, upload_id)
+        if not video_id:
+            logger.error(f"Retried upload {upload_id} finished but the video record could not be created")
+            return False
+        await self.supabase.update_upload_with_video_id(upload_id, video_id, flush=True)
+        return True
+
+    async def _update_upload_status(self, upload_id: str, status: str, error_message: Optional[str] = None, file_code: Optional[str] = None,
+                                    flush: bool = True):
+        """Update upload status in database
+
+        flush=False leaves the write in the buffer to be coalesced with the
+        row's next update; outcomes the journal or scheduler rely on are flushed.
+        """
+        try:
+            await self.supabase.update_upload_status(upload_id, status, error_message, file_code=file_code, flush=flush)
             
         except Exception as e:
             logger.error(f"Error updating upload status: {e}")
@@ -508,15 +1258,10 @@ class UploadHandler:
     async def _trigger_admin_notification(self, failure_data: Dict):
         """Trigger real-time admin notification for upload failure"""
         try:
-            # Import notification bot (lazy import to avoid circular dependency)
-            from ..utils.telegram_bot import TelegramNotificationBot
-            
-            # Get client reference (this would be passed from main)
-            if hasattr(self, '_client'):
-                notification_bot = TelegramNotificationBot(self._client, self.supabase)
-                await notification_bot.notify_upload_failure(failure_data)
+            if self.notification_bot:
+                await self.notification_bot.notify_upload_failure(failure_data)
             else:
-                logger.warning("Client not available for real-time notifications")
+                logger.warning("Notification bot not available for real-time notifications")
                 
         except Exception as e:
             logger.error(f"Error triggering admin notification: {e}")
@@ -564,15 +1309,12 @@ class UploadHandler:
             
             # Real-time success notification
             try:
-                from ..utils.telegram_bot import TelegramNotificationBot
-                
-                if hasattr(self, '_client'):
-                    notification_bot = TelegramNotificationBot(self._client, self.supabase)
+                if self.notification_bot:
                     success_data = {
                         'file_info': file_info,
                         'group_name': group_name
                     }
-                    await notification_bot.notify_upload_success(success_data)
+                    await self.notification_bot.notify_upload_success(success_data)
                     
             except Exception as e:
                 logger.error(f"Error sending real-time success notification: {e}")
@@ -584,13 +1326,17 @@ class UploadHandler:
         """Set client reference for real-time notifications"""
         self._client = client
 
-    async def _create_video_record_enhanced(self, file_info: Dict, doodstream_result: Dict, message: Message, upload_id: str) -> Optional[str]:
+    def set_notification_bot(self, notification_bot):
+        """Set the shared admin notification service"""
+        self.notification_bot = notification_bot
+
+    async def _create_video_record_enhanced(self, file_info: Dict, doodstream_result: Dict, source: Dict, upload_id: str) -> Optional[str]:
         """Create enhanced video record in database with full metadata"""
         try:
             # Generate enhanced metadata
             video_data = {
                 'title': file_info['original_name'],
-                'description': f"Auto-uploaded from Telegram group: {message.chat.title or 'Unknown'}\nUpload ID: {upload_id}",
+                'description': f"Auto-uploaded from Telegram group: {source.get('chat_title') or 'Unknown'}\nUpload ID: {upload_id}",
                 'file_code': doodstream_result['file_code'],
                 'doodstream_file_code': doodstream_result['file_code'],
                 'file_size': file_info['file_size'],
@@ -599,8 +1345,8 @@ class UploadHandler:
                 'provider_data': {
                     'upload_source': 'telegram_auto',
                     'telegram_file_id': file_info['file_id'],
-                    'telegram_chat_id': message.chat.id,
-                    'telegram_user_id': message.from_user.id,
+                    'telegram_chat_id': source['chat_id'],
+                    'telegram_user_id': source['user_id'],
                     'upload_timestamp': file_info.get('upload_timestamp'),
                     'doodstream_response': doodstream_result
                 }
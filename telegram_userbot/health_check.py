@@ -19,6 +19,7 @@ sys.path.append(str(Path(__file__).parent))
 from config import Config
 from utils.logger_setup import logger
 from utils.supabase_client import SupabaseManager
+from utils.system_sampler import get_sampler
 
 class HealthChecker:
     def __init__(self):
@@ -33,16 +34,14 @@ class HealthChecker:
     async def check_system_resources(self):
         """Check system resource usage"""
         try:
-            # CPU usage
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # Sampled off-loop so the other checks run while CPU usage is measured
+            snapshot = await get_sampler().wait_ready()
+            if snapshot is None:
+                raise RuntimeError("System sampler produced no snapshot")
             
-            # Memory usage
-            memory = psutil.virtual_memory()
-            memory_percent = memory.percent
-            
-            # Disk usage
-            disk = psutil.disk_usage('/')
-            disk_percent = disk.percent
+            cpu_percent = snapshot.cpu_percent
+            memory_percent = snapshot.memory_percent
+            disk_percent = snapshot.disk_percent
             
             # Check thresholds
             resource_ok = (
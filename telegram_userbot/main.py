@@ -12,6 +12,7 @@ import asyncio
 import logging
 import os
 import signal
+import socket
 import sys
 from pathlib import Path
 from typing import Optional
@@ -52,6 +53,57 @@ DOWNLOAD_DIR = Path(env_str("DOWNLOAD_DIR", default=str(HERE / "downloads")))
 SESSION_DIR.mkdir(parents=True, exist_ok=True)
 DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# /doodfile: "stream" relays Telegram chunks straight to Doodstream, "disk" downloads first
+DOODFILE_MODE = env_str("DOODFILE_MODE", default="stream").strip().lower()
+
+# Upload worker pool
+UPLOAD_WORKERS    = int(env_str("UPLOAD_WORKERS", default="3"))
+UPLOAD_QUEUE_SIZE = int(env_str("UPLOAD_QUEUE_SIZE", default="100"))
+
+# Upload mode: "local" (process what this session sees) or "shared" (claim jobs
+# from the database so several instances share the work)
+UPLOAD_MODE        = env_str("UPLOAD_MODE", default="local").strip().lower()
+WORKER_ID          = env_str("WORKER_ID", default=f"{socket.gethostname()}-{os.getpid()}")
+JOB_LEASE_SECONDS  = int(env_str("JOB_LEASE_SECONDS", default="300"))
+JOB_POLL_INTERVAL  = float(env_str("JOB_POLL_INTERVAL", default="5"))
+JOB_MAX_ATTEMPTS   = int(env_str("JOB_MAX_ATTEMPTS", default="3"))
+
+# Circuit breakers for Doodstream providers/accounts
+BREAKER_FAILURE_THRESHOLD = int(env_str("BREAKER_FAILURE_THRESHOLD", default="5"))
+BREAKER_RECOVERY_SECONDS  = float(env_str("BREAKER_RECOVERY_SECONDS", default="60"))
+
+# Scheduled upload retries per job, counted across restarts
+RETRY_MAX_TOTAL = int(env_str("RETRY_MAX_TOTAL", default="5"))
+
+# Admin notifications sent concurrently; bursts within the window are merged into one digest
+NOTIFY_CONCURRENCY   = int(env_str("NOTIFY_CONCURRENCY", default="5"))
+NOTIFY_DIGEST_WINDOW = float(env_str("NOTIFY_DIGEST_WINDOW", default="60"))
+
+# Inline-button callback data kept for retry buttons (entries / seconds)
+CALLBACK_STORE_SIZE = int(env_str("CALLBACK_STORE_SIZE", default="2000"))
+CALLBACK_TTL        = float(env_str("CALLBACK_TTL", default="86400"))
+
+# Prometheus /metrics and /health endpoint (port 0 disables it)
+METRICS_HOST = env_str("METRICS_HOST", default="0.0.0.0")
+METRICS_PORT = int(env_str("METRICS_PORT", default="8080"))
+
+# Seconds between background psutil samples shared by monitors and /metrics
+SYSTEM_SAMPLE_INTERVAL = float(env_str("SYSTEM_SAMPLE_INTERVAL", default="5"))
+
+# Rolling /stats counters are seeded from Supabase at startup; in shared mode other instances'
+# writes are only picked up by re-seeding every UPLOAD_STATS_RESEED seconds (0 = startup only)
+UPLOAD_STATS_RESEED = float(env_str("UPLOAD_STATS_RESEED", default="0"))
+
+# The local duplicate index only sees this process's uploads: file ids logged by other writers
+# (shared-mode instances, the web app) are pulled every DUPLICATE_INDEX_SYNC seconds (0 = off), and
+# with DUPLICATE_INDEX_CONFIRM an index miss is checked against Supabase (default: on in shared mode)
+DUPLICATE_INDEX_SYNC    = float(env_str("DUPLICATE_INDEX_SYNC", default="300"))
+DUPLICATE_INDEX_CONFIRM = env_str("DUPLICATE_INDEX_CONFIRM", default="true" if UPLOAD_MODE == "shared" else "false").strip().lower() in ("1", "true", "yes")
+
+# Premium group / admin membership cache
+MEMBERSHIP_CACHE_TTL           = int(env_str("MEMBERSHIP_CACHE_TTL", default="300"))
+MEMBERSHIP_CACHE_POLL_INTERVAL = int(env_str("MEMBERSHIP_CACHE_POLL_INTERVAL", default="30"))
+
 # ---------- Pyrogram ----------
 from pyrogram import Client, filters, types
 
@@ -61,11 +113,25 @@ try:
     from .handlers.admin_handler import AdminHandler
     from .handlers.auth_handler import AuthHandler
     from .utils.supabase_client import SupabaseManager
+    from .utils.membership_cache import MembershipCache
+    from .utils.duplicate_index import DuplicateIndex
+    from .utils.upload_journal import UploadJournal
+    from .utils.retry_scheduler import RetryScheduler
+    from .utils.callback_store import CallbackStore
+    from .utils.metrics import REGISTRY, MetricFamily, MetricsServer, system_metrics
+    from .utils.system_sampler import get_sampler
 except Exception:
     from handlers.upload_handler import UploadHandler
     from handlers.admin_handler import AdminHandler
     from handlers.auth_handler import AuthHandler
     from utils.supabase_client import SupabaseManager
+    from utils.membership_cache import MembershipCache
+    from utils.duplicate_index import DuplicateIndex
+    from utils.upload_journal import UploadJournal
+    from utils.retry_scheduler import RetryScheduler
+    from utils.callback_store import CallbackStore
+    from utils.metrics import REGISTRY, MetricFamily, MetricsServer, system_metrics
+    from utils.system_sampler import get_sampler
 
 def build_client() -> Client:
     """
@@ -94,8 +160,31 @@ app = build_client()
 
 # ---------- Initialize handlers ----------
 supabase_manager = SupabaseManager()
-upload_handler = UploadHandler(supabase_manager)
-admin_handler = AdminHandler(supabase_manager)
+membership_cache = MembershipCache(
+    supabase_manager,
+    ttl=MEMBERSHIP_CACHE_TTL,
+    poll_interval=MEMBERSHIP_CACHE_POLL_INTERVAL,
+)
+duplicate_index = DuplicateIndex(str(SESSION_DIR / "duplicate_index.sqlite3"), confirm_negatives=DUPLICATE_INDEX_CONFIRM)
+upload_journal = UploadJournal(str(SESSION_DIR / "upload_journal.sqlite3"))
+retry_scheduler = RetryScheduler(str(SESSION_DIR / "retry_schedule.sqlite3"), max_total_retries=RETRY_MAX_TOTAL)
+upload_handler = UploadHandler(
+    supabase_manager,
+    upload_workers=UPLOAD_WORKERS,
+    upload_queue_size=UPLOAD_QUEUE_SIZE,
+    membership_cache=membership_cache,
+    duplicate_index=duplicate_index,
+    upload_journal=upload_journal,
+    upload_mode=UPLOAD_MODE,
+    worker_id=WORKER_ID,
+    job_lease_seconds=JOB_LEASE_SECONDS,
+    job_poll_interval=JOB_POLL_INTERVAL,
+    job_max_attempts=JOB_MAX_ATTEMPTS,
+    breaker_failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    breaker_recovery_seconds=BREAKER_RECOVERY_SECONDS,
+    retry_scheduler=retry_scheduler,
+)
+admin_handler = AdminHandler(supabase_manager, upload_handler=upload_handler, membership_cache=membership_cache)
 auth_handler = AuthHandler(supabase_manager)
 
 # Import notification bot for real-time admin notifications
@@ -104,6 +193,39 @@ try:
 except Exception:
     from utils.telegram_bot import TelegramNotificationBot
 
+# One notification service shared by every handler (keeps the admin cache warm)
+callback_store = CallbackStore(str(SESSION_DIR / "callback_store.sqlite3"), max_entries=CALLBACK_STORE_SIZE, ttl=CALLBACK_TTL)
+notification_bot = TelegramNotificationBot(
+    app,
+    supabase_manager,
+    upload_handler=upload_handler,
+    send_concurrency=NOTIFY_CONCURRENCY,
+    digest_window=NOTIFY_DIGEST_WINDOW,
+    callback_store=callback_store,
+)
+upload_handler.set_notification_bot(notification_bot)
+
+# ---------- Metrics ----------
+def telegram_metrics():
+    return [MetricFamily("telegram_api_status", "gauge", "1 while the userbot is connected to Telegram").add(int(bool(app.is_connected)))]
+
+def health_report():
+    queue = upload_handler.get_queue_stats()
+    return {
+        "status": "healthy" if app.is_connected else "unhealthy",
+        "telegram_connected": bool(app.is_connected),
+        "upload_queue": queue["queue_depth"],
+        "busy_workers": queue["busy_workers"],
+        "dropped_messages": queue["dropped_messages"],
+        "pending_retries": retry_scheduler.get_stats()["pending"],
+    }
+
+REGISTRY.add_collector(system_metrics)
+REGISTRY.add_collector(telegram_metrics)
+REGISTRY.add_collector(upload_handler.collect_metrics)
+REGISTRY.add_collector(notification_bot.collect_metrics)
+metrics_server = MetricsServer(REGISTRY, METRICS_HOST, METRICS_PORT, health=health_report) if METRICS_PORT else None
+
 # ---------- Basic commands ----------
 @app.on_message(filters.me & filters.command(["ping"], prefixes=["/", "!", "."]))
 async def ping_handler(client: Client, message: types.Message):
@@ -114,20 +236,24 @@ try:
     from .doodstream_client import (
         dood_remote_upload_all,
         dood_upload_file_all,
+        dood_stream_upload_all,
         has_any_dood_account,
+        aclose_clients as dood_aclose_clients,
     )
 except Exception:
     # fallback import saat dijalankan tanpa package relative
     from doodstream_client import (
         dood_remote_upload_all,
         dood_upload_file_all,
+        dood_stream_upload_all,
         has_any_dood_account,
+        aclose_clients as dood_aclose_clients,
     )
 
 @app.on_message(filters.me & filters.command(["dood"], prefixes=["/", "!", "."]))
 async def dood_remote_handler(client: Client, message: types.Message):
     if not has_any_dood_account():
-        return await message.reply_text("Doodstream not configured. Set DOODSTREAM_API_KEY or DOODSTREAM_PREMIUM_API_KEY in .env")
+        return await message.reply_text("Doodstream not configured. Set DOODSTREAM_API_KEY, DOODSTREAM_PREMIUM_API_KEY or DOODSTREAM_ACCOUNTS in .env")
     args = message.text.split(maxsplit=1)
     if len(args) < 2:
         return await message.reply_text("Usage: /dood <url>")
@@ -149,14 +275,22 @@ async def dood_remote_handler(client: Client, message: types.Message):
 @app.on_message(filters.me & filters.command(["doodfile"], prefixes=["/", "!", "."]))
 async def dood_file_handler(client: Client, message: types.Message):
     if not has_any_dood_account():
-        return await message.reply_text("Doodstream not configured. Set DOODSTREAM_API_KEY or DOODSTREAM_PREMIUM_API_KEY in .env")
+        return await message.reply_text("Doodstream not configured. Set DOODSTREAM_API_KEY, DOODSTREAM_PREMIUM_API_KEY or DOODSTREAM_ACCOUNTS in .env")
     if not message.reply_to_message or not (message.reply_to_message.document or message.reply_to_message.video):
         return await message.reply_text("Reply a file/video with: /doodfile")
-    # download ke DOWNLOAD_DIR
-    await message.reply_text("⬇️ Downloading file...")
-    path = await client.download_media(message.reply_to_message, file_name=str(DOWNLOAD_DIR))
-    await message.reply_text("⏫ Uploading file to Doodstream...")
-    results = await dood_upload_file_all(path)
+    reply = message.reply_to_message
+    if DOODFILE_MODE == "stream":
+        # relay Telegram chunks langsung ke Doodstream (tanpa file sementara), dibaca sekali untuk semua akun
+        media = reply.video or reply.document
+        filename = media.file_name or f"{media.file_unique_id}.mp4"
+        await message.reply_text("⏫ Streaming file to Doodstream...")
+        results = await dood_stream_upload_all(client.stream_media(reply), filename, media.file_size)
+    else:
+        # download ke DOWNLOAD_DIR
+        await message.reply_text("⬇️ Downloading file...")
+        path = await client.download_media(reply, file_name=str(DOWNLOAD_DIR))
+        await message.reply_text("⏫ Uploading file to Doodstream...")
+        results = await dood_upload_file_all(path)
     lines = []
     for label, res in results:
         if isinstance(res, Exception):
@@ -170,21 +304,17 @@ async def dood_file_handler(client: Client, message: types.Message):
 
 # ---------- Auto upload & admin/auth handlers ----------
 
-# Auto-upload videos/documents from premium groups
+# Auto-upload videos/documents from premium groups (queued for the upload workers)
 app.on_message(filters.group & (filters.video | filters.document))(upload_handler.handle_group_upload)
 
-# Initialize notification bot for real-time admin notifications
-notification_bot = None
+# Keep own per-chat membership cache current
+app.on_chat_member_updated()(upload_handler.handle_chat_member_updated)
 
 # Callback query handler for inline keyboard interactions
 @app.on_callback_query()
 async def handle_callback_query(client: Client, callback_query):
     """Handle inline keyboard callback queries"""
     try:
-        global notification_bot
-        if not notification_bot:
-            notification_bot = TelegramNotificationBot(client, supabase_manager)
-        
         await notification_bot.handle_callback_query(callback_query)
         
     except Exception as e:
@@ -199,6 +329,7 @@ app.on_message(filters.me & filters.command(["addgroup"], prefixes=["/", "!", ".
 app.on_message(filters.me & filters.command(["sync"], prefixes=["/", "!", "."]))(admin_handler.handle_sync)
 app.on_message(filters.me & filters.command(["retry"], prefixes=["/", "!", "."]))(admin_handler.handle_retry_upload)
 app.on_message(filters.me & filters.command(["failures"], prefixes=["/", "!", "."]))(admin_handler.handle_failures)
+app.on_message(filters.me & filters.command(["retries"], prefixes=["/", "!", "."]))(admin_handler.handle_retries)
 app.on_message(filters.me & filters.command(["stats"], prefixes=["/", "!", "."]))(admin_handler.handle_stats)
 
 # Account linking command for users
@@ -219,19 +350,41 @@ async def main():
         logger.info("🚀 Starting Telegram User Bot...")
         await app.start()
         
+        # Resource usage is sampled in a background thread; readers only take the latest snapshot
+        get_sampler(SYSTEM_SAMPLE_INTERVAL)
+        if metrics_server:
+            await metrics_server.start()
+        
         # Set client reference for upload handler notifications
         upload_handler.set_client(app)
+        await upload_handler.load_identity(app)
+        
+        # Warm premium group / admin membership cache before accepting uploads
+        await membership_cache.warm()
+        membership_cache.start()
+        
+        # Load local duplicate index (seeded from telegram_uploads on first run)
+        await duplicate_index.load(supabase_manager)
+        
+        # Seed rolling upload counters before the pipeline starts moving them
+        await supabase_manager.seed_upload_stats()
         
-        # Initialize notification bot
-        global notification_bot
-        notification_bot = TelegramNotificationBot(app, supabase_manager)
+        # Batched writer for upload status updates (flushed again by supabase_manager.close())
+        supabase_manager.upload_writes.start()
+        
+        # Start upload worker pool and resume jobs interrupted by the last shutdown
+        upload_journal.open()
+        retry_scheduler.open()
+        callback_store.open()
+        upload_handler.start_workers()
+        await upload_handler.resume_unfinished_uploads(app)
         
         # Start periodic cleanup task for expired callbacks
         async def cleanup_task():
             while True:
                 try:
                     await notification_bot.cleanup_expired_callbacks()
-                    await asyncio.sleep(3600)  # Clean up every hour
+                    await asyncio.sleep(callback_store.slot_seconds)  # One timer-wheel slot
                 except Exception as e:
                     logger.error(f"Error in cleanup task: {e}")
                     await asyncio.sleep(300)  # Retry in 5 minutes on error
@@ -239,18 +392,48 @@ async def main():
         # Start cleanup task in background
         cleanup_task_handle = asyncio.create_task(cleanup_task())
         
+        async def reseed_stats_task():
+            while True:
+                await asyncio.sleep(UPLOAD_STATS_RESEED)
+                await supabase_manager.seed_upload_stats()
+        
+        reseed_task_handle = asyncio.create_task(reseed_stats_task()) if UPLOAD_STATS_RESEED > 0 else None
+        
+        async def sync_duplicate_index_task():
+            while True:
+                await asyncio.sleep(DUPLICATE_INDEX_SYNC)
+                await duplicate_index.sync(supabase_manager)
+        
+        sync_task_handle = asyncio.create_task(sync_duplicate_index_task()) if DUPLICATE_INDEX_SYNC > 0 else None
+        
         logger.info("✅ Userbot started with real-time admin notifications")
         await stop_event.wait()
         
-        # Cancel cleanup task on shutdown
+        # Cancel cleanup task and upload workers on shutdown
         cleanup_task_handle.cancel()
+        if reseed_task_handle:
+            reseed_task_handle.cancel()
+        if sync_task_handle:
+            sync_task_handle.cancel()
+        await upload_handler.stop_workers()
+        await membership_cache.stop()
+        await notification_bot.close()
     except Exception as e:
         logger.error(f"💥 Fatal error: {e}")
         sys.exit(1)
     finally:
         try:
             logger.info("🛑 Stopping Telegram User Bot...")
+            if metrics_server:
+                await metrics_server.stop()
+            get_sampler().stop()
             await app.stop()
+            await supabase_manager.close()
+            await dood_aclose_clients()
+            duplicate_index.close()
+            upload_journal.close()
+            retry_scheduler.close()
+            callback_store.close()
             logger.info("✅ Userbot stopped")
         except Exception as e:
             logger.error(f"Error stopping bot: {e}")
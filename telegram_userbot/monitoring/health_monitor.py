@@ -5,11 +5,12 @@ Monitors system resources, bot responsiveness, API connectivity, and sends alert
 """
 
 import asyncio
-import psutil
 import aiohttp
 import logging
 import json
 import os
+import sys
+from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
@@ -17,6 +18,14 @@ import smtplib
 from email.mime.text import MimeText
 from email.mime.multipart import MimeMultipart
 
+# utils/ lives one level up when run as monitoring/health_monitor.py
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.system_sampler import SystemSampler, get_sampler
+from utils.timeseries import TieredRingStore
+from utils.aggregates import upload_health_metrics
+
+HEALTH_FIELDS = ('cpu_usage', 'memory_usage', 'disk_usage', 'error_rate', 'queue_size', 'active_uploads')
+
 @dataclass
 class HealthMetric:
     timestamp: datetime
@@ -42,11 +51,15 @@ class SystemHealth:
     error_rate: float
 
 class HealthMonitor:
-    def __init__(self, supabase_client, telegram_bot=None, config_path: str = "config/health_monitor.json"):
+    def __init__(self, supabase_client, telegram_bot=None, config_path: str = "config/health_monitor.json",
+                 sampler: Optional[SystemSampler] = None):
         self.supabase = supabase_client
         self.telegram_bot = telegram_bot
+        self.sampler = sampler or get_sampler()
         self.config_path = config_path
-        self.health_history = []
+        # Fixed-size local history (raw / 1-minute / 1-hour tiers) used for trends
+        self.health_history = TieredRingStore(HEALTH_FIELDS)
+        self._history_seeded = False
         self.alert_cooldowns = {}
         self.monitoring_active = False
         
@@ -109,24 +122,19 @@ class HealthMonitor:
 
     async def collect_system_metrics(self) -> SystemHealth:
         """Collect comprehensive system health metrics"""
-        # CPU usage
-        cpu_usage = psutil.cpu_percent(interval=1)
-        
-        # Memory usage
-        memory = psutil.virtual_memory()
-        memory_usage = memory.percent
-        
-        # Disk usage
-        disk = psutil.disk_usage('/')
-        disk_usage = (disk.used / disk.total) * 100
-        
-        # Network I/O
-        network = psutil.net_io_counters()
+        # CPU, memory, disk and network come from the shared sampler (never sampled on the event loop)
+        snapshot = self.sampler.snapshot() or await self.sampler.wait_ready()
+        if snapshot is None:
+            raise RuntimeError("System sampler produced no snapshot")
+        
+        cpu_usage = snapshot.cpu_percent
+        memory_usage = snapshot.memory_percent
+        disk_usage = snapshot.disk_percent
         network_io = {
-            'bytes_sent': network.bytes_sent,
-            'bytes_recv': network.bytes_recv,
-            'packets_sent': network.packets_sent,
-            'packets_recv': network.packets_recv
+            'bytes_sent': snapshot.net_bytes_sent,
+            'bytes_recv': snapshot.net_bytes_recv,
+            'packets_sent': snapshot.net_packets_sent,
+            'packets_recv': snapshot.net_packets_recv
         }
         
         # Check bot responsiveness
@@ -210,38 +218,12 @@ class HealthMonitor:
     async def _get_upload_metrics(self) -> Dict:
         """Get upload-related health metrics from database"""
         try:
-            # Get active uploads count
-            active_result = await self.supabase.table('telegram_uploads')\
-                .select('count')\
-                .eq('upload_status', 'processing')\
-                .execute()
-            active_uploads = len(active_result.data) if active_result.data else 0
-            
-            # Get queue size
-            queue_result = await self.supabase.table('telegram_uploads')\
-                .select('count')\
-                .eq('upload_status', 'pending')\
-                .execute()
-            queue_size = len(queue_result.data) if queue_result.data else 0
-            
-            # Calculate error rate (last hour)
-            one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-            total_result = await self.supabase.table('telegram_uploads')\
-                .select('upload_status')\
-                .gte('created_at', one_hour_ago.isoformat())\
-                .execute()
-            
-            if total_result.data:
-                total_count = len(total_result.data)
-                failed_count = len([u for u in total_result.data if u['upload_status'] == 'failed'])
-                error_rate = (failed_count / total_count) * 100 if total_count > 0 else 0
-            else:
-                error_rate = 0
-            
+            # Active/pending counts and the last hour's error rate in one aggregate call
+            metrics = await upload_health_metrics(self.supabase, 3600)
             return {
-                'active_uploads': active_uploads,
-                'queue_size': queue_size,
-                'error_rate': error_rate
+                'active_uploads': metrics['active_uploads'],
+                'queue_size': metrics['queue_size'],
+                'error_rate': metrics['error_rate']
             }
         except Exception as e:
             self.logger.error(f"Failed to get upload metrics: {e}")
@@ -456,6 +438,24 @@ class HealthMonitor:
         except Exception as e:
             self.logger.error(f"Failed to store health metrics: {e}")
 
+    def record_health(self, health: SystemHealth):
+        """Add a health sample to the local history"""
+        self.health_history.append({name: getattr(health, name) for name in HEALTH_FIELDS})
+
+    async def _seed_history(self, hours: int = 24):
+        """Load stored health samples once so trends cover the time before this process started"""
+        self._history_seeded = True
+        if len(self.health_history):
+            return
+        for record in reversed(await self.get_health_history(hours)):
+            data = record.get('metric_data') or {}
+            stamp = data.get('timestamp') or record.get('created_at')
+            try:
+                timestamp = datetime.fromisoformat(str(stamp).replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                continue
+            self.health_history.append(data, timestamp)
+
     async def get_health_history(self, hours: int = 24) -> List[Dict]:
         """Get health history from database"""
         try:
@@ -478,11 +478,10 @@ class HealthMonitor:
         current_health = await self.collect_system_metrics()
         status, issues = self._evaluate_health_status(current_health)
         
-        # Get historical data for trends
-        history = await self.get_health_history(24)
-        
-        # Calculate trends
-        trends = self._calculate_trends(history)
+        # Trends come from the local history (loaded from the database once)
+        if not self._history_seeded:
+            await self._seed_history(24)
+        trends = self._calculate_trends(24)
         
         report = {
             'report_generated': datetime.utcnow().isoformat(),
@@ -495,37 +494,22 @@ class HealthMonitor:
         
         return report
 
-    def _calculate_trends(self, history: List[Dict]) -> Dict:
-        """Calculate health trends from historical data"""
-        if len(history) < 2:
+    def _calculate_trends(self, hours: int = 24) -> Dict:
+        """Calculate health trends from the local history"""
+        window = hours * 3600
+        history = self.health_history
+        if len(history.series('cpu_usage', window)) < 2:
             return {}
         
-        # Extract metrics over time
-        cpu_values = []
-        memory_values = []
-        disk_values = []
-        error_rates = []
-        
-        for record in history:
-            data = record.get('metric_data', {})
-            cpu_values.append(data.get('cpu_usage', 0))
-            memory_values.append(data.get('memory_usage', 0))
-            disk_values.append(data.get('disk_usage', 0))
-            error_rates.append(data.get('error_rate', 0))
-        
-        def calculate_trend(values):
-            if len(values) < 2:
-                return 0
-            return (values[0] - values[-1]) / len(values)  # Simple trend calculation
-        
+        fields = history.summary(window)['fields']
         return {
-            'cpu_trend': calculate_trend(cpu_values),
-            'memory_trend': calculate_trend(memory_values),
-            'disk_trend': calculate_trend(disk_values),
-            'error_rate_trend': calculate_trend(error_rates),
-            'avg_cpu_24h': sum(cpu_values) / len(cpu_values) if cpu_values else 0,
-            'avg_memory_24h': sum(memory_values) / len(memory_values) if memory_values else 0,
-            'max_error_rate_24h': max(error_rates) if error_rates else 0
+            'cpu_trend': history.trend('cpu_usage', window),
+            'memory_trend': history.trend('memory_usage', window),
+            'disk_trend': history.trend('disk_usage', window),
+            'error_rate_trend': history.trend('error_rate', window),
+            'avg_cpu_24h': fields['cpu_usage']['avg'] or 0,
+            'avg_memory_24h': fields['memory_usage']['avg'] or 0,
+            'max_error_rate_24h': fields['error_rate']['max'] or 0
         }
 
     def _generate_health_recommendations(self, health: SystemHealth, trends: Dict) -> List[str]:
@@ -577,10 +561,14 @@ class HealthMonitor:
         self.monitoring_active = True
         self.logger.info(f"Starting health monitoring with {interval_seconds}s interval...")
         
+        if not self._history_seeded:
+            await self._seed_history(24)
+        
         while self.monitoring_active:
             try:
                 # Collect health metrics
                 health = await self.collect_system_metrics()
+                self.record_health(health)
                 
                 # Evaluate health status
                 status, issues = self._evaluate_health_status(health)
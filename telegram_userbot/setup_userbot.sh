@@ -35,7 +35,7 @@ source venv/bin/activate
 # 4. Install Python packages
 echo "📚 Installing Python packages..."
 pip install --upgrade pip
-pip install pyrogram tgcrypto supabase httpx aiofiles python-dotenv uvloop python-json-logger
+pip install pyrogram tgcrypto httpx aiofiles python-dotenv uvloop python-json-logger
 
 # 5. Copy bot files
 echo "📋 Copying bot files..."
@@ -121,7 +121,7 @@ python3 --version
 
 echo "2. Checking required packages..."
 python3 -c "import pyrogram; print('✅ Pyrogram installed')"
-python3 -c "import supabase; print('✅ Supabase installed')" 
+python3 -c "import httpx; print('✅ httpx installed (Supabase client)')" 
 python3 -c "import tgcrypto; print('✅ TgCrypto installed')"
 
 echo "3. Checking configuration..."
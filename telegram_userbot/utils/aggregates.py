@@ -0,0 +1,52 @@
+"""
+Aggregate Queries for Telegram Upload Bot
+Thin wrappers around the Postgres aggregate functions (see supabase/migrations): each call is one
+round-trip returning counts, sums and percentiles instead of rows to be counted in Python.
+`client` is anything with the PostgREST .rpc(...).execute() interface; errors propagate to the caller.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+def since_iso(seconds: float) -> str:
+    """UTC timestamp `seconds` ago, as sent to the aggregate functions"""
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat()
+
+async def upload_stat_buckets(client, since_seconds: float, bucket_seconds: int) -> List[Dict[str, Any]]:
+    """Per-bucket upload counts by status (bucket = floor(epoch(created_at) / bucket_seconds))"""
+    result = await client.rpc('get_upload_stat_buckets', {
+        'p_since': since_iso(since_seconds),
+        'p_bucket_seconds': bucket_seconds
+    }).execute()
+    return result.data or []
+
+async def upload_health_metrics(client, window_seconds: int = 3600) -> Dict[str, Any]:
+    """Active/pending/retrying upload counts and the failure rate (%) over the window"""
+    result = await client.rpc('get_upload_health_metrics', {'p_window_seconds': window_seconds}).execute()
+    row = result.data[0] if result.data else {}
+    return {
+        'active_uploads': row.get('active_uploads') or 0,
+        'queue_size': row.get('queue_size') or 0,
+        'retrying_uploads': row.get('retrying_uploads') or 0,
+        'window_uploads': row.get('window_uploads') or 0,
+        'window_failed': row.get('window_failed') or 0,
+        'error_rate': row.get('error_rate') or 0
+    }
+
+async def top_upload_groups(client, since_seconds: float, limit: int = 5) -> List[Dict[str, Any]]:
+    """Chats with the most uploads in the window, busiest first"""
+    result = await client.rpc('get_top_upload_groups', {
+        'p_since': since_iso(since_seconds),
+        'p_limit': limit
+    }).execute()
+    return result.data or []
+
+async def upload_event_analytics(client, since_seconds: float) -> Dict[str, Any]:
+    """Upload event summary, duration percentiles, file/error types and daily completions"""
+    result = await client.rpc('get_upload_event_analytics', {'p_since': since_iso(since_seconds)}).execute()
+    return result.data or {}
+
+async def group_activity(client, since_seconds: float) -> List[Dict[str, Any]]:
+    """Messages per group from group_activity events, busiest first"""
+    result = await client.rpc('get_group_activity', {'p_since': since_iso(since_seconds)}).execute()
+    return result.data or []
@@ -9,8 +9,9 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
-from collections import defaultdict, Counter
+from collections import Counter
 from utils.supabase_client import SupabaseManager
+from utils.aggregates import group_activity, upload_event_analytics
 
 logger = logging.getLogger(__name__)
 
@@ -115,15 +116,19 @@ class AnalyticsClient:
         try:
             events_data = []
             for event in self.event_buffer:
+                # Column names of the analytics_events table; the aggregate functions read event_data
+                event_data = dict(event.properties or {})
+                if event.metadata:
+                    event_data['metadata'] = event.metadata
                 events_data.append({
                     'event_type': event.event_type,
-                    'timestamp': event.timestamp.isoformat(),
+                    'recorded_at': event.timestamp.astimezone().isoformat(),
                     'user_id': event.user_id,
-                    'properties': event.properties,
-                    'metadata': event.metadata
+                    'session_id': event.session_id,
+                    'event_data': event_data
                 })
             
-            result = self.supabase.client.table('analytics_events').insert(events_data).execute()
+            result = await self.supabase.client.table('analytics_events').insert(events_data).execute()
             logger.info(f"Flushed {len(events_data)} analytics events")
             
             self.event_buffer.clear()
@@ -134,80 +139,39 @@ class AnalyticsClient:
             self.is_processing = False
     
     async def get_upload_analytics(self, days: int = 7) -> Dict[str, Any]:
-        """Get upload analytics for the last N days"""
+        """Get upload analytics for the last N days (aggregated in the database)"""
         try:
-            since = (datetime.now() - timedelta(days=days)).isoformat()
+            analytics = await upload_event_analytics(self.supabase.client, days * 86400)
+            summary = analytics.get('summary') or {}
             
-            result = self.supabase.client.table('analytics_events')\
-                .select('*')\
-                .in_('event_type', ['upload_started', 'upload_completed', 'upload_error'])\
-                .gte('timestamp', since)\
-                .execute()
-            
-            events = result.data or []
-            
-            # Categorize events
-            started = [e for e in events if e['event_type'] == 'upload_started']
-            completed = [e for e in events if e['event_type'] == 'upload_completed']
-            errors = [e for e in events if e['event_type'] == 'upload_error']
-            
-            # Calculate metrics
-            total_started = len(started)
-            total_completed = len(completed)
-            total_errors = len(errors)
+            total_started = summary.get('uploads_started', 0)
+            total_completed = summary.get('uploads_completed', 0)
             success_rate = (total_completed / total_started * 100) if total_started > 0 else 0
             
-            # File type analysis
-            file_types = Counter()
-            total_size = 0
-            total_duration = 0
-            
-            for event in completed:
-                props = event.get('properties', {})
-                if 'file_extension' in props:
-                    file_types[props['file_extension']] += 1
-                if 'file_size' in props:
-                    total_size += props['file_size']
-                if 'duration_seconds' in props:
-                    total_duration += props['duration_seconds']
-            
-            # Error analysis
-            error_types = Counter()
-            for event in errors:
-                props = event.get('properties', {})
-                if 'error_type' in props:
-                    error_types[props['error_type']] += 1
-            
             return {
                 'period_days': days,
                 'summary': {
                     'uploads_started': total_started,
                     'uploads_completed': total_completed,
-                    'uploads_failed': total_errors,
+                    'uploads_failed': summary.get('uploads_failed', 0),
                     'success_rate': round(success_rate, 2),
-                    'total_size_mb': round(total_size / (1024 * 1024), 2),
-                    'avg_duration_seconds': round(total_duration / total_completed, 2) if total_completed > 0 else 0
+                    'total_size_mb': round(float(summary.get('total_size') or 0) / (1024 * 1024), 2),
+                    'avg_duration_seconds': round(summary.get('avg_duration_seconds') or 0, 2),
+                    'p50_duration_seconds': round(summary.get('p50_duration_seconds') or 0, 2),
+                    'p95_duration_seconds': round(summary.get('p95_duration_seconds') or 0, 2)
                 },
-                'file_types': dict(file_types.most_common(10)),
-                'error_types': dict(error_types.most_common(5)),
-                'trends': await self._calculate_trends(events, days)
+                'file_types': dict(Counter(analytics.get('file_types') or {}).most_common(10)),
+                'error_types': dict(Counter(analytics.get('error_types') or {}).most_common(5)),
+                'trends': self._calculate_trends(analytics.get('daily_uploads') or {})
             }
             
         except Exception as e:
             logger.error(f"Error getting upload analytics: {e}")
             return {'error': str(e)}
     
-    async def _calculate_trends(self, events: List[Dict], days: int) -> Dict[str, Any]:
-        """Calculate trends from events"""
+    def _calculate_trends(self, daily_counts: Dict[str, int]) -> Dict[str, Any]:
+        """Calculate trends from completed uploads per day"""
         try:
-            # Group events by day
-            daily_counts = defaultdict(int)
-            
-            for event in events:
-                if event['event_type'] == 'upload_completed':
-                    event_date = datetime.fromisoformat(event['timestamp'].replace('Z', '+00:00')).date()
-                    daily_counts[event_date.isoformat()] += 1
-            
             # Calculate trend (simple linear regression would be better)
             dates = sorted(daily_counts.keys())
             if len(dates) >= 2:
@@ -228,32 +192,16 @@ class AnalyticsClient:
             return {'error': str(e)}
     
     async def get_group_analytics(self, days: int = 7) -> Dict[str, Any]:
-        """Get group activity analytics"""
+        """Get group activity analytics (aggregated in the database)"""
         try:
-            since = (datetime.now() - timedelta(days=days)).isoformat()
-            
-            result = self.supabase.client.table('analytics_events')\
-                .select('*')\
-                .eq('event_type', 'group_activity')\
-                .gte('timestamp', since)\
-                .execute()
-            
-            events = result.data or []
-            
-            # Group analysis
-            group_activity = defaultdict(int)
-            
-            for event in events:
-                props = event.get('properties', {})
-                group_name = props.get('group_name', 'Unknown')
-                message_count = props.get('message_count', 1)
-                group_activity[group_name] += message_count
+            rows = await group_activity(self.supabase.client, days * 86400)
+            activity = {row['group_name']: row['messages'] for row in rows}
             
             return {
                 'period_days': days,
-                'active_groups': len(group_activity),
-                'total_messages': sum(group_activity.values()),
-                'group_activity': dict(sorted(group_activity.items(), key=lambda x: x[1], reverse=True))
+                'active_groups': len(activity),
+                'total_messages': sum(activity.values()),
+                'group_activity': activity
             }
             
         except Exception as e:
@@ -0,0 +1,157 @@
+"""
+Callback Store for Telegram Upload Bot
+Bounded store for inline-button payloads: LRU eviction, per-entry TTL on a timer wheel,
+persisted in SQLite so buttons keep working after a restart
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class CallbackStore:
+    """LRU of compact callback payloads keyed by the id carried in callback_data"""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 2000, ttl: float = 86400.0, slot_seconds: float = 60.0):
+        self.path = Path(path) if path else None
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.slot_seconds = max(1.0, slot_seconds)
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (payload, expires_at)
+
+        # Timer wheel: one bucket of keys per slot_seconds, covering one TTL
+        self._wheel: List[Set[str]] = [set() for _ in range(int(ttl // self.slot_seconds) + 2)]
+        self._last_tick = int(time.time() // self.slot_seconds)
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def open(self):
+        """Open (or create) the store and load unexpired entries, most recently used last"""
+        if self._db or not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS callbacks ('
+            ' key TEXT PRIMARY KEY,'
+            ' payload TEXT NOT NULL,'
+            ' expires_at REAL NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+
+        now = time.time()
+        self._db.execute('DELETE FROM callbacks WHERE expires_at <= ?', (now,))
+        rows = self._db.execute(
+            'SELECT key, payload, expires_at FROM callbacks ORDER BY last_used DESC LIMIT ?', (self.max_entries,)
+        ).fetchall()
+        for key, payload, expires_at in reversed(rows):
+            try:
+                self._insert(key, json.loads(payload), expires_at)
+            except ValueError:
+                continue
+        # Anything beyond the cap is dropped for good
+        self._db.execute(
+            'DELETE FROM callbacks WHERE key NOT IN (SELECT key FROM callbacks ORDER BY last_used DESC LIMIT ?)',
+            (self.max_entries,)
+        )
+        if self._entries:
+            logger.info(f"Loaded {len(self._entries)} inline-button callbacks")
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def put(self, key: str, payload: Any, ttl: Optional[float] = None):
+        """Store a payload; evicts the least recently used entry when full"""
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        self._insert(key, payload, expires_at)
+        if self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO callbacks (key, payload, expires_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(payload, separators=(',', ':')), expires_at, time.time())
+            )
+
+        while len(self._entries) > self.max_entries:
+            old_key, (_, old_expires_at) = self._entries.popitem(last=False)
+            self._wheel[self._slot(old_expires_at)].discard(old_key)
+            self._delete_row(old_key)
+            self.evicted += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if self._db:
+            self._db.execute('UPDATE callbacks SET last_used = ? WHERE key = ?', (time.time(), key))
+        return entry[0]
+
+    def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._wheel[self._slot(entry[1])].discard(key)
+            self._delete_row(key)
+
+    def expire(self) -> int:
+        """Advance the wheel to now, dropping entries whose TTL has passed"""
+        now = time.time()
+        tick = int(now // self.slot_seconds)
+        # A long pause only needs one full turn of the wheel
+        start = max(self._last_tick, tick - len(self._wheel) + 1)
+        removed = 0
+        for t in range(start, tick + 1):
+            slot = t % len(self._wheel)
+            bucket = self._wheel[slot]
+            for key in list(bucket):
+                entry = self._entries.get(key)
+                if entry is None or self._slot(entry[1]) != slot:
+                    # Evicted, deleted or re-stored with a new expiry (lives in another bucket)
+                    bucket.discard(key)
+                elif entry[1] <= now:
+                    bucket.discard(key)
+                    del self._entries[key]
+                    self._delete_row(key)
+                    removed += 1
+        self._last_tick = tick
+        self.expired += removed
+        return removed
+
+    def _slot(self, expires_at: float) -> int:
+        return int(expires_at // self.slot_seconds) % len(self._wheel)
+
+    def _insert(self, key: str, payload: Any, expires_at: float):
+        self._entries[key] = (payload, expires_at)
+        self._entries.move_to_end(key)
+        self._wheel[self._slot(expires_at)].add(key)
+
+    def _delete_row(self, key: str):
+        if self._db:
+            self._db.execute('DELETE FROM callbacks WHERE key = ?', (key,))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'capacity': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evicted': self.evicted,
+            'expired': self.expired
+        }
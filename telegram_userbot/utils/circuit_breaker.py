@@ -0,0 +1,95 @@
+"""
+Circuit Breaker for Telegram Upload Bot
+Stops sending uploads to a provider that keeps failing and probes it again after a cool-down
+"""
+
+import logging
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures; open -> half-open after recovery_timeout;
+    half-open lets a limited number of probes through and closes on success"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 60.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+
+        self._state = STATE_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+
+        self.trips = 0
+        self.rejected = 0
+        self.successes = 0
+        self.failures = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            return STATE_HALF_OPEN
+        return self._state
+
+    def available(self) -> bool:
+        """Whether a call could be let through right now (does not reserve a probe)"""
+        state = self.state
+        if state == STATE_HALF_OPEN:
+            return self._probes_in_flight < self.half_open_max_calls
+        return state == STATE_CLOSED
+
+    def allow_request(self) -> bool:
+        """Reserve a call; False means fail fast without calling the provider"""
+        state = self.state
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_HALF_OPEN:
+            if self._state == STATE_OPEN:
+                self._state = STATE_HALF_OPEN
+                self._probes_in_flight = 0
+                logger.info(f"Circuit {self.name} half-open - probing provider")
+            if self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.successes += 1
+        self._consecutive_failures = 0
+        if self._state != STATE_CLOSED:
+            logger.info(f"Circuit {self.name} closed - provider recovered")
+        self._state = STATE_CLOSED
+        self._probes_in_flight = 0
+
+    def record_failure(self):
+        self.failures += 1
+        self._consecutive_failures += 1
+        if self._state == STATE_HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != STATE_OPEN:
+                self.trips += 1
+                logger.warning(f"Circuit {self.name} opened after {self._consecutive_failures} consecutive failures")
+            self._state = STATE_OPEN
+            self._opened_at = time.monotonic()
+            self._probes_in_flight = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        state = self.state
+        return {
+            'name': self.name,
+            'state': state,
+            'consecutive_failures': self._consecutive_failures,
+            'retry_in_seconds': max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at)) if state == STATE_OPEN else 0.0,
+            'trips': self.trips,
+            'rejected': self.rejected,
+            'successes': self.successes,
+            'failures': self.failures
+        }
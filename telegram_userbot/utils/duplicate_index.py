@@ -0,0 +1,217 @@
+"""
+Duplicate Upload Index for Telegram Upload Bot
+Local Bloom filter + exact on-disk set of every logged telegram file_unique_id
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over a blake2b digest"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+class DuplicateIndex:
+    """Persisted index of uploaded file_unique_ids answering most duplicate checks locally"""
+
+    # Rows committed late (created_at earlier than the last sync) are caught by re-reading this much
+    SYNC_OVERLAP = timedelta(minutes=5)
+
+    def __init__(self, path: str, capacity: int = 1_000_000, error_rate: float = 0.001, confirm_negatives: bool = False):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # Other writers (shared-mode instances, the web app) log rows this index never sees:
+        # with confirm_negatives a Bloom "never logged" is only a hint and the database decides
+        self.confirm_negatives = confirm_negatives
+        self.ready = False
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._bloom = BloomFilter(capacity, error_rate)
+
+        self.negatives = 0
+        self.local_hits = 0
+        self.false_positives = 0
+        self.synced = 0
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS file_ids (file_unique_id TEXT PRIMARY KEY)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    def _is_seeded(self) -> bool:
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'seeded'").fetchone()
+        return bool(row and row[0] == '1')
+
+    def _mark_seeded(self):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seeded', '1')")
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _load(self) -> int:
+        """Open the on-disk set and rebuild the Bloom filter from it"""
+        self._open()
+        if not self._is_seeded():
+            # Interrupted or never-run seed: start from an empty set
+            self._db.execute('DELETE FROM file_ids')
+        total = self._db.execute('SELECT COUNT(*) FROM file_ids').fetchone()[0]
+        self._bloom = BloomFilter(max(self.capacity, total * 2), self.error_rate)
+        for (file_unique_id,) in self._db.execute('SELECT file_unique_id FROM file_ids'):
+            self._bloom.add(file_unique_id)
+        return total
+
+    async def load(self, supabase=None) -> bool:
+        """Load the index at startup, seeding it from telegram_uploads on first run"""
+        try:
+            total = await asyncio.to_thread(self._load)
+
+            if not self._is_seeded():
+                if supabase is None:
+                    return False
+                seeded = await self._seed_from_database(supabase)
+                if seeded is None:
+                    logger.warning("Duplicate index could not be seeded - falling back to database checks")
+                    return False
+                self._mark_seeded()
+                total = seeded
+
+            self.ready = True
+            logger.info(f"Duplicate index loaded: {total} file ids ({self._bloom.size // 8 // 1024} KiB filter)")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error loading duplicate index: {e}")
+            return False
+
+    async def _seed_from_database(self, supabase, page_size: int = 1000) -> Optional[int]:
+        """Copy every logged file_unique_id from telegram_uploads into the index"""
+        started = datetime.now(timezone.utc)
+        offset = 0
+        total = 0
+        while True:
+            page = await supabase.get_upload_file_unique_ids(offset, page_size)
+            if page is None:
+                return None
+            self.add_many(page)
+            total += len(page)
+            if len(page) < page_size:
+                self._set_meta('synced_at', started.isoformat())
+                return total
+            offset += page_size
+
+    async def sync(self, supabase, page_size: int = 1000) -> Optional[int]:
+        """Add file ids logged since the last seed/sync by any writer (None on error)"""
+        if not self.ready:
+            return None
+        try:
+            synced_at = self._get_meta('synced_at')
+            if not synced_at:
+                return await self._seed_from_database(supabase, page_size)
+
+            started = datetime.now(timezone.utc)
+            since = (datetime.fromisoformat(synced_at) - self.SYNC_OVERLAP).isoformat()
+            offset = 0
+            total = 0
+            while True:
+                page = await supabase.get_upload_file_unique_ids(offset, page_size, since=since)
+                if page is None:
+                    return None
+                self.add_many(page)
+                total += len(page)
+                if len(page) < page_size:
+                    break
+                offset += page_size
+
+            self._set_meta('synced_at', started.isoformat())
+            self.synced += total
+            return total
+
+        except Exception as e:
+            logger.error(f"Error syncing duplicate index: {e}")
+            return None
+
+    def might_contain(self, file_unique_id: str) -> bool:
+        """Bloom filter check; False means definitely never logged"""
+        if file_unique_id in self._bloom:
+            return True
+        self.negatives += 1
+        return False
+
+    def contains(self, file_unique_id: str) -> bool:
+        """Exact on-disk lookup (only worth doing after might_contain)"""
+        row = self._db.execute('SELECT 1 FROM file_ids WHERE file_unique_id = ?', (file_unique_id,)).fetchone()
+        if row:
+            self.local_hits += 1
+            return True
+        self.false_positives += 1
+        return False
+
+    def add(self, file_unique_id: str):
+        """Record a logged file_unique_id"""
+        self.add_many([file_unique_id])
+
+    def add_many(self, file_unique_ids: Iterable[str]):
+        ids = [fid for fid in file_unique_ids if fid]
+        if not ids or not self._db:
+            return
+        self._db.execute('BEGIN')
+        try:
+            self._db.executemany('INSERT OR IGNORE INTO file_ids (file_unique_id) VALUES (?)', [(fid,) for fid in ids])
+            self._db.execute('COMMIT')
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+        for fid in ids:
+            self._bloom.add(fid)
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'ready': self.ready,
+            'entries': self._bloom.count,
+            'bloom_negatives': self.negatives,
+            'local_hits': self.local_hits,
+            'false_positives': self.false_positives,
+            'confirm_negatives': self.confirm_negatives,
+            'synced': self.synced
+        }
@@ -0,0 +1,144 @@
+"""
+Membership Cache for Telegram Upload Bot
+In-process cache of premium group and Telegram admin membership
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Set
+
+from utils.supabase_client import SupabaseManager
+
+logger = logging.getLogger(__name__)
+
+class MembershipCache:
+    """Premium group / admin membership cache, warmed at startup and refreshed on a TTL"""
+
+    def __init__(self, supabase: SupabaseManager, ttl: int = 300, poll_interval: int = 30):
+        self.supabase = supabase
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+        self._premium_chat_ids: Set[int] = set()
+        self._admin_user_ids: Set[int] = set()
+        self._loaded_at: Optional[float] = None
+        self._versions: Dict[str, int] = {}
+
+        self._refresh_lock = asyncio.Lock()
+        self._invalidated = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.is_loaded and not self._invalidated.is_set() and (time.monotonic() - self._loaded_at) < self.ttl
+
+    async def warm(self) -> bool:
+        """Load membership from the database (called at startup)"""
+        return await self.refresh()
+
+    async def refresh(self) -> bool:
+        """Reload premium groups and admins; keeps the previous snapshot on failure"""
+        async with self._refresh_lock:
+            try:
+                # Versions first: a change committed while the lists load is then seen on the next poll
+                versions = await self.supabase.get_cache_versions()
+                chat_ids = await self.supabase.get_premium_group_chat_ids()
+                admin_ids = await self.supabase.get_telegram_admin_ids()
+                if chat_ids is None or admin_ids is None:
+                    logger.warning("Membership cache refresh failed - keeping previous snapshot")
+                    return False
+
+                self._premium_chat_ids = set(chat_ids)
+                self._admin_user_ids = set(admin_ids)
+                self._versions = versions
+                self._loaded_at = time.monotonic()
+                self._invalidated.clear()
+                self.refreshes += 1
+
+                logger.info(f"Membership cache refreshed: {len(self._premium_chat_ids)} premium groups, {len(self._admin_user_ids)} admins")
+                return True
+
+            except Exception as e:
+                logger.error(f"Error refreshing membership cache: {e}")
+                return False
+
+    def invalidate(self):
+        """Mark the cache stale and wake the refresh loop"""
+        self._invalidated.set()
+
+    async def is_premium_group(self, chat_id: int) -> Optional[bool]:
+        """Cached premium group check; None when the cache has never loaded"""
+        if not self.is_loaded:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return chat_id in self._premium_chat_ids
+
+    async def is_admin(self, telegram_user_id: int) -> Optional[bool]:
+        """Cached admin check; None when the cache has never loaded"""
+        if not self.is_loaded:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return telegram_user_id in self._admin_user_ids
+
+    def start(self):
+        """Start the background refresh loop"""
+        if not self._task:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Stop the background refresh loop"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refresh_loop(self):
+        """Refresh on invalidation, TTL expiry or a cache version bump"""
+        while True:
+            try:
+                # asyncio.wait so an invalidation racing stop() cannot swallow the cancel
+                waiter = asyncio.ensure_future(self._invalidated.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=self.poll_interval)
+                finally:
+                    waiter.cancel()
+
+                if not self.is_fresh:
+                    # A failed refresh leaves the cache invalidated; wait before trying again
+                    if not await self.refresh():
+                        await asyncio.sleep(self.poll_interval)
+                    continue
+
+                versions = await self.supabase.get_cache_versions()
+                if versions and versions != self._versions:
+                    logger.info("Membership tables changed - refreshing cache")
+                    await self.refresh()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in membership cache refresh loop: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache size and hit counters"""
+        return {
+            'premium_groups': len(self._premium_chat_ids),
+            'admins': len(self._admin_user_ids),
+            'loaded': self.is_loaded,
+            'age_seconds': (time.monotonic() - self._loaded_at) if self._loaded_at else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes
+        }
@@ -0,0 +1,323 @@
+"""
+Metrics Exporter for Telegram Upload Bot
+In-process counters, gauges and histograms rendered in Prometheus text format and served
+by a small asyncio HTTP server (/metrics and /health). Hot paths only bump numbers; component
+stats (queues, breakers, caches) are read by collectors at scrape time.
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from utils.system_sampler import get_sampler
+except ImportError:  # psutil not installed
+    get_sampler = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds; from single API calls up to multi-GB uploads
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+def _format_value(value: float) -> str:
+    if value is None:
+        return 'NaN'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+@dataclass
+class MetricFamily:
+    """Values read from a component at scrape time"""
+    name: str
+    kind: str
+    help: str
+    samples: List[Tuple[Dict[str, Any], float]] = field(default_factory=list)
+
+    def add(self, value: float, **labels) -> 'MetricFamily':
+        self.samples.append((labels, value))
+        return self
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child for one label combination (kept, so callers may hold on to it)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {_escape(self.help)}', f'# TYPE {self.name} {self.kind}']
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(dict(zip(self.labelnames, key)), child))
+        return lines
+
+    def _render_child(self, labels: Dict[str, Any], child) -> List[str]:
+        return [f'{self.name}{_format_labels(labels)} {_format_value(child.value)}']
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._children[()].dec(amount)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def _render_child(self, labels: Dict[str, Any], child: _HistogramChild) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), child.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{_format_labels({**labels, "le": _format_value(bound)})} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(child.sum)}')
+        lines.append(f'{self.name}_count{_format_labels(labels)} {child.count}')
+        return lines
+
+class MetricsRegistry:
+    """Named metrics plus scrape-time collectors"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+        self.scrapes = 0
+        self.last_render_seconds = 0.0
+
+    def _register(self, cls, name: str, help: str, labelnames: Sequence[str], **kwargs) -> _Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+        elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} already registered with a different type or labels")
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        """Register a callable returning MetricFamily values, called on every scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format"""
+        started = time.perf_counter()
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+
+        for collector in list(self._collectors):
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error(f"Error in metrics collector {getattr(collector, '__qualname__', collector)}: {e}")
+                continue
+            for family in families:
+                lines.append(f'# HELP {family.name} {_escape(family.help)}')
+                lines.append(f'# TYPE {family.name} {family.kind}')
+                for labels, value in family.samples:
+                    lines.append(f'{family.name}{_format_labels(labels)} {_format_value(value)}')
+
+        self.scrapes += 1
+        self.last_render_seconds = time.perf_counter() - started
+        lines.append('# HELP metrics_render_seconds Time spent rendering the previous scrape')
+        lines.append('# TYPE metrics_render_seconds gauge')
+        lines.append(f'metrics_render_seconds {_format_value(self.last_render_seconds)}')
+        return '\n'.join(lines) + '\n'
+
+# Process-wide registry used by the upload pipeline, Supabase layer and Doodstream client
+REGISTRY = MetricsRegistry()
+
+def system_metrics() -> List[MetricFamily]:
+    """Host and process resource gauges from the shared sampler (names match monitoring/alert_rules.yml)"""
+    snapshot = get_sampler().snapshot() if get_sampler else None
+    if snapshot is None:
+        return []
+    return [
+        MetricFamily('cpu_percent', 'gauge', 'System-wide CPU utilisation').add(snapshot.cpu_percent),
+        MetricFamily('memory_percent', 'gauge', 'System memory in use').add(snapshot.memory_percent),
+        MetricFamily('disk_percent', 'gauge', 'Root filesystem usage').add(snapshot.disk_percent),
+        MetricFamily('process_cpu_percent', 'gauge', 'CPU utilisation of the bot process').add(snapshot.process_cpu_percent),
+        MetricFamily('process_resident_memory_bytes', 'gauge', 'Resident memory of the bot process').add(snapshot.process_rss),
+        MetricFamily('process_open_fds', 'gauge', 'Open file descriptors of the bot process').add(snapshot.process_open_fds),
+        MetricFamily('process_connections', 'gauge', 'Open inet sockets of the bot process').add(snapshot.process_connections),
+        MetricFamily('system_sample_age_seconds', 'gauge', 'Age of the resource snapshot').add(snapshot.age),
+    ]
+
+class MetricsServer:
+    """Minimal HTTP/1.0 server for Prometheus scrapes and health probes"""
+
+    READ_TIMEOUT = 10.0
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = '0.0.0.0', port: int = 8080,
+                 health: Optional[Callable[[], Dict[str, Any]]] = None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.health = health
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._started_at = time.monotonic()
+
+    async def start(self):
+        if self._server:
+            return
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self._started_at = time.monotonic()
+        logger.info(f"Metrics server listening on {self.host}:{self.port} (/metrics, /health)")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _health_report(self) -> Dict[str, Any]:
+        report = {'status': 'healthy'}
+        if self.health:
+            report.update(self.health())
+        report['uptime_seconds'] = round(time.monotonic() - self._started_at, 1)
+        return report
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), self.READ_TIMEOUT)
+            # Headers are not needed; read them so the client sees a clean close
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.READ_TIMEOUT)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+            method = parts[0] if parts else ''
+            path = parts[1].split('?', 1)[0] if len(parts) > 1 else ''
+
+            if method not in ('GET', 'HEAD'):
+                status, content_type, body = '405 Method Not Allowed', 'text/plain', b'method not allowed\n'
+            elif path == '/metrics':
+                status, content_type, body = '200 OK', CONTENT_TYPE, self.registry.render().encode('utf-8')
+            elif path in ('/health', '/healthz'):
+                report = self._health_report()
+                status = '503 Service Unavailable' if report.get('status') == 'unhealthy' else '200 OK'
+                content_type, body = 'application/json', json.dumps(report, default=str).encode('utf-8')
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', b'not found\n'
+
+            writer.write(
+                f'HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1')
+            )
+            if method != 'HEAD':
+                writer.write(body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving metrics request: {e}")
+        finally:
+            writer.close()
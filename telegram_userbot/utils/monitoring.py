@@ -6,14 +6,22 @@ import asyncio
 import logging
 import time
 import json
-import psutil
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass
 from utils.supabase_client import SupabaseManager
+from utils.system_sampler import SystemSampler, get_sampler
+from utils.timeseries import TieredRingStore
 
 logger = logging.getLogger(__name__)
 
+PERFORMANCE_FIELDS = (
+    'cpu_percent', 'memory_percent', 'disk_usage', 'network_bytes_sent', 'network_bytes_recv',
+    'active_connections', 'response_time', 'error_count'
+)
+# Integer columns in performance_metrics (the history keeps every field as a float)
+_INTEGER_FIELDS = {'network_bytes_sent', 'network_bytes_recv', 'active_connections', 'error_count'}
+
 @dataclass
 class PerformanceMetric:
     """Performance metric data structure"""
@@ -30,9 +38,14 @@ class PerformanceMetric:
 class PerformanceMonitor:
     """Enhanced performance monitoring with intelligent alerts"""
     
-    def __init__(self, supabase: SupabaseManager):
+    def __init__(self, supabase: SupabaseManager, sampler: Optional[SystemSampler] = None):
         self.supabase = supabase
-        self.metrics_buffer: List[PerformanceMetric] = []
+        self.sampler = sampler or get_sampler()
+        # Local history (raw / 1-minute / 1-hour tiers); summaries never re-read the database
+        self.history = TieredRingStore(PERFORMANCE_FIELDS)
+        self._history_seeded = False
+        self._stored_until = 0.0
+        self._unstored = 0
         self.alert_thresholds = {
             'cpu_percent': 80.0,
             'memory_percent': 85.0,
@@ -47,15 +60,17 @@ class PerformanceMonitor:
         self.is_monitoring = True
         logger.info("Starting performance monitoring...")
         
+        if not self._history_seeded:
+            await self._seed_history(24)
+        
         while self.is_monitoring:
             try:
                 metric = await self._collect_system_metrics()
-                self.metrics_buffer.append(metric)
+                self.record_metric(metric)
                 
                 # Store metrics every 5 minutes
-                if len(self.metrics_buffer) >= 5:
+                if self._unstored >= 5:
                     await self._store_metrics()
-                    self.metrics_buffer.clear()
                 
                 # Check for alerts
                 await self._check_alerts(metric)
@@ -71,37 +86,27 @@ class PerformanceMonitor:
         self.is_monitoring = False
         
         # Store remaining metrics
-        if self.metrics_buffer:
+        if self._unstored:
             await self._store_metrics()
-            self.metrics_buffer.clear()
         
         logger.info("Performance monitoring stopped")
     
     async def _collect_system_metrics(self) -> PerformanceMetric:
-        """Collect comprehensive system metrics"""
+        """Collect comprehensive system metrics from the shared sampler snapshot"""
         try:
-            # CPU and Memory
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            
-            # Disk usage
-            disk = psutil.disk_usage('/')
-            disk_usage = (disk.used / disk.total) * 100
-            
-            # Network
-            net_io = psutil.net_io_counters()
-            
-            # Active connections
-            connections = len(psutil.net_connections())
+            snapshot = self.sampler.snapshot() or await self.sampler.wait_ready()
+            if snapshot is None:
+                raise RuntimeError("no system sample available yet")
             
             return PerformanceMetric(
-                timestamp=datetime.now(),
-                cpu_percent=cpu_percent,
-                memory_percent=memory.percent,
-                disk_usage=disk_usage,
-                network_bytes_sent=net_io.bytes_sent,
-                network_bytes_recv=net_io.bytes_recv,
-                active_connections=connections
+                timestamp=datetime.fromtimestamp(snapshot.timestamp),
+                cpu_percent=snapshot.cpu_percent,
+                memory_percent=snapshot.memory_percent,
+                disk_usage=snapshot.disk_percent,
+                network_bytes_sent=snapshot.net_bytes_sent,
+                network_bytes_recv=snapshot.net_bytes_recv,
+                # Sockets of this process only (system-wide net_connections walks every socket on the host)
+                active_connections=snapshot.process_connections
             )
             
         except Exception as e:
@@ -117,29 +122,58 @@ class PerformanceMonitor:
                 error_count=1
             )
     
+    def record_metric(self, metric: PerformanceMetric):
+        """Add a sample to the local history"""
+        values = {name: getattr(metric, name) for name in PERFORMANCE_FIELDS}
+        self.history.append(values, metric.timestamp.timestamp())
+        self._unstored += 1
+    
     async def _store_metrics(self):
-        """Store metrics in database"""
+        """Store samples recorded since the last successful store in database"""
         try:
-            metrics_data = []
-            for metric in self.metrics_buffer:
-                metrics_data.append({
-                    'timestamp': metric.timestamp.isoformat(),
-                    'cpu_percent': metric.cpu_percent,
-                    'memory_percent': metric.memory_percent,
-                    'disk_usage': metric.disk_usage,
-                    'network_bytes_sent': metric.network_bytes_sent,
-                    'network_bytes_recv': metric.network_bytes_recv,
-                    'active_connections': metric.active_connections,
-                    'response_time': metric.response_time,
-                    'error_count': metric.error_count
-                })
+            rows = self.history.since(self._stored_until)
+            if not rows:
+                self._unstored = 0
+                return
             
-            result = self.supabase.client.table('performance_metrics').insert(metrics_data).execute()
+            metrics_data = []
+            for ts, values in rows:
+                row = {'timestamp': datetime.fromtimestamp(ts).isoformat()}
+                for name in PERFORMANCE_FIELDS:
+                    value = values[name]
+                    row[name] = int(value) if value is not None and name in _INTEGER_FIELDS else value
+                metrics_data.append(row)
+            
+            await self.supabase.client.table('performance_metrics').insert(metrics_data).execute()
+            self._stored_until = rows[-1][0]
+            self._unstored = 0
             logger.info(f"Stored {len(metrics_data)} performance metrics")
             
         except Exception as e:
             logger.error(f"Error storing performance metrics: {e}")
     
+    async def _seed_history(self, hours: int):
+        """Load stored samples once so summaries cover the time before this process started"""
+        self._history_seeded = True
+        if len(self.history):
+            return
+        try:
+            since = (datetime.now() - timedelta(hours=hours)).isoformat()
+            result = await self.supabase.client.table('performance_metrics')\
+                .select(','.join(('timestamp',) + PERFORMANCE_FIELDS))\
+                .gte('timestamp', since)\
+                .order('timestamp')\
+                .execute()
+            
+            for row in result.data or []:
+                if row.get('cpu_percent') is None:
+                    continue
+                self.history.append(row, datetime.fromisoformat(row['timestamp'].replace('Z', '+00:00')).timestamp())
+            self._stored_until = self.history.latest()['timestamp'] if len(self.history) else 0.0
+            
+        except Exception as e:
+            logger.error(f"Error loading performance history: {e}")
+    
     async def _check_alerts(self, metric: PerformanceMetric):
         """Check metrics against thresholds and trigger alerts"""
         alerts = []
@@ -175,7 +209,7 @@ class PerformanceMonitor:
             }
             
             # Store alert in database
-            self.supabase.client.table('system_alerts').insert(alert_data).execute()
+            await self.supabase.client.table('system_alerts').insert(alert_data).execute()
             
             logger.warning(f"Performance alerts: {', '.join(alerts)}")
             
@@ -183,46 +217,32 @@ class PerformanceMonitor:
             logger.error(f"Error sending alerts: {e}")
     
     async def get_performance_summary(self, hours: int = 24) -> Dict[str, Any]:
-        """Get performance summary for the last N hours"""
+        """Get performance summary for the last N hours (from the local history)"""
         try:
-            since = (datetime.now() - timedelta(hours=hours)).isoformat()
+            if not self._history_seeded:
+                await self._seed_history(hours)
             
-            result = self.supabase.client.table('performance_metrics')\
-                .select('*')\
-                .gte('timestamp', since)\
-                .order('timestamp', desc=True)\
-                .execute()
-            
-            metrics = result.data or []
+            summary = self.history.summary(hours * 3600)
+            fields = summary['fields']
             
-            if not metrics:
+            if not summary['samples']:
                 return {'status': 'no_data', 'period_hours': hours}
             
-            # Calculate averages
-            avg_cpu = sum(m['cpu_percent'] for m in metrics) / len(metrics)
-            avg_memory = sum(m['memory_percent'] for m in metrics) / len(metrics)
-            avg_disk = sum(m['disk_usage'] for m in metrics) / len(metrics)
-            
-            # Calculate peaks
-            max_cpu = max(m['cpu_percent'] for m in metrics)
-            max_memory = max(m['memory_percent'] for m in metrics)
-            max_disk = max(m['disk_usage'] for m in metrics)
-            
+            latest = self.history.latest()
             return {
                 'status': 'healthy',
                 'period_hours': hours,
-                'metrics_count': len(metrics),
+                'metrics_count': fields['cpu_percent']['count'],
+                'resolution': summary['resolution'],
                 'averages': {
-                    'cpu_percent': round(avg_cpu, 2),
-                    'memory_percent': round(avg_memory, 2),
-                    'disk_usage': round(avg_disk, 2)
+                    name: round(fields[name]['avg'], 2) if fields[name]['avg'] is not None else None
+                    for name in ('cpu_percent', 'memory_percent', 'disk_usage')
                 },
                 'peaks': {
-                    'cpu_percent': max_cpu,
-                    'memory_percent': max_memory,
-                    'disk_usage': max_disk
+                    name: fields[name]['max']
+                    for name in ('cpu_percent', 'memory_percent', 'disk_usage')
                 },
-                'latest_timestamp': metrics[0]['timestamp'] if metrics else None
+                'latest_timestamp': datetime.fromtimestamp(latest['timestamp']).isoformat() if latest else None
             }
             
         except Exception as e:
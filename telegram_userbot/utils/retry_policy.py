@@ -0,0 +1,150 @@
+"""
+Retry Policy Engine for Telegram Upload Bot
+Classifies upload failures (transient / throttled / permanent) and decides per class whether and when to retry
+"""
+
+import logging
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT = 'transient'
+THROTTLED = 'throttled'
+PERMANENT = 'permanent'
+
+@dataclass
+class FailureClassification:
+    """Category of one failed attempt and why"""
+    category: str
+    reason: str
+    retry_after: Optional[float] = None
+
+@dataclass
+class RetryPolicy:
+    """Retry rules for one failure category"""
+    max_attempts: int
+    base_delay: float = 5.0
+    max_delay: float = 60.0
+
+DEFAULT_POLICIES = {
+    TRANSIENT: RetryPolicy(max_attempts=3, base_delay=5.0, max_delay=60.0),
+    THROTTLED: RetryPolicy(max_attempts=4, base_delay=30.0, max_delay=300.0),
+    PERMANENT: RetryPolicy(max_attempts=1)
+}
+
+# Fixed schedule used before this engine (3 attempts, 5s then 10s); used to estimate savings
+LEGACY_MAX_ATTEMPTS = 3
+LEGACY_BASE_DELAY = 5.0
+
+_PERMANENT_STATUS = {400, 401, 403, 404, 405, 413, 415, 422}
+_THROTTLED_STATUS = {429}
+_TRANSIENT_STATUS = {408, 500, 502, 503, 504}
+
+_TRANSIENT_EXCEPTIONS = {
+    'TimeoutException', 'ConnectTimeout', 'ReadTimeout', 'WriteTimeout', 'PoolTimeout',
+    'ConnectError', 'ReadError', 'WriteError', 'NetworkError', 'RemoteProtocolError',
+    'TimeoutError', 'ConnectionError', 'ConnectionResetError'
+}
+
+_THROTTLED_PATTERN = re.compile(r'rate.?limit|too many requests|slow down|try again later|quota|flood', re.I)
+_PERMANENT_PATTERN = re.compile(
+    r'invalid (api )?key|wrong key|unauthori[sz]ed|forbidden|not allowed|'
+    r'too (large|big)|size limit|exceeds|unsupported|invalid (file|action|format)|'
+    r'not found|no such file|banned|suspended',
+    re.I
+)
+
+def _parse_retry_after(value: Any) -> Optional[float]:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def classify_failure(result: Optional[Dict]) -> FailureClassification:
+    """Classify a failed upload result from the edge function or doodstream_client"""
+    if not result:
+        return FailureClassification(TRANSIENT, 'no response')
+
+    retry_after = _parse_retry_after(result.get('retry_after'))
+    status = result.get('status_code')
+    error = str(result.get('error') or '')
+
+    exception_type = result.get('exception_type')
+    if exception_type in _TRANSIENT_EXCEPTIONS:
+        return FailureClassification(TRANSIENT, exception_type)
+
+    if status in _THROTTLED_STATUS or retry_after is not None:
+        return FailureClassification(THROTTLED, f'HTTP {status}' if status else 'retry-after', retry_after)
+    if _THROTTLED_PATTERN.search(error):
+        return FailureClassification(THROTTLED, error[:100], retry_after)
+
+    # Provider errors override a generic status (e.g. 500 wrapping "Invalid key")
+    provider_errors = ' '.join(
+        str((result.get(f'{name}_result') or {}).get('error') or '')
+        for name in ('regular', 'premium')
+    )
+    if _PERMANENT_PATTERN.search(error):
+        return FailureClassification(PERMANENT, error[:100])
+    if _PERMANENT_PATTERN.search(provider_errors):
+        return FailureClassification(PERMANENT, provider_errors.strip()[:100])
+    if status in _PERMANENT_STATUS:
+        return FailureClassification(PERMANENT, f'HTTP {status}')
+
+    if status in _TRANSIENT_STATUS:
+        return FailureClassification(TRANSIENT, f'HTTP {status}')
+    return FailureClassification(TRANSIENT, error[:100] or 'unknown error')
+
+class RetryEngine:
+    """Per-category retry decisions with jittered backoff, retry-after and dead-lettering"""
+
+    def __init__(self, policies: Optional[Dict[str, RetryPolicy]] = None):
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies:
+            self.policies.update(policies)
+
+        self.decisions = {category: 0 for category in self.policies}
+        self.retries = 0
+        self.dead_lettered = 0
+        self.attempts_saved = 0
+        self.seconds_saved = 0.0
+
+    def backoff(self, policy: RetryPolicy, attempt: int) -> float:
+        """Equal-jitter exponential backoff for the retry after `attempt`"""
+        ceiling = min(policy.max_delay, policy.base_delay * (2 ** (attempt - 1)))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def decide(self, classification: FailureClassification, attempt: int, attempt_seconds: float = 0.0) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to stop (dead-letter)"""
+        self.decisions[classification.category] = self.decisions.get(classification.category, 0) + 1
+        policy = self.policies.get(classification.category, self.policies[TRANSIENT])
+
+        if attempt >= policy.max_attempts:
+            self.dead_lettered += 1
+            self._record_savings(attempt, attempt_seconds)
+            return None
+
+        self.retries += 1
+        if classification.category == THROTTLED and classification.retry_after is not None:
+            return min(policy.max_delay, classification.retry_after)
+        return self.backoff(policy, attempt)
+
+    def _record_savings(self, attempt: int, attempt_seconds: float):
+        """Attempts and time the old fixed 3x loop would have spent after this point"""
+        remaining = max(0, LEGACY_MAX_ATTEMPTS - attempt)
+        if not remaining:
+            return
+        skipped_sleep = sum(LEGACY_BASE_DELAY * (2 ** (n - 1)) for n in range(attempt, LEGACY_MAX_ATTEMPTS))
+        self.attempts_saved += remaining
+        self.seconds_saved += skipped_sleep + remaining * attempt_seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'decisions': dict(self.decisions),
+            'retries': self.retries,
+            'dead_lettered': self.dead_lettered,
+            'attempts_saved': self.attempts_saved,
+            'seconds_saved': round(self.seconds_saved, 1)
+        }
@@ -0,0 +1,240 @@
+"""
+Retry Scheduler for Telegram Upload Bot
+Persistent delayed retries: a min-heap of due times over a local SQLite table, so backoff
+never holds an upload worker and scheduled retries survive restarts
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.upload_journal import portable_file_info
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before dispatching again when the upload queue is full
+REQUEUE_DELAY = 30.0
+
+# A dispatched retry's row is pushed back by this much (doubling per retry, capped) so a
+# retry that dies with the process is not re-run straight away on the next start
+CRASH_BACKOFF = 60.0
+CRASH_BACKOFF_MAX = 3600.0
+
+class RetryScheduler:
+    """Fires dispatch(entry) when a scheduled retry is due; rows stay until the job completes
+
+    retry_count is the number of retries started: it is persisted when a retry
+    is dispatched, so a retry that keeps crashing still uses up max_total_retries
+    and is then handed to abandon(entry).
+    """
+
+    def __init__(self, path: str, dispatch: Optional[Callable[[Dict], bool]] = None, max_total_retries: int = 5,
+                 abandon: Optional[Callable[[Dict], Any]] = None):
+        self.path = Path(path)
+        self.dispatch = dispatch
+        self.abandon = abandon
+        self.max_total_retries = max(0, max_total_retries)
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._heap: List[tuple] = []
+        self._due: Dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.scheduled = 0
+        self.dispatched = 0
+        self.exhausted = 0
+        self.abandoned = 0
+
+    def open(self):
+        """Open (or create) the schedule database and load pending retries"""
+        if self._db:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS retries ('
+            ' job_key TEXT PRIMARY KEY,'
+            ' due_at REAL NOT NULL,'
+            ' retry_count INTEGER NOT NULL,'
+            ' failure_class TEXT,'
+            ' reason TEXT,'
+            ' file_info TEXT NOT NULL,'
+            ' source TEXT NOT NULL,'
+            ' upload_id TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        # Rows whose retry was running when the process stopped fire once their crash backoff is over
+        for job_key, due_at in self._db.execute('SELECT job_key, due_at FROM retries').fetchall():
+            self._push(job_key, due_at)
+
+    def start(self):
+        """Start the timer (must be called from the running event loop)"""
+        if self._task or not self._db:
+            return
+        self._task = asyncio.create_task(self._timer_loop())
+        if self._due:
+            logger.info(f"Retry scheduler started with {len(self._due)} pending retries")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def retry_count(self, job_key: str) -> int:
+        """Retries already started for a job (across restarts)"""
+        if not self._db:
+            return 0
+        row = self._db.execute('SELECT retry_count FROM retries WHERE job_key = ?', (job_key,)).fetchone()
+        return row[0] if row else 0
+
+    def schedule(self, job_key: str, delay: float, file_info: Dict, source: Dict, upload_id: str,
+                 failure_class: Optional[str] = None, reason: Optional[str] = None) -> bool:
+        """Schedule a retry in `delay` seconds; False once the job has used up its retries"""
+        if not self._db:
+            return False
+        retry_count = self.retry_count(job_key)
+        if retry_count >= self.max_total_retries:
+            self.exhausted += 1
+            return False
+
+        now = time.time()
+        due_at = now + max(0.0, delay)
+        self._db.execute(
+            'INSERT INTO retries (job_key, due_at, retry_count, failure_class, reason, file_info, source, upload_id, created_at, updated_at)'
+            ' VALUES (?, ?, 0, ?, ?, ?, ?, ?, ?, ?)'
+            ' ON CONFLICT(job_key) DO UPDATE SET due_at = excluded.due_at,'
+            ' failure_class = excluded.failure_class, reason = excluded.reason, updated_at = excluded.updated_at',
+            (job_key, due_at, failure_class, reason, json.dumps(portable_file_info(file_info), default=str),
+             json.dumps(source, default=str), upload_id, now, now)
+        )
+        self._push(job_key, due_at)
+        self.scheduled += 1
+        return True
+
+    def complete(self, job_key: str):
+        """Forget a job that finished (succeeded or failed for good)"""
+        self._due.pop(job_key, None)
+        if self._db:
+            self._db.execute('DELETE FROM retries WHERE job_key = ?', (job_key,))
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Scheduled retries, soonest first"""
+        if not self._db:
+            return []
+        rows = self._db.execute(
+            'SELECT job_key, due_at, retry_count, failure_class, reason, file_info, upload_id FROM retries ORDER BY due_at'
+        ).fetchall()
+        now = time.time()
+        return [{
+            'job_key': job_key,
+            'due_in_seconds': max(0.0, due_at - now),
+            'retry_count': retry_count,
+            'failure_class': failure_class,
+            'reason': reason,
+            'original_name': json.loads(file_info).get('original_name'),
+            'upload_id': upload_id
+        } for job_key, due_at, retry_count, failure_class, reason, file_info, upload_id in rows]
+
+    def _push(self, job_key: str, due_at: float):
+        # Superseded heap entries are skipped when popped (lazy deletion)
+        self._due[job_key] = due_at
+        heapq.heappush(self._heap, (due_at, job_key))
+        self._wakeup.set()
+
+    def _load_entry(self, job_key: str) -> Optional[Dict]:
+        row = self._db.execute(
+            'SELECT file_info, source, upload_id, retry_count FROM retries WHERE job_key = ?', (job_key,)
+        ).fetchone()
+        if not row:
+            return None
+        file_info, source, upload_id, retry_count = row
+        return {
+            'job_key': job_key,
+            'file_info': json.loads(file_info),
+            'source': json.loads(source),
+            'upload_id': upload_id,
+            'retry_count': retry_count
+        }
+
+    async def _timer_loop(self):
+        """Sleep until the earliest due retry, then hand it to dispatch"""
+        while True:
+            try:
+                self._wakeup.clear()
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, job_key = heapq.heappop(self._heap)
+                    if self._due.get(job_key) != due_at:
+                        continue
+                    del self._due[job_key]
+                    self._fire(job_key)
+
+                timeout = max(0.0, self._heap[0][0] - time.time()) if self._heap else None
+                # asyncio.wait rather than wait_for: a wakeup racing stop() must not swallow the cancel
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=timeout)
+                finally:
+                    waiter.cancel()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in retry scheduler: {e}")
+                await asyncio.sleep(1)
+
+    def _fire(self, job_key: str):
+        try:
+            entry = self._load_entry(job_key)
+        except ValueError as e:
+            logger.error(f"Dropping unreadable scheduled retry {job_key}: {e}")
+            self.complete(job_key)
+            return
+        if not entry:
+            return
+
+        if entry['retry_count'] >= self.max_total_retries:
+            # Only reachable when the last retry never reported back (the process died running it)
+            logger.error(f"Retry of {job_key} did not finish after {entry['retry_count']} attempts - giving up")
+            self.abandoned += 1
+            self.complete(job_key)
+            if self.abandon:
+                self.abandon(entry)
+            return
+
+        entry['retry_count'] += 1
+        if self.dispatch and self.dispatch(entry):
+            # Count the attempt before it runs (the queue only starts it once this returns)
+            backoff = min(CRASH_BACKOFF * 2 ** (entry['retry_count'] - 1), CRASH_BACKOFF_MAX)
+            self._db.execute(
+                'UPDATE retries SET retry_count = ?, due_at = ?, updated_at = ? WHERE job_key = ?',
+                (entry['retry_count'], time.time() + backoff, time.time(), job_key)
+            )
+            self.dispatched += 1
+        else:
+            logger.warning(f"Upload queue full - retry of {job_key} postponed by {REQUEUE_DELAY:.0f}s")
+            self._push(job_key, time.time() + REQUEUE_DELAY)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self._due),
+            'scheduled': self.scheduled,
+            'dispatched': self.dispatched,
+            'exhausted': self.exhausted,
+            'abandoned': self.abandoned
+        }
@@ -0,0 +1,164 @@
+"""
+Shared Upload Queue for Telegram Upload Bot
+Lease-based workers claiming upload jobs from telegram_uploads so several bot instances can share the load
+"""
+
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.supabase_client import SupabaseManager
+
+logger = logging.getLogger(__name__)
+
+class SharedUploadQueue:
+    """Claims pending upload jobs (FOR UPDATE SKIP LOCKED via RPC) and keeps their leases alive"""
+
+    def __init__(self, supabase: SupabaseManager, worker: Callable[[Dict], Awaitable[Any]], worker_id: str,
+                 concurrency: int = 3, lease_seconds: int = 300, poll_interval: float = 5.0, max_attempts: int = 3):
+        self.supabase = supabase
+        self._worker = worker
+        self.worker_id = worker_id
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = max(30, lease_seconds)
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+
+        self._active: Dict[str, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._claim_task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+        self.claimed = 0
+        self.completed = 0
+        self.failed = 0
+        self.lost_leases = 0
+        self.released = 0
+        self.empty_polls = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._claim_task is not None
+
+    def start(self):
+        """Start claiming jobs (must be called from the running event loop)"""
+        if self._claim_task:
+            return
+        self._claim_task = asyncio.create_task(self._claim_loop())
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"Shared upload queue started as {self.worker_id} ({self.concurrency} slots, {self.lease_seconds}s lease)")
+
+    async def stop(self):
+        """Stop claiming, cancel running jobs and hand them back to the queue"""
+        for task in (self._claim_task, self._heartbeat_task):
+            if task:
+                task.cancel()
+        await asyncio.gather(*(t for t in (self._claim_task, self._heartbeat_task) if t), return_exceptions=True)
+        self._claim_task = None
+        self._heartbeat_task = None
+
+        upload_ids = list(self._active)
+        tasks = list(self._active.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if upload_ids:
+            released = await self.supabase.release_upload_jobs(self.worker_id, upload_ids)
+            self.released += released
+            logger.info(f"Released {released} unfinished upload jobs back to the shared queue")
+
+    def notify(self):
+        """Wake the claim loop (a job was just queued)"""
+        self._wakeup.set()
+
+    async def _claim_loop(self):
+        """Claim jobs whenever a slot is free; poll with jitter when the queue is empty"""
+        while True:
+            try:
+                self._wakeup.clear()
+                free = self.concurrency - len(self._active)
+                if free > 0:
+                    jobs = await self.supabase.claim_upload_jobs(self.worker_id, free, self.lease_seconds, self.max_attempts)
+                    for row in jobs:
+                        self._spawn(row)
+                    if jobs and len(jobs) == free:
+                        # Queue may hold more work; claim again once a slot frees up
+                        continue
+                    if not jobs:
+                        self.empty_polls += 1
+
+                # Not wait_for: a job finishing as stop() cancels us would swallow the cancel and hang stop()
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=self.poll_interval * random.uniform(0.8, 1.2))
+                finally:
+                    waiter.cancel()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in shared upload claim loop: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    def _spawn(self, row: Dict):
+        upload_id = row['id']
+        self.claimed += 1
+        task = asyncio.create_task(self._run_job(row))
+        self._active[upload_id] = task
+        task.add_done_callback(lambda _t, upload_id=upload_id: self._on_job_done(upload_id))
+
+    def _on_job_done(self, upload_id: str):
+        self._active.pop(upload_id, None)
+        self._wakeup.set()
+
+    async def _run_job(self, row: Dict):
+        try:
+            await self._worker(row)
+            self.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Shared upload job {row.get('id')} failed: {e}")
+
+    async def _heartbeat_loop(self):
+        """Extend leases of running jobs; cancel any job whose lease was taken over"""
+        interval = self.lease_seconds / 3
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                upload_ids = list(self._active)
+                if not upload_ids:
+                    continue
+
+                held = await self.supabase.heartbeat_upload_jobs(self.worker_id, upload_ids, self.lease_seconds)
+                if held is None:
+                    # Heartbeat failed; leases are still valid until they expire
+                    continue
+
+                for upload_id in set(upload_ids) - set(held):
+                    task = self._active.get(upload_id)
+                    if task and not task.done():
+                        self.lost_leases += 1
+                        logger.warning(f"Lease lost for upload job {upload_id} - another worker owns it now")
+                        task.cancel()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in shared upload heartbeat loop: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'worker_id': self.worker_id,
+            'active': len(self._active),
+            'concurrency': self.concurrency,
+            'claimed': self.claimed,
+            'completed': self.completed,
+            'failed': self.failed,
+            'lost_leases': self.lost_leases,
+            'released': self.released,
+            'empty_polls': self.empty_polls
+        }
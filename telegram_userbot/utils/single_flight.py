@@ -0,0 +1,58 @@
+"""
+Single-Flight Registry for Telegram Upload Bot
+Concurrent calls with the same key share one in-flight execution
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """Deduplicate concurrent work by key; followers attach to the leader's result"""
+
+    def __init__(self, name: str = 'single_flight'):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.leaders = 0
+        self.hits = 0
+
+    def is_inflight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run fn once per key at a time; returns (result, shared)"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.hits += 1
+            logger.info(f"{self.name}: attaching to in-flight job for {key}")
+            # Shield so a cancelled follower does not cancel the leader's result
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.leaders += 1
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except Exception as e:
+            future.set_exception(e)
+            # Mark as retrieved so an unobserved failure is not logged twice
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'inflight': len(self._inflight),
+            'leaders': self.leaders,
+            'hits': self.hits
+        }
@@ -5,11 +5,15 @@ Enhanced Supabase Client for Telegram Upload Bot
 import asyncio
 import logging
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, List, Optional
-from supabase import create_client, Client
 import os
 
+from utils.supabase_rest import AsyncSupabaseClient
+from utils.upload_stats import RollingUploadStats, WINDOWS
+from utils.aggregates import since_iso, upload_stat_buckets
+from utils.upload_write_buffer import UploadWriteBuffer
+
 logger = logging.getLogger(__name__)
 
 class SupabaseManager:
@@ -17,26 +21,43 @@ class SupabaseManager:
         from config import Config
         self.config = Config()
         
-        self.client: Optional[Client] = None
+        self.client: Optional[AsyncSupabaseClient] = None
         self._initialize_client()
+        
+        # 1h/24h/7d upload counters, moved by the writes below and seeded by seed_upload_stats()
+        self.upload_stats = RollingUploadStats()
+        
+        # telegram_uploads updates are coalesced per row and written in batches (started from main)
+        self.upload_writes = UploadWriteBuffer(
+            self.client,
+            interval=self.config.UPLOAD_WRITE_INTERVAL,
+            max_rows=self.config.UPLOAD_WRITE_BATCH
+        )
 
     def _initialize_client(self):
-        """Initialize Supabase client"""
+        """Initialize async Supabase client (one shared pooled HTTP connection pool)"""
         try:
-            self.client = create_client(
+            self.client = AsyncSupabaseClient(
                 self.config.SUPABASE_URL,
-                self.config.SUPABASE_SERVICE_ROLE_KEY
+                self.config.SUPABASE_SERVICE_ROLE_KEY,
+                max_connections=self.config.SUPABASE_MAX_CONNECTIONS
             )
             logger.info("✅ Supabase client initialized")
         except Exception as e:
             logger.error(f"❌ Failed to initialize Supabase client: {e}")
             raise
 
+    async def close(self):
+        """Write buffered upload updates and close the shared HTTP connection pool"""
+        await self.upload_writes.stop()
+        if self.client:
+            await self.client.aclose()
+
     async def test_connection(self) -> bool:
         """Test Supabase connection"""
         try:
             # Try to fetch one record from profiles table
-            result = self.client.table('profiles').select('id').limit(1).execute()
+            result = await self.client.table('profiles').select('id').limit(1).execute()
             logger.info("✅ Supabase connection test successful")
             return True
         except Exception as e:
@@ -46,35 +67,81 @@ class SupabaseManager:
     async def get_premium_groups(self) -> list:
         """Get all premium groups with auto-upload enabled"""
         try:
-            result = self.client.table('premium_groups').select('*').eq('auto_upload_enabled', True).execute()
+            result = await self.client.table('premium_groups').select('*').eq('auto_upload_enabled', True).execute()
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting premium groups: {e}")
             return []
 
+    async def get_premium_group_chat_ids(self) -> Optional[List[int]]:
+        """Get chat IDs of premium groups with auto-upload enabled (None on error)"""
+        try:
+            result = await self.client.table('premium_groups').select('chat_id').eq('auto_upload_enabled', True).execute()
+            return [int(row['chat_id']) for row in result.data or []]
+        except Exception as e:
+            logger.error(f"Error getting premium group chat IDs: {e}")
+            return None
+
+    async def is_premium_group(self, chat_id: int) -> bool:
+        """Check if chat is premium group with auto-upload enabled using RPC"""
+        try:
+            result = await self.client.rpc('is_premium_group_with_autoupload', {'chat_id_param': chat_id}).execute()
+            return result.data if result.data is not None else False
+        except Exception as e:
+            logger.error(f"Error checking premium group status for {chat_id}: {e}")
+            return False
+
+    async def get_telegram_admin_ids(self) -> Optional[List[int]]:
+        """Get Telegram user IDs of all active admins (None on error)"""
+        try:
+            result = await self.client.rpc('get_telegram_admin_ids').execute()
+            return [int(row['telegram_user_id']) for row in result.data or []]
+        except Exception as e:
+            logger.error(f"Error getting telegram admin IDs: {e}")
+            return None
+
+    async def get_cache_versions(self) -> Dict[str, int]:
+        """Get change counters for cached tables"""
+        try:
+            result = await self.client.table('cache_versions').select('name,version').execute()
+            return {row['name']: row['version'] for row in result.data or []}
+        except Exception as e:
+            logger.error(f"Error getting cache versions: {e}")
+            return {}
+
     async def log_upload(self, upload_data: Dict[str, Any]) -> Optional[str]:
         """Log upload to database"""
         try:
-            result = self.client.table('telegram_uploads').insert(upload_data).execute()
+            result = await self.client.table('telegram_uploads').insert(upload_data).execute()
             if result.data:
-                return result.data[0]['id']
+                row = result.data[0]
+                self.upload_stats.created(row['id'], row.get('upload_status') or upload_data.get('upload_status', 'pending'),
+                                          upload_data.get('file_size'), row.get('created_at'))
+                return row['id']
             return None
         except Exception as e:
             logger.error(f"Error logging upload: {e}")
             return None
 
-    async def update_upload_status(self, upload_id: str, status: str, error_message: Optional[str] = None):
-        """Update upload status"""
+    async def update_upload_status(self, upload_id: str, status: str, error_message: Optional[str] = None,
+                                   file_code: Optional[str] = None, flush: bool = False):
+        """Update upload status (buffered; flush=True writes it before returning)"""
         try:
             update_data = {
                 'upload_status': status,
-                'processed_at': 'now()'
+                'processed_at': datetime.now(timezone.utc).isoformat()
             }
             
             if error_message:
                 update_data['error_message'] = error_message
             
-            self.client.table('telegram_uploads').update(update_data).eq('id', upload_id).execute()
+            if file_code:
+                update_data['doodstream_file_code'] = file_code
+            
+            self.upload_writes.update(upload_id, update_data)
+            self.upload_stats.transition(upload_id, status)
+            if flush or not self.upload_writes.running:
+                await self.upload_writes.flush(sync=True)
             
         except Exception as e:
             logger.error(f"Error updating upload status: {e}")
@@ -82,7 +149,7 @@ class SupabaseManager:
     async def create_video_record(self, video_data: Dict[str, Any]) -> Optional[str]:
         """Create video record in database"""
         try:
-            result = self.client.table('videos').insert(video_data).execute()
+            result = await self.client.table('videos').insert(video_data).execute()
             if result.data:
                 return result.data[0]['id']
             return None
@@ -93,7 +160,7 @@ class SupabaseManager:
     async def get_user_profile_by_telegram(self, telegram_user_id: int) -> Optional[Dict]:
         """Get user profile by Telegram ID"""
         try:
-            result = self.client.table('profiles').select('*').eq('telegram_user_id', telegram_user_id).execute()
+            result = await self.client.table('profiles').select('*').eq('telegram_user_id', telegram_user_id).execute()
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error getting user profile: {e}")
@@ -102,7 +169,7 @@ class SupabaseManager:
     async def get_admin_telegram_accounts(self) -> list:
         """Get active admin telegram accounts"""
         try:
-            result = self.client.table('admin_telegram_users').select('*').eq('is_active', True).execute()
+            result = await self.client.table('admin_telegram_users').select('*').eq('is_active', True).execute()
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting admin telegram accounts: {e}")
@@ -111,7 +178,7 @@ class SupabaseManager:
     async def is_user_admin(self, telegram_user_id: int) -> bool:
         """Check if telegram user is admin using RPC"""
         try:
-            result = self.client.rpc('is_telegram_admin', {'telegram_user_id_param': telegram_user_id}).execute()
+            result = await self.client.rpc('is_telegram_admin', {'telegram_user_id_param': telegram_user_id}).execute()
             return result.data if result.data is not None else False
         except Exception as e:
             logger.error(f"Error checking admin status for {telegram_user_id}: {e}")
@@ -120,23 +187,102 @@ class SupabaseManager:
     async def check_duplicate_upload(self, file_unique_id: str) -> bool:
         """Check if file was already uploaded"""
         try:
-            result = self.client.table('telegram_uploads').select('id').eq('telegram_file_unique_id', file_unique_id).execute()
+            result = await self.client.table('telegram_uploads').select('id').eq('telegram_file_unique_id', file_unique_id).execute()
             return len(result.data) > 0 if result.data else False
         except Exception as e:
             logger.error(f"Error checking duplicate upload: {e}")
             return False
 
-    async def update_upload_with_video_id(self, upload_id: str, video_id: str):
-        """Update telegram upload record with video_id reference"""
+    async def get_upload_id_by_file_unique_id(self, file_unique_id: str) -> Optional[str]:
+        """Get the telegram_uploads id logged for a file"""
+        try:
+            result = await self.client.table('telegram_uploads').select('id').eq('telegram_file_unique_id', file_unique_id).limit(1).execute()
+            return result.data[0]['id'] if result.data else None
+        except Exception as e:
+            logger.error(f"Error getting upload by file id: {e}")
+            return None
+
+    async def enqueue_upload_job(self, upload_data: Dict[str, Any]) -> Optional[Dict]:
+        """Queue a pending upload for the shared workers ({'upload_id', 'created'}; None on error)"""
+        try:
+            result = await self.client.rpc('enqueue_telegram_upload', {'p_upload': upload_data}).execute()
+            if not result.data:
+                return None
+            if result.data[0].get('created'):
+                self.upload_stats.created(result.data[0]['upload_id'], 'pending', upload_data.get('file_size'))
+            return result.data[0]
+        except Exception as e:
+            logger.error(f"Error enqueueing upload job: {e}")
+            return None
+
+    async def claim_upload_jobs(self, worker_id: str, limit: int, lease_seconds: int, max_attempts: int) -> List[Dict]:
+        """Claim pending upload jobs for this worker under a lease"""
+        try:
+            result = await self.client.rpc('claim_telegram_upload_jobs', {
+                'p_worker_id': worker_id,
+                'p_limit': limit,
+                'p_lease_seconds': lease_seconds,
+                'p_max_attempts': max_attempts
+            }).execute()
+            for row in result.data or []:
+                self.upload_stats.transition(row['id'], 'processing')
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error claiming upload jobs: {e}")
+            return []
+
+    async def heartbeat_upload_jobs(self, worker_id: str, upload_ids: List[str], lease_seconds: int) -> Optional[List[str]]:
+        """Extend leases; returns the ids still held by this worker (None on error)"""
+        try:
+            result = await self.client.rpc('heartbeat_telegram_upload_jobs', {
+                'p_worker_id': worker_id,
+                'p_ids': upload_ids,
+                'p_lease_seconds': lease_seconds
+            }).execute()
+            return [row['upload_id'] for row in result.data or []]
+        except Exception as e:
+            logger.error(f"Error sending upload job heartbeat: {e}")
+            return None
+
+    async def release_upload_jobs(self, worker_id: str, upload_ids: List[str]) -> int:
+        """Return unfinished jobs to the queue"""
         try:
-            self.client.table('telegram_uploads').update({'video_id': video_id}).eq('id', upload_id).execute()
+            # Buffered updates must land before other workers can claim the rows
+            await self.upload_writes.flush(sync=True)
+            result = await self.client.rpc('release_telegram_upload_jobs', {
+                'p_worker_id': worker_id,
+                'p_ids': upload_ids
+            }).execute()
+            return result.data or 0
+        except Exception as e:
+            logger.error(f"Error releasing upload jobs: {e}")
+            return 0
+
+    async def get_upload_file_unique_ids(self, offset: int, limit: int, since: Optional[str] = None) -> Optional[List[str]]:
+        """Get a page of logged telegram file_unique_ids, optionally only rows created since `since` (None on error)"""
+        try:
+            query = self.client.table('telegram_uploads').select('telegram_file_unique_id')
+            if since:
+                query = query.gte('created_at', since)
+            result = await query.order('created_at').range(offset, offset + limit - 1).execute()
+            return [row['telegram_file_unique_id'] for row in result.data or []]
+        except Exception as e:
+            logger.error(f"Error getting upload file ids: {e}")
+            return None
+
+    async def update_upload_with_video_id(self, upload_id: str, video_id: str, flush: bool = False):
+        """Update telegram upload record with video_id reference (buffered like status updates)"""
+        try:
+            self.upload_writes.update(upload_id, {'video_id': video_id})
+            if flush or not self.upload_writes.running:
+                await self.upload_writes.flush(sync=True)
         except Exception as e:
             logger.error(f"Error updating upload with video_id: {e}")
 
     async def log_upload_failure(self, failure_data: dict) -> Optional[str]:
         """Log upload failure for admin review"""
         try:
-            result = self.client.table('upload_failures').insert(failure_data).execute()
+            result = await self.client.table('upload_failures').insert(failure_data).execute()
             return result.data[0]['id'] if result.data else None
         except Exception as e:
             logger.error(f"Error logging upload failure: {e}")
@@ -151,31 +297,38 @@ class SupabaseManager:
         except Exception as e:
             logger.error(f"Error storing admin notification: {e}")
 
-    async def get_comprehensive_stats(self) -> Dict:
-        """Get comprehensive statistics for admin dashboard"""
+    async def seed_upload_stats(self) -> bool:
+        """Load the rolling upload counters from per-bucket aggregates (one row per bucket, not per upload)"""
         try:
-            stats = {}
-            
-            # Upload statistics (last 7 days)
-            week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-            
-            uploads_result = self.client.table('telegram_uploads').select('*').gte('created_at', week_ago).execute()
-            uploads = uploads_result.data or []
+            buckets = []
+            # 24h and 7d share hourly buckets; the 1h window uses minute buckets
+            for name in ('1h', '7d'):
+                width, size = WINDOWS[name]
+                rows = await upload_stat_buckets(self.client, width * size, width)
+                buckets.append((name, rows))
+                if name == '7d':
+                    buckets.append(('24h', rows))
             
-            stats['total_uploads'] = len(uploads)
-            stats['successful_uploads'] = len([u for u in uploads if u.get('upload_status') == 'completed'])
-            stats['failed_uploads'] = len([u for u in uploads if u.get('upload_status') == 'failed'])
-            stats['processing_uploads'] = len([u for u in uploads if u.get('upload_status') == 'processing'])
+            # Unfinished rows are tracked so their completion moves the seeded counts
+            open_result = await self.client.table('telegram_uploads').select('id,created_at,upload_status').in_(
+                'upload_status', ['pending', 'processing', 'retrying']
+            ).gte('created_at', since_iso(self.upload_stats.span)).execute()
             
-            stats['success_rate'] = (stats['successful_uploads'] / stats['total_uploads'] * 100) if stats['total_uploads'] > 0 else 0
-            
-            # File statistics
-            total_size = sum(u.get('file_size', 0) for u in uploads if u.get('file_size'))
-            stats['total_size_gb'] = total_size / (1024 * 1024 * 1024)
-            stats['avg_size_mb'] = (total_size / len(uploads) / (1024 * 1024)) if uploads else 0
+            self.upload_stats.load(buckets, open_result.data or [])
+            logger.info(f"Seeded upload statistics ({self.upload_stats.window('7d')['total_uploads']} uploads in 7 days)")
+            return True
+        except Exception as e:
+            logger.error(f"Error seeding upload statistics: {e}")
+            return False
+
+    async def get_comprehensive_stats(self) -> Dict:
+        """Get comprehensive statistics for admin dashboard"""
+        try:
+            # Upload statistics (last 7 days) come from the rolling counters
+            stats = self.upload_stats.window('7d')
             
             # Group statistics
-            groups_result = self.client.table('premium_groups').select('*').eq('auto_upload_enabled', True).execute()
+            groups_result = await self.client.table('premium_groups').select('id').eq('auto_upload_enabled', True).execute()
             stats['active_groups'] = len(groups_result.data) if groups_result.data else 0
             
             return stats
@@ -187,7 +340,7 @@ class SupabaseManager:
     async def get_recent_failures(self) -> list:
         """Get recent upload failures with enhanced details"""
         try:
-            result = self.client.table('upload_failures').select('*').order('created_at', desc=True).limit(20).execute()
+            result = await self.client.table('upload_failures').select('*').order('created_at', desc=True).limit(20).execute()
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting recent failures: {e}")
@@ -196,7 +349,7 @@ class SupabaseManager:
     async def get_upload_failure_by_id(self, failure_id: str) -> Optional[Dict]:
         """Get specific upload failure by ID"""
         try:
-            result = self.client.table('upload_failures').select('*').eq('id', failure_id).execute()
+            result = await self.client.table('upload_failures').select('*').eq('id', failure_id).execute()
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error getting upload failure by ID: {e}")
@@ -215,8 +368,13 @@ class SupabaseManager:
             upload_id = error_details.get('upload_id')
             
             if upload_id:
-                result = self.client.table('telegram_uploads').select('*').eq('id', upload_id).execute()
-                return result.data[0] if result.data else None
+                if self.upload_writes.pending(upload_id):
+                    await self.upload_writes.flush(sync=True)
+                result = await self.client.table('telegram_uploads').select('*').eq('id', upload_id).execute()
+                if not result.data:
+                    return None
+                self.upload_stats.track(result.data[0])
+                return result.data[0]
                 
             return None
             
@@ -227,8 +385,13 @@ class SupabaseManager:
     async def get_upload_by_id(self, upload_id: str) -> Optional[Dict]:
         """Get upload record by ID"""
         try:
-            result = self.client.table('telegram_uploads').select('*').eq('id', upload_id).execute()
-            return result.data[0] if result.data else None
+            if self.upload_writes.pending(upload_id):
+                await self.upload_writes.flush(sync=True)
+            result = await self.client.table('telegram_uploads').select('*').eq('id', upload_id).execute()
+            if not result.data:
+                return None
+            self.upload_stats.track(result.data[0])
+            return result.data[0]
         except Exception as e:
             logger.error(f"Error getting upload by ID: {e}")
             return None
@@ -236,7 +399,7 @@ class SupabaseManager:
     async def update_failure_attempt_count(self, failure_id: str, attempt_count: int):
         """Update failure attempt count"""
         try:
-            self.client.table('upload_failures').update({
+            await self.client.table('upload_failures').update({
                 'attempt_count': attempt_count,
                 'updated_at': 'now()'
             }).eq('id', failure_id).execute()
@@ -246,7 +409,7 @@ class SupabaseManager:
     async def mark_upload_manual_required(self, failure_id: str):
         """Mark upload as requiring manual intervention"""
         try:
-            self.client.table('upload_failures').update({
+            await self.client.table('upload_failures').update({
                 'requires_manual_upload': True,
                 'admin_action_taken': 'marked_manual',
                 'updated_at': 'now()'
@@ -271,7 +434,7 @@ class SupabaseManager:
             current_history.append(retry_result)
             
             # Update failure record
-            self.client.table('upload_failures').update({
+            await self.client.table('upload_failures').update({
                 'retry_history': current_history,
                 'updated_at': 'now()'
             }).eq('id', failure_id).execute()
@@ -279,27 +442,18 @@ class SupabaseManager:
         except Exception as e:
             logger.error(f"Error adding retry history: {e}")
     
-    async def retry_upload_with_provider(self, upload_id: str, provider: str) -> bool:
-        """Retry upload with specific provider (placeholder - would integrate with actual retry logic)"""
+    async def update_failure_after_retry(self, failure_id: str, error_details: Dict, resolved: bool):
+        """Store the provider errors left after a targeted retry (resolved once none remain)"""
         try:
-            # This would integrate with the actual upload retry mechanism
-            # For now, simulate retry attempt
-            logger.info(f"Retrying upload {upload_id} with provider: {provider}")
-            
-            # In real implementation, this would:
-            # 1. Get original upload data
-            # 2. Re-trigger upload to specific provider
-            # 3. Update upload status based on result
-            
-            # Placeholder success (85% success rate simulation)
-            import random
-            success = random.random() > 0.15
-            
-            return success
-            
+            update_data = {
+                'error_details': error_details,
+                'updated_at': 'now()'
+            }
+            if resolved:
+                update_data['admin_action_taken'] = 'retry_succeeded'
+            await self.client.table('upload_failures').update(update_data).eq('id', failure_id).execute()
         except Exception as e:
-            logger.error(f"Error retrying upload with provider: {e}")
-            return False
+            logger.error(f"Error updating failure after retry: {e}")
     
     async def log_admin_notification(self, notification_data: Dict):
         """Log admin notification attempt"""
@@ -315,7 +469,7 @@ class SupabaseManager:
             }
             
             # For now, log to upload_logs table
-            self.client.table('upload_logs').insert({
+            await self.client.table('upload_logs').insert({
                 'user_id': 'system',  # System notification
                 'filename': 'admin_notification',
                 'success': notification_data.get('sent_to_count', 0) > 0,
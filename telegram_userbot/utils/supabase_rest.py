@@ -0,0 +1,286 @@
+"""
+Async Supabase REST Client for Telegram Upload Bot
+Async-native PostgREST / RPC / Edge Function access over one shared pooled HTTP client
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_REQUESTS = REGISTRY.counter('supabase_requests_total', 'Supabase HTTP requests', ('target', 'status'))
+SUPABASE_REQUEST_SECONDS = REGISTRY.histogram('supabase_request_duration_seconds', 'Supabase HTTP request latency', ('target',))
+SUPABASE_UP = REGISTRY.gauge('supabase_status', '1 while Supabase answers requests without transport or 5xx errors')
+SUPABASE_UP.set(1)  # until a request says otherwise
+
+def _metric_target(path: str) -> str:
+    """Table, rpc/<name> or fn/<name> for a request path (bounded label values)"""
+    if path.startswith('/rest/v1/'):
+        return path[len('/rest/v1/'):]
+    if path.startswith('/functions/v1/'):
+        return 'fn/' + path[len('/functions/v1/'):]
+    return path
+
+class SupabaseAPIError(Exception):
+    """Error response from PostgREST or an edge function"""
+
+    def __init__(self, message: str, status_code: int = 0, code: Optional[str] = None, details: Any = None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.code = code
+        self.details = details
+
+class APIResponse:
+    """Query result (same shape as supabase-py: .data and .count)"""
+
+    def __init__(self, data: Any = None, count: Optional[int] = None, status_code: int = 200, headers: Optional[Dict[str, str]] = None):
+        self.data = data
+        self.count = count
+        self.status_code = status_code
+        self.headers = headers or {}
+
+def _format_value(value: Any) -> str:
+    """Format a filter value for a PostgREST query string"""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def _dumps(payload: Any) -> bytes:
+    return json.dumps(payload, default=str).encode('utf-8')
+
+class QueryBuilder:
+    """Fluent PostgREST query builder; awaited through execute()"""
+
+    def __init__(self, client: 'AsyncSupabaseClient', path: str, method: str = 'GET', body: Any = None):
+        self._client = client
+        self._path = path
+        self._method = method
+        self._body = body
+        self._params: List[Tuple[str, str]] = []
+        self._orders: List[str] = []
+        self._prefer: List[str] = []
+
+    # ---- Operations ----
+    def select(self, columns: str = '*', count: Optional[str] = None) -> 'QueryBuilder':
+        if self._method == 'GET':
+            self._params.append(('select', columns))
+        else:
+            # Mutations return the selected columns
+            self._params.append(('select', columns))
+            if 'return=representation' not in self._prefer:
+                self._prefer.append('return=representation')
+        if count:
+            self._prefer.append(f'count={count}')
+        return self
+
+    def insert(self, rows: Any, returning: bool = True) -> 'QueryBuilder':
+        self._method = 'POST'
+        self._body = rows
+        if returning:
+            self._prefer.append('return=representation')
+        return self
+
+    def upsert(self, rows: Any, on_conflict: Optional[str] = None, returning: bool = True) -> 'QueryBuilder':
+        self._method = 'POST'
+        self._body = rows
+        self._prefer.append('resolution=merge-duplicates')
+        if on_conflict:
+            self._params.append(('on_conflict', on_conflict))
+        if returning:
+            self._prefer.append('return=representation')
+        return self
+
+    def update(self, values: Dict[str, Any], returning: bool = True) -> 'QueryBuilder':
+        self._method = 'PATCH'
+        self._body = values
+        if returning:
+            self._prefer.append('return=representation')
+        return self
+
+    def delete(self, returning: bool = False) -> 'QueryBuilder':
+        self._method = 'DELETE'
+        if returning:
+            self._prefer.append('return=representation')
+        return self
+
+    # ---- Filters ----
+    def _filter(self, column: str, operator: str, value: Any) -> 'QueryBuilder':
+        self._params.append((column, f'{operator}.{_format_value(value)}'))
+        return self
+
+    def eq(self, column: str, value: Any) -> 'QueryBuilder':
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column: str, value: Any) -> 'QueryBuilder':
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column: str, value: Any) -> 'QueryBuilder':
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column: str, value: Any) -> 'QueryBuilder':
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column: str, value: Any) -> 'QueryBuilder':
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column: str, value: Any) -> 'QueryBuilder':
+        return self._filter(column, 'lte', value)
+
+    def is_(self, column: str, value: Any) -> 'QueryBuilder':
+        return self._filter(column, 'is', value)
+
+    def in_(self, column: str, values: List[Any]) -> 'QueryBuilder':
+        joined = ','.join(_format_value(v) for v in values)
+        self._params.append((column, f'in.({joined})'))
+        return self
+
+    def contains(self, column: str, value: Any) -> 'QueryBuilder':
+        """cs filter: a JSON (dict), array (list) or range column containing `value`"""
+        if isinstance(value, dict):
+            formatted = json.dumps(value, default=str)
+        elif isinstance(value, (list, tuple, set)):
+            formatted = '{' + ','.join(_format_value(v) for v in value) + '}'
+        else:
+            formatted = _format_value(value)
+        self._params.append((column, f'cs.{formatted}'))
+        return self
+
+    # ---- Modifiers ----
+    def order(self, column: str, desc: bool = False) -> 'QueryBuilder':
+        self._orders.append(f"{column}.{'desc' if desc else 'asc'}")
+        return self
+
+    def limit(self, count: int) -> 'QueryBuilder':
+        self._params.append(('limit', str(count)))
+        return self
+
+    def range(self, start: int, end: int) -> 'QueryBuilder':
+        self._params.append(('offset', str(start)))
+        self._params.append(('limit', str(end - start + 1)))
+        return self
+
+    async def execute(self) -> APIResponse:
+        params = list(self._params)
+        if self._orders:
+            params.append(('order', ','.join(self._orders)))
+
+        headers = {}
+        if self._prefer:
+            headers['Prefer'] = ','.join(self._prefer)
+
+        content = None
+        if self._body is not None:
+            content = _dumps(self._body)
+            headers['Content-Type'] = 'application/json'
+
+        response = await self._client.request(self._method, self._path, params=params, content=content, headers=headers)
+        return _parse_response(response)
+
+class FunctionRequest:
+    """Edge function invocation; awaited through execute()"""
+
+    def __init__(self, client: 'AsyncSupabaseClient', name: str, body: Any = None):
+        self._client = client
+        self._name = name
+        self._body = body
+
+    async def execute(self) -> APIResponse:
+        response = await self._client.request(
+            'POST',
+            f'/functions/v1/{self._name}',
+            content=_dumps(self._body or {}),
+            headers={'Content-Type': 'application/json'}
+        )
+
+        # Edge functions report errors in the JSON body, so non-2xx responses
+        # are returned as data rather than raised
+        try:
+            data = response.json() if response.content else None
+        except ValueError:
+            raise SupabaseAPIError(response.text or 'Invalid edge function response', response.status_code)
+        return APIResponse(data=data, status_code=response.status_code, headers=response.headers)
+
+class FunctionsClient:
+    def __init__(self, client: 'AsyncSupabaseClient'):
+        self._client = client
+
+    def invoke(self, name: str, body: Any = None) -> FunctionRequest:
+        return FunctionRequest(self._client, name, body)
+
+def _parse_response(response: httpx.Response) -> APIResponse:
+    """Turn a PostgREST response into an APIResponse, raising on errors"""
+    try:
+        data = response.json() if response.content else None
+    except ValueError:
+        data = None
+
+    if response.status_code >= 400:
+        if isinstance(data, dict):
+            raise SupabaseAPIError(
+                data.get('message') or str(data),
+                response.status_code,
+                code=data.get('code'),
+                details=data.get('details')
+            )
+        raise SupabaseAPIError(response.text or f'HTTP {response.status_code}', response.status_code)
+
+    count = None
+    content_range = response.headers.get('content-range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total.isdigit():
+            count = int(total)
+
+    return APIResponse(data=data, count=count, status_code=response.status_code)
+
+class AsyncSupabaseClient:
+    """Async Supabase client sharing one pooled keep-alive HTTP connection pool"""
+
+    def __init__(self, url: str, key: str, max_connections: int = 20, max_keepalive: int = 10, timeout: float = 30.0):
+        self.url = url.rstrip('/')
+        self._http = httpx.AsyncClient(
+            base_url=self.url,
+            headers={
+                'apikey': key,
+                'Authorization': f'Bearer {key}'
+            },
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=httpx.Timeout(timeout, connect=10.0)
+        )
+        self.functions = FunctionsClient(self)
+
+    def table(self, name: str) -> QueryBuilder:
+        return QueryBuilder(self, f'/rest/v1/{name}')
+
+    from_ = table
+
+    def rpc(self, function: str, params: Optional[Dict[str, Any]] = None) -> QueryBuilder:
+        return QueryBuilder(self, f'/rest/v1/rpc/{function}', method='POST', body=params or {})
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        target = _metric_target(path)
+        started = time.perf_counter()
+        try:
+            response = await self._http.request(method, path, **kwargs)
+        except Exception:
+            SUPABASE_REQUESTS.labels(target, 'error').inc()
+            SUPABASE_UP.set(0)
+            raise
+        SUPABASE_REQUESTS.labels(target, f'{response.status_code // 100}xx').inc()
+        SUPABASE_REQUEST_SECONDS.labels(target).observe(time.perf_counter() - started)
+        if not target.startswith('fn/'):
+            # Edge functions pass provider failures through as 5xx, so only PostgREST decides liveness
+            SUPABASE_UP.set(0 if response.status_code >= 500 else 1)
+        return response
+
+    async def aclose(self):
+        await self._http.aclose()
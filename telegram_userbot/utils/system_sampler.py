@@ -0,0 +1,145 @@
+"""
+System Sampler for Telegram Upload Bot
+One background thread samples psutil on a fixed interval and publishes the latest snapshot,
+so monitors, health checks and the metrics exporter read resource usage without blocking the event loop
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# First cpu_percent(interval=None) call only sets the baseline; the first snapshot waits this long
+PRIME_SECONDS = 0.5
+
+@dataclass(frozen=True)
+class SystemSnapshot:
+    """Resource usage at one sample time (system-wide, plus this process)"""
+    timestamp: float
+    cpu_percent: float
+    memory_percent: float
+    disk_percent: float
+    net_bytes_sent: int
+    net_bytes_recv: int
+    net_packets_sent: int
+    net_packets_recv: int
+    process_cpu_percent: float
+    process_rss: int
+    process_threads: int
+    process_open_fds: int
+    process_connections: int
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.timestamp
+
+class SystemSampler:
+    """Samples in a daemon thread; snapshot() just returns the last published value"""
+
+    def __init__(self, interval: float = 5.0, disk_path: str = '/'):
+        self.interval = max(0.5, interval)
+        self.disk_path = disk_path
+        self._process = psutil.Process(os.getpid())
+        self._snapshot: Optional[SystemSnapshot] = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.samples = 0
+        self.errors = 0
+        self.last_sample_seconds = 0.0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='system-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def snapshot(self) -> Optional[SystemSnapshot]:
+        """Latest snapshot (None until the first sample is published)"""
+        return self._snapshot
+
+    async def wait_ready(self, timeout: float = 5.0) -> Optional[SystemSnapshot]:
+        """Latest snapshot, waiting off-loop for the first one if needed"""
+        if self._snapshot is None:
+            self.start()
+            await asyncio.to_thread(self._ready.wait, timeout)
+        return self._snapshot
+
+    def _run(self):
+        # Set the CPU baselines; later interval=None calls measure since the previous call
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+        self._stop.wait(PRIME_SECONDS)
+
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                self._snapshot = self._sample()
+                self.samples += 1
+                self._ready.set()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error sampling system metrics: {e}")
+            self.last_sample_seconds = time.perf_counter() - started
+            self._stop.wait(self.interval)
+
+    def _sample(self) -> SystemSnapshot:
+        process = self._process
+        net = psutil.net_io_counters()
+        with process.oneshot():
+            memory = process.memory_info()
+            threads = process.num_threads()
+            fds = process.num_fds() if hasattr(process, 'num_fds') else process.num_handles()
+            process_cpu = process.cpu_percent(interval=None)
+        # Only this process's sockets, not a walk over every socket on the host
+        connections = getattr(process, 'net_connections', None) or process.connections
+
+        return SystemSnapshot(
+            timestamp=time.time(),
+            cpu_percent=psutil.cpu_percent(interval=None),
+            memory_percent=psutil.virtual_memory().percent,
+            disk_percent=psutil.disk_usage(self.disk_path).percent,
+            net_bytes_sent=net.bytes_sent,
+            net_bytes_recv=net.bytes_recv,
+            net_packets_sent=net.packets_sent,
+            net_packets_recv=net.packets_recv,
+            process_cpu_percent=process_cpu,
+            process_rss=memory.rss,
+            process_threads=threads,
+            process_open_fds=fds,
+            process_connections=len(connections(kind='inet'))
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'interval': self.interval,
+            'samples': self.samples,
+            'errors': self.errors,
+            'last_sample_seconds': round(self.last_sample_seconds, 4),
+            'age_seconds': round(self._snapshot.age, 1) if self._snapshot else None
+        }
+
+_shared: Optional[SystemSampler] = None
+
+def get_sampler(interval: Optional[float] = None) -> SystemSampler:
+    """The process-wide sampler, started on first use (interval only applies to the first call)"""
+    global _shared
+    if _shared is None:
+        _shared = SystemSampler(interval if interval is not None else 5.0)
+    _shared.start()
+    return _shared
@@ -5,25 +5,65 @@ Handles instant admin notifications with inline keyboard controls
 
 import asyncio
 import logging
+import secrets
+import time
 from typing import List, Dict, Any, Optional
 from pyrogram import Client
+from pyrogram.errors import FloodWait
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from .supabase_client import SupabaseManager
+from .callback_store import CallbackStore
+from .metrics import MetricFamily
 
 logger = logging.getLogger(__name__)
 
+# One-letter failure categories kept in callback payloads
+_CATEGORY_CODES = {'both_failed': 'b', 'regular_failed': 'r', 'premium_failed': 'p', 'unknown_error': 'u'}
+_CATEGORY_NAMES = {code: name for name, code in _CATEGORY_CODES.items()}
+
 class TelegramNotificationBot:
-    def __init__(self, client: Client, supabase: SupabaseManager):
+    # A send hit by FloodWait is retried after the wait this many times
+    MAX_FLOOD_RETRIES = 2
+
+    # Failures shown by name in a digest (the rest are counted)
+    DIGEST_MAX_ITEMS = 10
+    # Retries run at once when an admin presses a bulk-retry button
+    BULK_RETRY_CONCURRENCY = 2
+
+    def __init__(self, client: Client, supabase: SupabaseManager, upload_handler=None, send_concurrency: int = 5,
+                 digest_window: float = 60.0, callback_store: Optional[CallbackStore] = None):
         self.client = client
         self.supabase = supabase
+        self.upload_handler = upload_handler
         self._admin_cache = {}
-        self._callback_data_cache = {}
+        # Inline-button payloads (in memory only unless main passes a persistent store)
+        self.callbacks = callback_store or CallbackStore()
+        
+        # Admin fan-out runs concurrently, bounded so a burst cannot trip Telegram flood limits
+        self._send_slots = asyncio.Semaphore(max(1, send_concurrency))
+        # FloodWait applies to the whole account, so every sender pauses until it passes
+        self._flood_until = 0.0
+        
+        # Failures/successes within digest_window are merged into one digest per admin;
+        # a critical failure is sent at once when none of its kind was seen in the window before
+        self.digest_window = digest_window
+        self._digest_failures: List[Dict[str, Any]] = []
+        self._digest_successes: List[Dict[str, Any]] = []
+        self._digest_task: Optional[asyncio.Task] = None
+        self._digest_sending = False
+        self._last_critical: Dict[str, float] = {}
+        
+        self.sent = 0
+        self.send_failures = 0
+        self.flood_waits = 0
+        self.immediate_alerts = 0
+        self.coalesced = 0
+        self.digests_sent = 0
         
     async def get_admin_accounts(self) -> List[Dict]:
         """Get cached admin telegram accounts"""
         try:
             # Cache for 5 minutes
-            import time
             current_time = time.time()
             
             if 'admins' not in self._admin_cache or (current_time - self._admin_cache.get('timestamp', 0)) > 300:
@@ -40,7 +80,161 @@ class TelegramNotificationBot:
             logger.error(f"Error getting admin accounts: {e}")
             return []
     
+    @staticmethod
+    def _failure_category(error_details: Dict) -> str:
+        """both_failed / regular_failed / premium_failed / unknown_error"""
+        regular_error = error_details.get('regular_error')
+        premium_error = error_details.get('premium_error')
+        if regular_error and premium_error:
+            return "both_failed"
+        if regular_error:
+            return "regular_failed"
+        if premium_error:
+            return "premium_failed"
+        return "unknown_error"
+    
+    def _is_first_critical(self, failure_data: Dict[str, Any]) -> bool:
+        """Critical (nothing uploaded, or a permanent error) and first of its kind in the window"""
+        error_details = failure_data.get('error_details') or {}
+        category = self._failure_category(error_details)
+        permanent = (error_details.get('context') or {}).get('failure_class') == 'permanent'
+        if category not in ("both_failed", "unknown_error") and not permanent:
+            return False
+        
+        key = 'permanent' if permanent else category
+        now = time.monotonic()
+        last = self._last_critical.get(key)
+        self._last_critical[key] = now
+        return last is None or now - last > self.digest_window
+    
     async def notify_upload_failure(self, failure_data: Dict[str, Any]) -> bool:
+        """Notify admins of an upload failure: at once if it is the first critical one, else via the digest"""
+        try:
+            if self.digest_window <= 0 or self._is_first_critical(failure_data):
+                self.immediate_alerts += 1
+                return await self._send_failure_alert(failure_data)
+            
+            self._digest_failures.append(failure_data)
+            self._schedule_digest()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error queueing failure notification: {e}")
+            return False
+    
+    async def notify_upload_success(self, success_data: Dict[str, Any]) -> bool:
+        """Notify admins of a successful upload (merged into the next digest)"""
+        if self.digest_window <= 0:
+            return await self._send_success_alert(success_data)
+        self._digest_successes.append(success_data)
+        self._schedule_digest()
+        return True
+    
+    def _schedule_digest(self):
+        self.coalesced += 1
+        if not self._digest_task or self._digest_task.done():
+            self._digest_task = asyncio.create_task(self._digest_after_window())
+    
+    async def _digest_after_window(self):
+        await asyncio.sleep(self.digest_window)
+        # From here on close() lets the send finish instead of cancelling it
+        self._digest_sending = True
+        try:
+            await self.flush_digest()
+        finally:
+            self._digest_sending = False
+    
+    async def close(self):
+        """Stop the digest timer and send what it was holding (call before the client stops)"""
+        task, self._digest_task = self._digest_task, None
+        if task and not task.done():
+            if not self._digest_sending:
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush_digest()
+    
+    async def flush_digest(self) -> bool:
+        """Send everything collected since the last digest as one message per admin"""
+        failures, self._digest_failures = self._digest_failures, []
+        successes, self._digest_successes = self._digest_successes, []
+        if not failures and not successes:
+            return False
+        
+        try:
+            admins = await self.get_admin_accounts()
+            if not admins:
+                logger.warning("No admin accounts found for notifications")
+                return False
+            
+            text, keyboard = self._build_digest(failures, successes)
+            success_count = await self._send_to_admins(admins, text, keyboard)
+            self.digests_sent += 1
+            logger.info(f"Notification digest sent to {success_count} admins ({len(failures)} failures, {len(successes)} successes)")
+            
+            if failures:
+                await self.supabase.log_admin_notification({
+                    'upload_failure_id': None,
+                    'notification_type': 'upload_failure_digest',
+                    'sent_to_count': success_count,
+                    'error_category': 'digest',
+                    'message_preview': text[:200]
+                })
+            return success_count > 0
+            
+        except Exception as e:
+            logger.error(f"Error sending notification digest: {e}")
+            return False
+    
+    def _build_digest(self, failures: List[Dict], successes: List[Dict]):
+        """Digest text and its bulk-action keyboard"""
+        categories = {}
+        for failure in failures:
+            if failure.get('id'):
+                categories[failure['id']] = self._failure_category(failure.get('error_details') or {})
+        counts = {category: list(categories.values()).count(category)
+                  for category in ("both_failed", "regular_failed", "premium_failed", "unknown_error")}
+        
+        text = f"📦 **Upload Digest** (last {self.digest_window:.0f}s)\n\n"
+        if failures:
+            text += (f"❌ **Failed:** {len(failures)} "
+                     f"(🔴 both: {counts['both_failed']} | 🟡 regular: {counts['regular_failed']} | "
+                     f"🟠 premium: {counts['premium_failed']})\n")
+            for failure in failures[:self.DIGEST_MAX_ITEMS]:
+                error_details = failure.get('error_details') or {}
+                name = (error_details.get('file_info') or {}).get('original_name', 'Unknown File')
+                text += f"• `{name}` - {self._failure_category(error_details).replace('_', ' ')}\n"
+            if len(failures) > self.DIGEST_MAX_ITEMS:
+                text += f"• ... and {len(failures) - self.DIGEST_MAX_ITEMS} more (`/failures`)\n"
+        if successes:
+            text += f"\n✅ **Uploaded:** {len(successes)}\n"
+            for success in successes[:self.DIGEST_MAX_ITEMS]:
+                name = (success.get('file_info') or {}).get('original_name', 'Unknown File')
+                text += f"• `{name}` ({success.get('group_name', 'Unknown Group')})\n"
+            if len(successes) > self.DIGEST_MAX_ITEMS:
+                text += f"• ... and {len(successes) - self.DIGEST_MAX_ITEMS} more\n"
+        
+        if not categories:
+            return text, None
+        
+        # Callback data is limited to 64 bytes, so the batch is referenced by a short id
+        batch_id = secrets.token_hex(4)
+        self.callbacks.put(f"bulk:{batch_id}", [[failure_id, _CATEGORY_CODES[category]] for failure_id, category in categories.items()])
+        
+        regular_count = counts['both_failed'] + counts['regular_failed']
+        premium_count = counts['both_failed'] + counts['premium_failed']
+        provider_row = []
+        if regular_count:
+            provider_row.append(InlineKeyboardButton(f"🔄 Retry Regular ({regular_count})", callback_data=f"bulk:{batch_id}:regular"))
+        if premium_count:
+            provider_row.append(InlineKeyboardButton(f"🔄 Retry Premium ({premium_count})", callback_data=f"bulk:{batch_id}:premium"))
+        keyboard_buttons = [provider_row] if provider_row else []
+        keyboard_buttons.append([
+            InlineKeyboardButton(f"🔄 Retry All ({len(categories)})", callback_data=f"bulk:{batch_id}:both"),
+            InlineKeyboardButton("⚠️ Mark All Manual", callback_data=f"bulk:{batch_id}:manual")
+        ])
+        return text, InlineKeyboardMarkup(keyboard_buttons)
+    
+    async def _send_failure_alert(self, failure_data: Dict[str, Any]) -> bool:
         """Send real-time notification to admins about upload failure"""
         try:
             admins = await self.get_admin_accounts()
@@ -59,20 +253,17 @@ class TelegramNotificationBot:
             # Categorize error type
             regular_error = error_details.get('regular_error')
             premium_error = error_details.get('premium_error')
+            error_category = self._failure_category(error_details)
             
             # Build notification message
             status_icon = "🚨"
-            if regular_error and premium_error:
-                error_category = "both_failed"
+            if error_category == "both_failed":
                 error_summary = f"❌ Regular: {regular_error[:50]}...\n❌ Premium: {premium_error[:50]}..."
-            elif regular_error:
-                error_category = "regular_failed"
+            elif error_category == "regular_failed":
                 error_summary = f"❌ Regular: {regular_error[:100]}...\n✅ Premium: Success"
-            elif premium_error:
-                error_category = "premium_failed"
+            elif error_category == "premium_failed":
                 error_summary = f"✅ Regular: Success\n❌ Premium: {premium_error[:100]}..."
             else:
-                error_category = "unknown_error"
                 error_summary = f"❌ Error: {error_message[:100]}..."
             
             notification_text = f"""
@@ -95,11 +286,7 @@ Choose action below:
             callback_base = f"retry:{upload_id}:{error_category}"
             
             # Store callback data for processing
-            self._callback_data_cache[upload_id] = {
-                'failure_data': failure_data,
-                'error_category': error_category,
-                'timestamp': asyncio.get_event_loop().time()
-            }
+            self.callbacks.put(f"retry:{upload_id}", _CATEGORY_CODES[error_category])
             
             # Build inline keyboard based on error type
             keyboard_buttons = []
@@ -146,22 +333,7 @@ Choose action below:
             keyboard = InlineKeyboardMarkup(keyboard_buttons)
             
             # Send to all admins
-            success_count = 0
-            for admin in admins:
-                try:
-                    telegram_user_id = admin.get('telegram_user_id')
-                    if telegram_user_id:
-                        await self.client.send_message(
-                            chat_id=telegram_user_id,
-                            text=notification_text,
-                            reply_markup=keyboard,
-                            parse_mode="markdown"
-                        )
-                        success_count += 1
-                        logger.info(f"Notification sent to admin {telegram_user_id}")
-                        
-                except Exception as e:
-                    logger.error(f"Failed to send notification to admin {admin.get('telegram_user_id')}: {e}")
+            success_count = await self._send_to_admins(admins, notification_text, keyboard)
             
             # Log notification attempt
             await self.supabase.log_admin_notification({
@@ -178,7 +350,7 @@ Choose action below:
             logger.error(f"Error sending failure notification: {e}")
             return False
     
-    async def notify_upload_success(self, success_data: Dict[str, Any]) -> bool:
+    async def _send_success_alert(self, success_data: Dict[str, Any]) -> bool:
         """Send success notification to admins"""
         try:
             admins = await self.get_admin_accounts()
@@ -204,27 +376,70 @@ Choose action below:
 Ready for viewing on website!
 """
             
-            success_count = 0
-            for admin in admins:
-                try:
-                    telegram_user_id = admin.get('telegram_user_id')
-                    if telegram_user_id:
-                        await self.client.send_message(
-                            chat_id=telegram_user_id,
-                            text=notification_text,
-                            parse_mode="markdown"
-                        )
-                        success_count += 1
-                        
-                except Exception as e:
-                    logger.error(f"Failed to send success notification to admin {admin.get('telegram_user_id')}: {e}")
-            
+            success_count = await self._send_to_admins(admins, notification_text)
             return success_count > 0
             
         except Exception as e:
             logger.error(f"Error sending success notification: {e}")
             return False
     
+    async def _send_to_admins(self, admins: List[Dict], text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> int:
+        """Send one message to every admin concurrently; returns how many were delivered"""
+        chat_ids = [admin.get('telegram_user_id') for admin in admins if admin.get('telegram_user_id')]
+        results = await asyncio.gather(*(self._send(chat_id, text, reply_markup) for chat_id in chat_ids))
+        return sum(results)
+    
+    async def _send(self, chat_id: int, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+        """Send to one admin, waiting out FloodWait instead of dropping the message"""
+        for attempt in range(self.MAX_FLOOD_RETRIES + 1):
+            delay = self._flood_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            
+            async with self._send_slots:
+                try:
+                    await self.client.send_message(
+                        chat_id=chat_id,
+                        text=text,
+                        reply_markup=reply_markup,
+                        parse_mode="markdown"
+                    )
+                    self.sent += 1
+                    return True
+                except FloodWait as e:
+                    self.flood_waits += 1
+                    self._flood_until = max(self._flood_until, time.monotonic() + e.value)
+                    logger.warning(f"FloodWait {e.value}s sending notification to admin {chat_id} (attempt {attempt + 1})")
+                except Exception as e:
+                    logger.error(f"Failed to send notification to admin {chat_id}: {e}")
+                    break
+        
+        self.send_failures += 1
+        return False
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'sent': self.sent,
+            'send_failures': self.send_failures,
+            'flood_waits': self.flood_waits,
+            'immediate_alerts': self.immediate_alerts,
+            'coalesced': self.coalesced,
+            'digests_sent': self.digests_sent,
+            'digest_pending': len(self._digest_failures) + len(self._digest_successes),
+            'callbacks': self.callbacks.get_stats(),
+            'admins_cached': len(self._admin_cache.get('admins', []))
+        }
+    
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Notification counters for the metrics exporter"""
+        return [
+            MetricFamily('admin_notifications_sent_total', 'counter', 'Admin messages delivered').add(self.sent),
+            MetricFamily('admin_notification_failures_total', 'counter', 'Admin messages that could not be delivered').add(self.send_failures),
+            MetricFamily('admin_notification_flood_waits_total', 'counter', 'FloodWait pauses while notifying admins').add(self.flood_waits),
+            MetricFamily('admin_notification_digest_pending', 'gauge', 'Events waiting for the next digest').add(len(self._digest_failures) + len(self._digest_successes)),
+            MetricFamily('callback_store_entries', 'gauge', 'Retry-button callbacks kept').add(len(self.callbacks)),
+        ]
+    
     async def handle_callback_query(self, callback_query: CallbackQuery) -> bool:
         """Handle inline keyboard callback queries"""
         try:
@@ -236,6 +451,9 @@ Ready for viewing on website!
                 await callback_query.answer("❌ Unauthorized: Admin access required", show_alert=True)
                 return False
             
+            if callback_data.startswith("bulk:"):
+                return await self._handle_bulk_callback(callback_query)
+            
             # Parse callback data: retry:{upload_id}:{error_category}:{action}
             if not callback_data.startswith("retry:"):
                 await callback_query.answer("❌ Invalid callback data", show_alert=True)
@@ -248,14 +466,11 @@ Ready for viewing on website!
             
             _, upload_id, error_category, action = parts
             
-            # Get cached failure data
-            cached_data = self._callback_data_cache.get(upload_id)
-            if not cached_data:
+            # Buttons are only honoured while their callback entry is alive
+            if self.callbacks.get(f"retry:{upload_id}") is None:
                 await callback_query.answer("❌ Callback data expired. Use /failures command.", show_alert=True)
                 return False
             
-            failure_data = cached_data['failure_data']
-            
             # Handle different actions
             if action == "cancel":
                 await callback_query.answer("❌ Upload cancelled by admin")
@@ -299,31 +514,86 @@ Ready for viewing on website!
             await callback_query.answer("❌ Error processing request", show_alert=True)
             return False
     
-    async def _process_retry(self, upload_id: str, retry_type: str, callback_query: CallbackQuery):
-        """Process retry request asynchronously"""
+    async def _handle_bulk_callback(self, callback_query: CallbackQuery) -> bool:
+        """Digest buttons: bulk:{batch_id}:{regular|premium|both|manual}"""
+        parts = callback_query.data.split(":")
+        if len(parts) != 3:
+            await callback_query.answer("❌ Invalid callback format", show_alert=True)
+            return False
+        
+        _, batch_id, action = parts
+        batch = self.callbacks.get(f"bulk:{batch_id}")
+        if not batch:
+            await callback_query.answer("❌ Callback data expired. Use /failures command.", show_alert=True)
+            return False
+        
+        categories = {failure_id: _CATEGORY_NAMES.get(code, 'unknown_error') for failure_id, code in batch}
+        if action == "manual":
+            for failure_id in categories:
+                await self.supabase.mark_upload_manual_required(failure_id)
+            await callback_query.answer(f"⚠️ Marked {len(categories)} uploads as manual")
+            await callback_query.edit_message_text(
+                text=callback_query.message.text + "\n\n⚠️ **ALL MARKED FOR MANUAL UPLOAD**",
+                parse_mode="markdown"
+            )
+            return True
+        
+        if action not in ("regular", "premium", "both"):
+            await callback_query.answer("❌ Unknown action", show_alert=True)
+            return False
+        
+        if action == "both":
+            failure_ids = list(categories)
+        else:
+            failure_ids = [fid for fid, category in categories.items() if category in ("both_failed", f"{action}_failed")]
+        
+        await callback_query.answer(f"🔄 Retrying {len(failure_ids)} uploads ({action})...")
+        await callback_query.edit_message_text(
+            text=callback_query.message.text + f"\n\n🔄 **BULK RETRY IN PROGRESS ({action.upper()}, {len(failure_ids)})**",
+            parse_mode="markdown"
+        )
+        asyncio.create_task(self._process_bulk_retry(failure_ids, action, callback_query))
+        return True
+    
+    async def _process_bulk_retry(self, failure_ids: List[str], retry_type: str, callback_query: CallbackQuery):
+        """Retry a digest's failures a few at a time and report the totals"""
         try:
-            # Get original upload data
-            upload_data = await self.supabase.get_upload_by_id(upload_id)
-            if not upload_data:
-                await callback_query.edit_message_text(
-                    text=callback_query.message.text.replace("🔄 **RETRY IN PROGRESS", "❌ **RETRY FAILED - Upload not found"),
-                    parse_mode="markdown"
-                )
-                return
+            if not self.upload_handler:
+                succeeded = 0
+            else:
+                slots = asyncio.Semaphore(self.BULK_RETRY_CONCURRENCY)
+                
+                async def retry_one(failure_id: str) -> bool:
+                    async with slots:
+                        return await self.upload_handler.retry_failed_upload(failure_id, retry_type)
+                
+                results = await asyncio.gather(*(retry_one(fid) for fid in failure_ids), return_exceptions=True)
+                succeeded = sum(1 for result in results if result is True)
             
-            # Get original message
-            chat_id = upload_data.get('telegram_chat_id')
-            message_id = upload_data.get('telegram_message_id')
+            icon = "✅" if succeeded == len(failure_ids) else "⚠️" if succeeded else "❌"
+            await callback_query.edit_message_text(
+                text=callback_query.message.text.replace(
+                    "🔄 **BULK RETRY IN PROGRESS",
+                    f"{icon} **BULK RETRY DONE: {succeeded}/{len(failure_ids)} succeeded"
+                ),
+                parse_mode="markdown"
+            )
             
-            if not chat_id or not message_id:
+        except Exception as e:
+            logger.error(f"Error processing bulk retry: {e}")
+    
+    async def _process_retry(self, failure_id: str, retry_type: str, callback_query: CallbackQuery):
+        """Process retry request asynchronously (callback ids are upload_failures ids)"""
+        try:
+            if not self.upload_handler:
                 await callback_query.edit_message_text(
-                    text=callback_query.message.text.replace("🔄 **RETRY IN PROGRESS", "❌ **RETRY FAILED - Original message not found"),
+                    text=callback_query.message.text.replace("🔄 **RETRY IN PROGRESS", "❌ **RETRY FAILED - Upload handler unavailable"),
                     parse_mode="markdown"
                 )
                 return
             
-            # Retry the upload with specific provider
-            success = await self.supabase.retry_upload_with_provider(upload_id, retry_type)
+            # Re-upload only to the provider(s) that failed, from the stored telegram_file_id
+            success = await self.upload_handler.retry_failed_upload(failure_id, retry_type)
             
             if success:
                 await callback_query.edit_message_text(
@@ -344,21 +614,11 @@ Ready for viewing on website!
             )
     
     async def cleanup_expired_callbacks(self):
-        """Clean up expired callback data (call periodically)"""
+        """Clean up expired callback data (call every callbacks.slot_seconds)"""
         try:
-            current_time = asyncio.get_event_loop().time()
-            expired_keys = []
-            
-            for upload_id, data in self._callback_data_cache.items():
-                # Expire after 1 hour
-                if current_time - data['timestamp'] > 3600:
-                    expired_keys.append(upload_id)
-            
-            for key in expired_keys:
-                del self._callback_data_cache[key]
-            
-            if expired_keys:
-                logger.info(f"Cleaned up {len(expired_keys)} expired callback entries")
+            expired = self.callbacks.expire()
+            if expired:
+                logger.info(f"Cleaned up {expired} expired callback entries")
                 
         except Exception as e:
             logger.error(f"Error cleaning up callbacks: {e}")
\ No newline at end of file
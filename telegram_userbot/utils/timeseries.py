@@ -0,0 +1,280 @@
+"""
+Time-Series Ring Store for Telegram Upload Bot
+Fixed-memory history of numeric samples kept in typed arrays: raw samples plus 1-minute and
+1-hour rollups (round-robin, RRD style), so summaries and trends are computed locally
+"""
+
+import math
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+NAN = float('nan')
+
+def _zeros(typecode: str, size: int) -> array:
+    return array(typecode, bytes(array(typecode).itemsize * size))
+
+def _filled(typecode: str, size: int, value: float) -> array:
+    return array(typecode, [value]) * size
+
+class _Ring:
+    """Round-robin slots ordered by timestamp; logical index 0 is the oldest kept slot"""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self.ts = _zeros('d', self.capacity)
+        self.head = 0
+        self.size = 0
+
+    def _next_slot(self) -> int:
+        slot = self.head
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        return slot
+
+    def _physical(self, logical: int) -> int:
+        return (self.head - self.size + logical) % self.capacity
+
+    @property
+    def wrapped(self) -> bool:
+        return self.size == self.capacity
+
+    def oldest(self) -> Optional[float]:
+        return self.ts[self._physical(0)] if self.size else None
+
+    def _segments(self, since: float) -> List[slice]:
+        """Physical slices (at most two) holding the slots with ts >= since, oldest first"""
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[self._physical(mid)] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo >= self.size:
+            return []
+        start = self._physical(lo)
+        end = self._physical(self.size - 1) + 1
+        if start < end:
+            return [slice(start, end)]
+        return [slice(start, self.capacity), slice(0, end)]
+
+class _RawTier(_Ring):
+    """One slot per sample; missing values are NaN"""
+
+    name = 'raw'
+    width = 0.0
+
+    def __init__(self, capacity: int, fields: int):
+        super().__init__(capacity)
+        self.values = [_zeros('d', self.capacity) for _ in range(fields)]
+
+    def add(self, ts: float, row: Sequence[float]):
+        slot = self._next_slot()
+        self.ts[slot] = ts
+        for column, value in zip(self.values, row):
+            column[slot] = value
+
+    def field_summary(self, index: int, since: float) -> Tuple[int, float, float, float]:
+        column = self.values[index]
+        values = [v for seg in self._segments(since) for v in column[seg] if v == v]
+        if not values:
+            return 0, 0.0, math.inf, -math.inf
+        return len(values), math.fsum(values), min(values), max(values)
+
+    def points(self, index: int, since: float) -> List[Tuple[float, float]]:
+        column = self.values[index]
+        return [(self.ts[i], column[i]) for seg in self._segments(since)
+                for i in range(seg.start, seg.stop) if column[i] == column[i]]
+
+class _RollupTier(_Ring):
+    """One slot per `width` seconds with count/sum/min/max per field; the newest bucket stays open"""
+
+    def __init__(self, name: str, width: float, capacity: int, fields: int):
+        super().__init__(capacity)
+        self.name = name
+        self.width = width
+        self.count = [_zeros('l', self.capacity) for _ in range(fields)]
+        self.sum = [_zeros('d', self.capacity) for _ in range(fields)]
+        self.min = [_filled('d', self.capacity, math.inf) for _ in range(fields)]
+        self.max = [_filled('d', self.capacity, -math.inf) for _ in range(fields)]
+
+        self._open_start: Optional[float] = None
+        self._open = self._empty_bucket(fields)
+
+    @staticmethod
+    def _empty_bucket(fields: int) -> List[List[float]]:
+        return [[0] * fields, [0.0] * fields, [math.inf] * fields, [-math.inf] * fields]
+
+    def add(self, ts: float, counts, sums, mins, maxs) -> Optional[tuple]:
+        """Fold values into the bucket for ts; returns the bucket closed by moving past it"""
+        start = ts - (ts % self.width)
+        closed = None
+        if self._open_start is not None and start != self._open_start:
+            closed = self._close()
+        if self._open_start is None:
+            self._open_start = start
+
+        count, total, low, high = self._open
+        for i, n in enumerate(counts):
+            if n:
+                count[i] += n
+                total[i] += sums[i]
+                low[i] = min(low[i], mins[i])
+                high[i] = max(high[i], maxs[i])
+        return closed
+
+    def _close(self) -> tuple:
+        slot = self._next_slot()
+        self.ts[slot] = self._open_start
+        count, total, low, high = self._open
+        for i in range(len(count)):
+            self.count[i][slot] = count[i]
+            self.sum[i][slot] = total[i]
+            self.min[i][slot] = low[i]
+            self.max[i][slot] = high[i]
+        closed = (self._open_start, count, total, low, high)
+        self._open_start = None
+        self._open = self._empty_bucket(len(count))
+        return closed
+
+    def field_summary(self, index: int, since: float) -> Tuple[int, float, float, float]:
+        segments = self._segments(since)
+        count = sum(sum(self.count[index][seg]) for seg in segments)
+        total = math.fsum(math.fsum(self.sum[index][seg]) for seg in segments)
+        low = min((min(self.min[index][seg]) for seg in segments), default=math.inf)
+        high = max((max(self.max[index][seg]) for seg in segments), default=-math.inf)
+        if self._open_start is not None and self._open_start + self.width > since:
+            open_count, open_sum, open_min, open_max = (part[index] for part in self._open)
+            count += open_count
+            total += open_sum
+            low = min(low, open_min)
+            high = max(high, open_max)
+        return count, total, low, high
+
+    def points(self, index: int, since: float) -> List[Tuple[float, float]]:
+        counts, sums = self.count[index], self.sum[index]
+        points = [(self.ts[i], sums[i] / counts[i]) for seg in self._segments(since)
+                  for i in range(seg.start, seg.stop) if counts[i]]
+        open_count, open_sum = self._open[0][index], self._open[1][index]
+        if self._open_start is not None and open_count and self._open_start + self.width > since:
+            points.append((self._open_start, open_sum / open_count))
+        return points
+
+class TieredRingStore:
+    """Raw samples, 1-minute and 1-hour rollups of a fixed set of numeric fields
+
+    Memory is allocated once. Queries use the finest tier that still holds the
+    whole window, so recent windows are exact and long windows stay cheap.
+    """
+
+    def __init__(self, fields: Sequence[str], raw_capacity: int = 720, minute_capacity: int = 1440, hour_capacity: int = 168):
+        self.fields = tuple(fields)
+        self._index = {name: i for i, name in enumerate(self.fields)}
+        self.raw = _RawTier(raw_capacity, len(self.fields))
+        self.minute = _RollupTier('1m', 60.0, minute_capacity, len(self.fields))
+        self.hour = _RollupTier('1h', 3600.0, hour_capacity, len(self.fields))
+        self._last_ts = 0.0
+        self.appended = 0
+
+    def append(self, values: Dict[str, Any], timestamp: Optional[float] = None):
+        """Record one sample; fields that are missing or None are skipped in aggregates"""
+        # Keep the rings time-ordered even if the wall clock steps back
+        ts = max(timestamp if timestamp is not None else time.time(), self._last_ts)
+        self._last_ts = ts
+
+        row = []
+        for name in self.fields:
+            value = values.get(name)
+            row.append(NAN if value is None else float(value))
+        self.raw.add(ts, row)
+
+        present = [0 if v != v else 1 for v in row]
+        sums = [v if n else 0.0 for v, n in zip(row, present)]
+        mins = [v if n else math.inf for v, n in zip(row, present)]
+        maxs = [v if n else -math.inf for v, n in zip(row, present)]
+        closed = self.minute.add(ts, present, sums, mins, maxs)
+        if closed:
+            self.hour.add(*closed)
+        self.appended += 1
+
+    def _tier_for(self, since: float):
+        for tier in (self.raw, self.minute, self.hour):
+            if tier.size and (not tier.wrapped or tier.oldest() <= since):
+                return tier
+        # Nothing reaches back that far: the coarsest tier with data has the most history
+        for tier in (self.hour, self.minute):
+            if tier.size:
+                return tier
+        return self.raw
+
+    def summary(self, seconds: float, now: Optional[float] = None) -> Dict[str, Any]:
+        """avg/min/max/count per field over the last `seconds`"""
+        since = (now if now is not None else time.time()) - seconds
+        tier = self._tier_for(since)
+        fields = {}
+        samples = 0
+        for name, index in self._index.items():
+            count, total, low, high = tier.field_summary(index, since)
+            samples = max(samples, count)
+            fields[name] = {
+                'count': count,
+                'avg': total / count if count else None,
+                'min': low if count else None,
+                'max': high if count else None
+            }
+        return {'resolution': tier.name, 'samples': samples, 'fields': fields}
+
+    def series(self, name: str, seconds: float, now: Optional[float] = None) -> List[Tuple[float, float]]:
+        """(timestamp, value) points for one field, oldest first (bucket averages on rollup tiers)"""
+        since = (now if now is not None else time.time()) - seconds
+        return self._tier_for(since).points(self._index[name], since)
+
+    def trend(self, name: str, seconds: float, now: Optional[float] = None) -> float:
+        """Change per point between the oldest and newest value in the window"""
+        points = self.series(name, seconds, now)
+        if len(points) < 2:
+            return 0.0
+        return (points[-1][1] - points[0][1]) / len(points)
+
+    def since(self, timestamp: float) -> List[Tuple[float, Dict[str, Optional[float]]]]:
+        """Raw samples newer than `timestamp` that are still kept, oldest first"""
+        rows = []
+        for seg in self.raw._segments(timestamp):
+            for i in range(seg.start, seg.stop):
+                ts = self.raw.ts[i]
+                if ts <= timestamp:
+                    continue
+                rows.append((ts, {
+                    name: (None if column[i] != column[i] else column[i])
+                    for name, column in zip(self.fields, self.raw.values)
+                }))
+        return rows
+
+    def latest(self) -> Optional[Dict[str, Optional[float]]]:
+        if not self.raw.size:
+            return None
+        slot = self.raw._physical(self.raw.size - 1)
+        latest = {name: (None if column[slot] != column[slot] else column[slot])
+                  for name, column in zip(self.fields, self.raw.values)}
+        latest['timestamp'] = self.raw.ts[slot]
+        return latest
+
+    def __len__(self) -> int:
+        return self.raw.size
+
+    def memory_bytes(self) -> int:
+        arrays = [self.raw.ts, *self.raw.values]
+        for tier in (self.minute, self.hour):
+            arrays += [tier.ts, *tier.count, *tier.sum, *tier.min, *tier.max]
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'appended': self.appended,
+            'raw': self.raw.size,
+            'minutes': self.minute.size,
+            'hours': self.hour.size,
+            'memory_bytes': self.memory_bytes()
+        }
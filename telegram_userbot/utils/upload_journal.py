@@ -0,0 +1,153 @@
+"""
+Upload Journal for Telegram Upload Bot
+Crash-safe local record of upload job stages so unfinished jobs resume after a restart
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Stage order; each stage means everything before it has completed
+STAGE_ACCEPTED = 'accepted'    # passed filtering, nothing written to the database yet
+STAGE_LOGGED = 'logged'        # telegram_uploads row exists (upload_id)
+STAGE_UPLOADED = 'uploaded'    # Doodstream upload finished (doodstream_result)
+STAGE_RECORDED = 'recorded'    # videos row exists (video_id)
+
+STAGES = (STAGE_ACCEPTED, STAGE_LOGGED, STAGE_UPLOADED, STAGE_RECORDED)
+
+# file_info keys that hold Pyrogram objects and are not needed to resume
+_UNSERIALISABLE_KEYS = ('thumbnail',)
+
+def portable_file_info(file_info: Dict) -> Dict:
+    """file_info without the Pyrogram objects, safe to store as JSON"""
+    return {k: v for k, v in file_info.items() if k not in _UNSERIALISABLE_KEYS}
+
+def _dumps(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return json.dumps(value, default=str)
+
+def _loads(value: Optional[str]) -> Any:
+    return json.loads(value) if value else None
+
+class UploadJournal:
+    """SQLite (WAL) journal of in-flight upload jobs keyed by telegram file_unique_id"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.writes = 0
+        self.resumed = 0
+
+    def open(self):
+        """Open (or create) the journal database"""
+        if self._db:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        # WAL + NORMAL: each transition is one small append, durable across process crashes
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' job_key TEXT PRIMARY KEY,'
+            ' stage TEXT NOT NULL,'
+            ' file_info TEXT NOT NULL,'
+            ' source TEXT NOT NULL,'
+            ' upload_id TEXT,'
+            ' doodstream_result TEXT,'
+            ' video_id TEXT,'
+            ' resume_count INTEGER NOT NULL DEFAULT 0,'
+            ' created_at REAL NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+
+    def begin(self, job_key: str, file_info: Dict, source: Dict):
+        """Record a newly accepted job"""
+        if not self._db:
+            return
+        clean_info = portable_file_info(file_info)
+        now = time.time()
+        self._db.execute(
+            'INSERT OR REPLACE INTO jobs (job_key, stage, file_info, source, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_key, STAGE_ACCEPTED, _dumps(clean_info), _dumps(source), now, now)
+        )
+        self.writes += 1
+
+    def advance(self, job_key: str, stage: str, upload_id: Optional[str] = None,
+                doodstream_result: Optional[Dict] = None, video_id: Optional[str] = None):
+        """Record that a job completed a stage, along with that stage's output"""
+        if not self._db:
+            return
+        self._db.execute(
+            'UPDATE jobs SET stage = ?,'
+            ' upload_id = COALESCE(?, upload_id),'
+            ' doodstream_result = COALESCE(?, doodstream_result),'
+            ' video_id = COALESCE(?, video_id),'
+            ' updated_at = ? WHERE job_key = ?',
+            (stage, upload_id, _dumps(doodstream_result), video_id, time.time(), job_key)
+        )
+        self.writes += 1
+
+    def finish(self, job_key: str):
+        """Drop a job that reached a terminal state (done or failure recorded)"""
+        if not self._db:
+            return
+        self._db.execute('DELETE FROM jobs WHERE job_key = ?', (job_key,))
+        self.writes += 1
+
+    def mark_resumed(self, job_key: str):
+        if not self._db:
+            return
+        self._db.execute('UPDATE jobs SET resume_count = resume_count + 1 WHERE job_key = ?', (job_key,))
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Jobs left behind by a previous run, oldest first"""
+        if not self._db:
+            return []
+        rows = self._db.execute(
+            'SELECT job_key, stage, file_info, source, upload_id, doodstream_result, video_id, resume_count, created_at'
+            ' FROM jobs ORDER BY created_at'
+        ).fetchall()
+
+        jobs = []
+        for job_key, stage, file_info, source, upload_id, doodstream_result, video_id, resume_count, created_at in rows:
+            try:
+                jobs.append({
+                    'job_key': job_key,
+                    'stage': stage,
+                    'file_info': _loads(file_info),
+                    'source': _loads(source),
+                    'upload_id': upload_id,
+                    'doodstream_result': _loads(doodstream_result),
+                    'video_id': video_id,
+                    'resume_count': resume_count,
+                    'created_at': created_at
+                })
+            except ValueError as e:
+                logger.error(f"Dropping unreadable journal entry {job_key}: {e}")
+                self.finish(job_key)
+        return jobs
+
+    def pending_count(self) -> int:
+        if not self._db:
+            return 0
+        return self._db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'pending': self.pending_count(),
+            'writes': self.writes,
+            'resumed': self.resumed
+        }
@@ -0,0 +1,121 @@
+"""
+Upload Job Queue for Telegram Upload Bot
+Bounded async queue drained by a fixed pool of upload workers
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class UploadQueue:
+    """Bounded job queue with a configurable pool of upload workers"""
+
+    def __init__(self, worker: Callable[[Any], Awaitable[Any]], workers: int = 3, maxsize: int = 100, name: str = 'upload'):
+        self._worker = worker
+        self.name = name
+        self.workers = max(1, workers)
+        self.maxsize = max(1, maxsize)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks: List[asyncio.Task] = []
+        self._started_at: Optional[float] = None
+
+        # Worker utilisation
+        self._busy_workers = 0
+        self._busy_seconds = 0.0
+
+        # Job counters
+        self.enqueued = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+        # Wait-time (time spent queued before a worker picked the job up)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        """Start the worker pool (must be called from the running event loop)"""
+        if self._tasks:
+            return
+
+        self._started_at = time.monotonic()
+        for index in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._run_worker(index)))
+
+        logger.info(f"Started {self.workers} {self.name} workers (queue size {self.maxsize})")
+
+    async def stop(self):
+        """Stop the worker pool, cancelling any in-flight jobs"""
+        if not self._tasks:
+            return
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        logger.info(f"Stopped {self.name} workers ({self._queue.qsize()} jobs left in queue)")
+
+    def submit(self, job: Any) -> bool:
+        """Enqueue a job without waiting; returns False when the queue is full"""
+        try:
+            self._queue.put_nowait((time.monotonic(), job))
+            self.enqueued += 1
+            return True
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+
+    async def _run_worker(self, index: int):
+        """Worker loop: take jobs off the queue and run them one at a time"""
+        while True:
+            enqueued_at, job = await self._queue.get()
+
+            started_at = time.monotonic()
+            wait = started_at - enqueued_at
+            self._wait_total += wait
+            self._wait_last = wait
+            self._wait_max = max(self._wait_max, wait)
+
+            self._busy_workers += 1
+            try:
+                await self._worker(job)
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"{self.name} worker {index} job failed: {e}")
+            finally:
+                self._busy_workers -= 1
+                self._busy_seconds += time.monotonic() - started_at
+                self._queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, worker utilisation and wait-time metrics"""
+        picked_up = self.completed + self.failed + self._busy_workers
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self.maxsize,
+            'workers': self.workers,
+            'busy_workers': self._busy_workers,
+            'utilisation': self._busy_workers / self.workers,
+            'avg_utilisation': (self._busy_seconds / (uptime * self.workers)) if uptime > 0 else 0.0,
+            'enqueued': self.enqueued,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed,
+            'avg_wait_seconds': (self._wait_total / picked_up) if picked_up else 0.0,
+            'max_wait_seconds': self._wait_max,
+            'last_wait_seconds': self._wait_last
+        }
@@ -0,0 +1,224 @@
+"""
+Rolling Upload Statistics for Telegram Upload Bot
+1h / 24h / 7d counters over telegram_uploads kept as bucketed ring windows with running totals:
+seeded once from a server-side aggregate, then moved by the upload pipeline as rows are logged
+and change status, so /stats reads them in constant time instead of scanning a week of rows
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ('pending', 'processing', 'retrying', 'completed', 'failed')
+FIELDS = ('uploads', 'bytes') + STATUSES + ('processing_seconds', 'timed')
+_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+# name -> (bucket width in seconds, buckets); rows are attributed to the bucket of their created_at
+WINDOWS = {
+    '1h': (60, 60),
+    '24h': (3600, 24),
+    '7d': (3600, 168),
+}
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """Epoch seconds from a PostgREST timestamptz string (or a number)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+class _Window:
+    """Running totals over the last `size` buckets of `width` seconds"""
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.size = size
+        self.numbers = [-1] * size  # bucket number held by each slot
+        self.buckets = [[0.0] * len(FIELDS) for _ in range(size)]
+        self.totals = [0.0] * len(FIELDS)
+        self._current = -1
+
+    def advance(self, now: float):
+        """Drop buckets that slid out of the window (at most one pass over the ring)"""
+        current = int(now // self.width)
+        if current <= self._current:
+            return
+        for number in range(max(self._current + 1, current - self.size + 1), current + 1):
+            slot = number % self.size
+            bucket = self.buckets[slot]
+            if self.numbers[slot] >= 0:
+                for i, value in enumerate(bucket):
+                    if value:
+                        self.totals[i] -= value
+                        bucket[i] = 0.0
+            self.numbers[slot] = number
+        self._current = current
+
+    def add(self, number: int, deltas: Dict[int, float]):
+        """Apply deltas to bucket `number` (ignored once it is outside the window)"""
+        # A created_at slightly ahead of the local clock counts in the newest bucket
+        number = min(number, self._current)
+        if number <= self._current - self.size:
+            return
+        bucket = self.buckets[number % self.size]
+        for i, value in deltas.items():
+            bucket[i] += value
+            self.totals[i] += value
+
+    def clear(self):
+        self.numbers = [-1] * self.size
+        self.buckets = [[0.0] * len(FIELDS) for _ in range(self.size)]
+        self.totals = [0.0] * len(FIELDS)
+        self._current = -1
+
+class RollingUploadStats:
+    """Upload counts per window, updated as uploads are logged and change status
+
+    Status changes move a row's count between statuses in the bucket it was
+    created in, so every window matches "rows created in the window, by
+    current status". Only rows this process logged, seeded or read are
+    tracked; changes to other rows are counted in `untracked`.
+    """
+
+    def __init__(self, max_tracked: int = 5000):
+        self.windows = {name: _Window(width, size) for name, (width, size) in WINDOWS.items()}
+        self.max_tracked = max(1, max_tracked)
+        # upload_id -> [created_ts, status, processing seconds counted for it]
+        self._rows: 'OrderedDict[str, list]' = OrderedDict()
+
+        self.seeded_at: Optional[float] = None
+        self.events = 0
+        self.untracked = 0
+
+    def _apply(self, created_ts: float, deltas: Dict[str, float], now: Optional[float] = None):
+        now = now if now is not None else time.time()
+        indexed = {_INDEX[name]: value for name, value in deltas.items() if value}
+        for window in self.windows.values():
+            window.advance(now)
+            window.add(int(created_ts // window.width), indexed)
+
+    def _remember(self, upload_id: str, created_ts: float, status: str, elapsed: float = 0.0):
+        self._rows[upload_id] = [created_ts, status, elapsed]
+        self._rows.move_to_end(upload_id)
+        while len(self._rows) > self.max_tracked:
+            self._rows.popitem(last=False)
+
+    def created(self, upload_id: str, status: str, file_size: Optional[int] = None, created_at: Any = None):
+        """Count a telegram_uploads row logged by this process"""
+        created_ts = parse_timestamp(created_at) or time.time()
+        deltas = {'uploads': 1, 'bytes': file_size or 0}
+        if status in STATUSES:
+            deltas[status] = 1
+        self._apply(created_ts, deltas)
+        self._remember(upload_id, created_ts, status)
+        self.events += 1
+
+    def transition(self, upload_id: str, status: str):
+        """Move a tracked row to a new status"""
+        row = self._rows.get(upload_id)
+        if row is None:
+            self.untracked += 1
+            return
+        created_ts, previous, elapsed = row
+        if previous == status:
+            return
+
+        now = time.time()
+        deltas: Dict[str, float] = {}
+        if previous in STATUSES:
+            deltas[previous] = -1
+        if status in STATUSES:
+            deltas[status] = 1
+        if previous == 'completed' and elapsed:
+            deltas['processing_seconds'] = -elapsed
+            deltas['timed'] = -1
+            elapsed = 0.0
+        if status == 'completed':
+            elapsed = max(0.0, now - created_ts)
+            deltas['processing_seconds'] = elapsed
+            deltas['timed'] = 1
+        self._apply(created_ts, deltas, now)
+        self._remember(upload_id, created_ts, status, elapsed)
+        self.events += 1
+
+    def track(self, row: Optional[Dict[str, Any]]):
+        """Start tracking a row read from the database so its later status changes count"""
+        if not row or not row.get('id') or row['id'] in self._rows:
+            return
+        created_ts = parse_timestamp(row.get('created_at'))
+        if created_ts is None or created_ts <= time.time() - self.span:
+            return
+        elapsed = 0.0
+        if row.get('upload_status') == 'completed':
+            processed_ts = parse_timestamp(row.get('processed_at'))
+            elapsed = max(0.0, processed_ts - created_ts) if processed_ts else 0.0
+        self._remember(row['id'], created_ts, row.get('upload_status'), elapsed)
+
+    def load(self, buckets: Iterable[Tuple[str, List[Dict[str, Any]]]], open_rows: Iterable[Dict[str, Any]] = ()):
+        """Replace all counters with server-side aggregates
+
+        `buckets` maps a window name to aggregate rows of that window's
+        bucket width ({'bucket': n, 'uploads': ..., 'completed': ...});
+        `open_rows` are unfinished rows to track.
+        """
+        now = time.time()
+        for window in self.windows.values():
+            window.clear()
+            window.advance(now)
+        for name, rows in buckets:
+            window = self.windows[name]
+            for row in rows:
+                window.add(int(row['bucket']), {
+                    i: float(row.get(field) or 0) for i, field in enumerate(FIELDS) if row.get(field)
+                })
+
+        self._rows.clear()
+        for row in open_rows:
+            self.track(row)
+        self.seeded_at = now
+
+    @property
+    def span(self) -> float:
+        return max(width * size for width, size in WINDOWS.values())
+
+    def window(self, name: str) -> Dict[str, Any]:
+        """Counts for one window ('1h', '24h' or '7d')"""
+        window = self.windows[name]
+        window.advance(time.time())
+        totals = dict(zip(FIELDS, window.totals))
+        uploads = max(0, round(totals['uploads']))
+        counts = {status: max(0, round(totals[status])) for status in STATUSES}
+        timed = max(0, round(totals['timed']))
+        total_bytes = max(0.0, totals['bytes'])
+        return {
+            'total_uploads': uploads,
+            'successful_uploads': counts['completed'],
+            'failed_uploads': counts['failed'],
+            'processing_uploads': counts['processing'],
+            'pending_uploads': counts['pending'],
+            'retrying_uploads': counts['retrying'],
+            'success_rate': counts['completed'] / uploads * 100 if uploads else 0,
+            'total_size_gb': total_bytes / (1024 * 1024 * 1024),
+            'avg_size_mb': total_bytes / uploads / (1024 * 1024) if uploads else 0,
+            'avg_processing_time': totals['processing_seconds'] / timed if timed else 0
+        }
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self.window(name) for name in self.windows}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'seeded': self.seeded_at is not None,
+            'seed_age_seconds': round(time.time() - self.seeded_at, 1) if self.seeded_at else None,
+            'tracked_rows': len(self._rows),
+            'events': self.events,
+            'untracked': self.untracked
+        }
@@ -0,0 +1,161 @@
+"""
+Upload Write Buffer for Telegram Upload Bot
+Write-behind buffer for telegram_uploads updates: field changes are coalesced per row and written
+in one batch (update_telegram_uploads RPC) on a short timer or once enough rows are pending.
+Writes that something depends on right away are flushed synchronously by the caller.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def _is_rejection(error: Exception) -> bool:
+    """The database refused the request itself (4xx) rather than being unreachable"""
+    status = getattr(error, 'status_code', None) or 0
+    return 400 <= status < 500 and status not in (408, 429)
+
+class UploadWriteBuffer:
+    """Pending telegram_uploads field updates keyed by row id (later values win)"""
+
+    def __init__(self, client, interval: float = 1.0, max_rows: int = 50, max_attempts: int = 3):
+        self.client = client
+        self.interval = max(0.05, interval)
+        self.max_rows = max(1, max_rows)
+        self.max_attempts = max(1, max_attempts)
+
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._attempts: Dict[str, int] = {}  # upload_id -> rejected single-row writes
+        self._lock = asyncio.Lock()  # one batch in flight at a time
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.updates = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.rows_written = 0
+        self.sync_flushes = 0
+        self.errors = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the timer and write whatever is still pending"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def update(self, upload_id: str, fields: Dict[str, Any]):
+        """Queue field updates for one row"""
+        row = self._pending.get(upload_id)
+        if row is None:
+            row = self._pending[upload_id] = {}
+        else:
+            self.coalesced += 1
+        row.update(fields)
+        self.updates += 1
+        if len(self._pending) >= self.max_rows:
+            self._wakeup.set()
+
+    def pending(self, upload_id: Optional[str] = None) -> bool:
+        return upload_id in self._pending if upload_id else bool(self._pending)
+
+    async def flush(self, sync: bool = False) -> bool:
+        """Write all pending rows in one batch; failed rows stay queued for the next flush
+
+        The RPC applies a batch all-or-nothing, so when the database rejects
+        one (a 4xx, e.g. a bad id or a constraint) its rows are written one
+        by one and a row rejected `max_attempts` times is dropped. Other
+        errors (network, 5xx) re-queue the whole batch.
+        """
+        async with self._lock:
+            if not self._pending:
+                return True
+            batch, self._pending = self._pending, {}
+            if sync:
+                self.sync_flushes += 1
+            try:
+                await self._write(batch)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error writing {len(batch)} buffered upload updates: {e}")
+                if not _is_rejection(e):
+                    self._requeue(batch)
+                    return False
+                return await self._write_rows(batch)
+            self._written(batch)
+            return True
+
+    async def _write(self, rows: Dict[str, Dict[str, Any]]):
+        await self.client.rpc('update_telegram_uploads', {
+            'p_rows': [{'id': upload_id, **fields} for upload_id, fields in rows.items()]
+        }).execute()
+
+    async def _write_rows(self, batch: Dict[str, Dict[str, Any]]) -> bool:
+        """Write a rejected batch row by row so one bad row cannot hold back the rest"""
+        ok = True
+        rows = list(batch.items())
+        for i, (upload_id, fields) in enumerate(rows):
+            try:
+                await self._write({upload_id: fields})
+            except Exception as e:
+                ok = False
+                if not _is_rejection(e):
+                    # The database went away mid-pass: keep this and the remaining rows for later
+                    self._requeue(dict(rows[i:]))
+                    break
+                attempts = self._attempts.get(upload_id, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(upload_id, None)
+                    self.dropped += 1
+                    logger.error(f"Dropping buffered update for upload {upload_id} after {attempts} rejected writes: {fields} ({e})")
+                else:
+                    self._attempts[upload_id] = attempts
+                    self._requeue({upload_id: fields})
+                continue
+            self._written({upload_id: fields})
+        return ok
+
+    def _written(self, rows: Dict[str, Dict[str, Any]]):
+        self.batches += 1
+        self.rows_written += len(rows)
+        for upload_id in rows:
+            self._attempts.pop(upload_id, None)
+
+    def _requeue(self, rows: Dict[str, Dict[str, Any]]):
+        # Updates queued while the write was in flight are newer and win
+        for upload_id, fields in rows.items():
+            self._pending[upload_id] = {**fields, **self._pending.get(upload_id, {})}
+
+    async def _flush_loop(self):
+        while True:
+            # Not wait_for, which can lose stop()'s cancel when a wakeup lands at the same moment
+            waiter = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=self.interval)
+            finally:
+                waiter.cancel()
+            self._wakeup.clear()
+            await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self._pending),
+            'updates': self.updates,
+            'coalesced': self.coalesced,
+            'batches': self.batches,
+            'rows_written': self.rows_written,
+            'sync_flushes': self.sync_flushes,
+            'errors': self.errors,
+            'dropped': self.dropped
+        }
@@ -0,0 +1,33 @@
+"""
+Shared pytest setup: the userbot modules import each other as top-level packages
+(`from utils.x import ...`), so tests run with telegram_userbot/ on the path.
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'telegram_userbot'))
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        "clock(module, attribute='time', start=1_000_000.0): "
+        "replace module.time with a fake whose `attribute` ('time' or 'monotonic') reads the clock fixture"
+    )
+
+def _clock_marker(module, attribute: str = 'time', start: float = 1_000_000.0):
+    return module, attribute, start
+
+@pytest.fixture
+def clock(request, monkeypatch):
+    """Controllable clock for the module named by the test's `clock` marker; advance it via `.value`"""
+    marker = request.node.get_closest_marker('clock')
+    if marker is None:
+        raise pytest.UsageError('the clock fixture needs a pytest.mark.clock(module, attribute) marker')
+    module, attribute, start = _clock_marker(*marker.args, **marker.kwargs)
+    now = SimpleNamespace(value=float(start))
+    monkeypatch.setattr(module, 'time', SimpleNamespace(**{attribute: lambda: now.value}))
+    return now
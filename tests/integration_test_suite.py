@@ -13,6 +13,10 @@ from datetime import datetime, timedelta
 from typing import Dict, List
 import aiohttp
 import subprocess
+import sys
+
+# The bot's own Supabase client (telegram_userbot/utils)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'telegram_userbot'))
 
 class ProductionTestSuite:
     def __init__(self):
@@ -111,16 +115,19 @@ class ProductionTestSuite:
     async def test_database_connectivity(self) -> Dict:
         """Test Supabase database connectivity and basic operations"""
         try:
-            from supabase import create_client
+            from utils.supabase_rest import AsyncSupabaseClient
             
-            supabase = create_client(
+            supabase = AsyncSupabaseClient(
                 os.getenv('SUPABASE_URL'),
                 os.getenv('SUPABASE_SERVICE_ROLE_KEY')
             )
             
             # Test basic query
             start_time = asyncio.get_event_loop().time()
-            result = await supabase.table('profiles').select('count').limit(1).execute()
+            try:
+                result = await supabase.table('profiles').select('id').limit(1).execute()
+            finally:
+                await supabase.aclose()
             end_time = asyncio.get_event_loop().time()
             
             query_time = (end_time - start_time) * 1000
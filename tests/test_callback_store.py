@@ -0,0 +1,94 @@
+"""
+CallbackStore: LRU eviction, timer-wheel expiry and persistence across restarts
+"""
+
+import pytest
+
+from utils import callback_store
+from utils.callback_store import CallbackStore
+
+pytestmark = pytest.mark.clock(callback_store)
+
+def test_evicts_least_recently_used(clock):
+    store = CallbackStore(max_entries=2)
+    store.put('a', {'id': 1})
+    store.put('b', {'id': 2})
+    assert store.get('a') == {'id': 1}
+    store.put('c', {'id': 3})
+    assert store.get('b') is None
+    assert store.get('a') == {'id': 1}
+    assert store.get('c') == {'id': 3}
+    assert store.evicted == 1
+    assert len(store) == 2
+
+def test_expired_entries_miss_before_the_wheel_turns(clock):
+    store = CallbackStore(ttl=120, slot_seconds=60)
+    store.put('a', 'payload')
+    clock.value += 120
+    assert store.get('a') is None
+    assert store.misses == 1
+
+def test_expire_drops_only_due_entries(clock):
+    store = CallbackStore(ttl=600, slot_seconds=60)
+    store.put('short', 1, ttl=60)
+    store.put('long', 2)
+    clock.value += 61
+    assert store.expire() == 1
+    assert store.get('short') is None
+    assert store.get('long') == 2
+    assert store.get_stats()['expired'] == 1
+
+def test_restore_with_new_expiry_survives_old_bucket(clock):
+    store = CallbackStore(ttl=600, slot_seconds=60)
+    store.put('a', 1, ttl=60)
+    store.put('a', 2, ttl=300)
+    clock.value += 120
+    assert store.expire() == 0
+    assert store.get('a') == 2
+
+def test_long_pause_expires_everything_in_one_turn(clock):
+    store = CallbackStore(ttl=300, slot_seconds=60)
+    for i in range(5):
+        store.put(str(i), i)
+    clock.value += 86400
+    assert store.expire() == 5
+    assert len(store) == 0
+
+def test_delete(clock):
+    store = CallbackStore()
+    store.put('a', 1)
+    store.delete('a')
+    store.delete('missing')
+    assert store.get('a') is None
+
+def test_persists_across_restarts_in_lru_order(clock, tmp_path):
+    path = tmp_path / 'callbacks.db'
+    store = CallbackStore(str(path), max_entries=2, ttl=600)
+    store.open()
+    store.put('a', {'id': 1})
+    clock.value += 1
+    store.put('b', {'id': 2})
+    clock.value += 1
+    store.get('a')
+    store.close()
+
+    reopened = CallbackStore(str(path), max_entries=1, ttl=600)
+    reopened.open()
+    # Only the most recently used entry fits the smaller cap
+    assert len(reopened) == 1
+    assert reopened.get('a') == {'id': 1}
+    assert reopened.get('b') is None
+    reopened.close()
+
+def test_reopen_skips_expired_rows(clock, tmp_path):
+    path = tmp_path / 'callbacks.db'
+    store = CallbackStore(str(path), ttl=60)
+    store.open()
+    store.put('a', 1)
+    store.close()
+
+    clock.value += 61
+    reopened = CallbackStore(str(path), ttl=60)
+    reopened.open()
+    assert len(reopened) == 0
+    reopened.close()
@@ -0,0 +1,78 @@
+"""
+CircuitBreaker state machine: closed -> open -> half-open -> closed / open
+"""
+
+import pytest
+
+from utils import circuit_breaker
+from utils.circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+
+pytestmark = pytest.mark.clock(circuit_breaker, 'monotonic')
+
+def trip(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker('regular', failure_threshold=3, recovery_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert breaker.trips == 1
+
+def test_success_resets_the_failure_streak(clock):
+    breaker = CircuitBreaker('regular', failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+
+def test_open_circuit_fails_fast_until_recovery_timeout(clock):
+    breaker = CircuitBreaker('regular', failure_threshold=2, recovery_timeout=60)
+    trip(breaker)
+    assert not breaker.available()
+    assert not breaker.allow_request()
+    assert breaker.rejected == 1
+    assert breaker.get_stats()['retry_in_seconds'] == pytest.approx(60)
+
+    clock.value += 59
+    assert not breaker.allow_request()
+    clock.value += 1
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.available()
+
+def test_half_open_admits_limited_probes(clock):
+    breaker = CircuitBreaker('regular', failure_threshold=1, recovery_timeout=10, half_open_max_calls=2)
+    trip(breaker)
+    clock.value += 10
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    assert not breaker.available()
+
+def test_successful_probe_closes_the_circuit(clock):
+    breaker = CircuitBreaker('regular', failure_threshold=1, recovery_timeout=10)
+    trip(breaker)
+    clock.value += 10
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+
+def test_failed_probe_reopens_for_another_timeout(clock):
+    breaker = CircuitBreaker('regular', failure_threshold=1, recovery_timeout=10)
+    trip(breaker)
+    clock.value += 10
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert breaker.trips == 2
+    clock.value += 9
+    assert not breaker.allow_request()
+    clock.value += 1
+    assert breaker.allow_request()
@@ -0,0 +1,117 @@
+"""
+Streaming tee uploads to several Doodstream pool accounts: one read of the source,
+per-account upload slots held before reading, open circuits skipped
+"""
+
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+import doodstream_client
+from doodstream_client import DoodAccount, dood_stream_upload_to
+
+CHUNK = b'x' * 1024
+
+class FakeUploads:
+    """Upload endpoint per api key; uploads block on `gate` once they have read their first chunk"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.active = Counter()
+        self.peak = Counter()
+        self.received = Counter()
+
+    async def post(self, server, content, headers, extensions=None):
+        key = server.rsplit('/', 1)[-1]
+        self.active[key] += 1
+        self.peak[key] = max(self.peak[key], self.active[key])
+        try:
+            async for part in content:
+                self.received[key] += len(part)
+                await self.gate.wait()
+        finally:
+            self.active[key] -= 1
+        return SimpleNamespace(json=lambda: {'status': 200, 'result': [{'filecode': f'{key}-code'}]})
+
+class Source:
+    """Chunk stream that records whether anything read it"""
+
+    def __init__(self, chunks: int = 8):
+        self.chunks = chunks
+        self.started = False
+
+    async def __aiter__(self):
+        self.started = True
+        for _ in range(self.chunks):
+            await asyncio.sleep(0)
+            yield CHUNK
+
+@pytest.fixture
+def pool(monkeypatch):
+    accounts = {label: DoodAccount(label, f'key-{label}', concurrency=1) for label in ('acc1', 'acc2')}
+    uploads = FakeUploads()
+
+    async def upload_server(api_key):
+        return f'https://upload.example/{api_key}'
+
+    monkeypatch.setattr(doodstream_client, 'get_account', accounts.get)
+    monkeypatch.setattr(doodstream_client, '_get_upload_server', upload_server)
+    monkeypatch.setattr(doodstream_client, '_uploads', lambda: uploads)
+    return SimpleNamespace(accounts=accounts, uploads=uploads)
+
+async def until(condition, timeout: float = 5.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.001)
+    await asyncio.wait_for(poll(), timeout)
+
+def test_concurrent_tees_take_every_slot_before_reading(pool):
+    async def scenario():
+        first, second = Source(), Source()
+        a = asyncio.create_task(dood_stream_upload_to(['acc1', 'acc2'], first.__aiter__(), 'a.mp4'))
+        await until(lambda: pool.uploads.active['key-acc1'] and pool.uploads.active['key-acc2'])
+        b = asyncio.create_task(dood_stream_upload_to(['acc2', 'acc1'], second.__aiter__(), 'b.mp4'))
+        await asyncio.sleep(0.05)
+        # The second tee waits for its slots without pulling chunks it could not deliver
+        assert not second.started
+        pool.uploads.gate.set()
+        return await asyncio.wait_for(asyncio.gather(a, b), 5)
+
+    first, second = asyncio.run(scenario())
+    for results in (first, second):
+        assert [(label, r['success']) for label, r in results] == [(label, True) for label, _ in results]
+    size = 8 * len(CHUNK)
+    # Both accounts got both files in full, one upload at a time
+    for key in ('key-acc1', 'key-acc2'):
+        assert pool.uploads.peak[key] == 1
+        assert pool.uploads.received[key] > 2 * size
+    assert all(account.slots._value == 1 for account in pool.accounts.values())
+
+def test_open_circuit_account_is_skipped_without_taking_a_slot(pool):
+    breaker = pool.accounts['acc2'].breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    pool.uploads.gate.set()
+
+    results = dict(asyncio.run(dood_stream_upload_to(['acc1', 'acc2'], Source().__aiter__(), 'a.mp4')))
+    assert results['acc1']['success']
+    assert results['acc2']['circuit_open']
+    assert pool.uploads.received['key-acc2'] == 0
+
+def test_cancelled_tee_hands_back_its_slots(pool):
+    async def scenario():
+        holder = asyncio.create_task(dood_stream_upload_to(['acc2'], Source().__aiter__(), 'a.mp4'))
+        await until(lambda: pool.uploads.active['key-acc2'])
+        # Holds acc1, waits for acc2
+        waiting = asyncio.create_task(dood_stream_upload_to(['acc1', 'acc2'], Source().__aiter__(), 'b.mp4'))
+        await until(lambda: pool.accounts['acc1'].slots.locked())
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert not pool.accounts['acc1'].slots.locked()
+        pool.uploads.gate.set()
+        await holder
+
+    asyncio.run(scenario())
+    assert all(account.slots._value == 1 for account in pool.accounts.values())
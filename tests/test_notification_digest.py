@@ -0,0 +1,111 @@
+"""
+Admin notification digests: events within the window are coalesced into one message
+per admin, the first critical failure goes out at once, and close() sends what is pending
+"""
+
+import asyncio
+
+from utils.telegram_bot import TelegramNotificationBot
+
+ADMINS = [{'telegram_user_id': 101}, {'telegram_user_id': 102}]
+
+class FakeSupabase:
+    def __init__(self):
+        self.logged = []
+
+    async def get_admin_telegram_accounts(self):
+        return ADMINS
+
+    async def log_admin_notification(self, data):
+        self.logged.append(data)
+
+class FakeTelegram:
+    def __init__(self, hold_first: bool = False):
+        self.messages = []
+        self.sending = asyncio.Event()
+        self.release = asyncio.Event()
+        self._hold_first = hold_first
+
+    async def send_message(self, chat_id, text, reply_markup=None, parse_mode=None):
+        if self._hold_first:
+            self._hold_first = False
+            self.sending.set()
+            await self.release.wait()
+        self.messages.append((chat_id, text, reply_markup))
+
+def failure(failure_id: str, **errors) -> dict:
+    return {'id': failure_id, 'error_details': {'file_info': {'original_name': f'{failure_id}.mp4'}, **errors}}
+
+def success(name: str) -> dict:
+    return {'file_info': {'original_name': name}, 'group_name': 'Group'}
+
+def make_bot(client, window: float) -> TelegramNotificationBot:
+    return TelegramNotificationBot(client, FakeSupabase(), digest_window=window)
+
+def test_events_in_a_window_become_one_digest_per_admin():
+    async def scenario():
+        client = FakeTelegram()
+        bot = make_bot(client, 0.05)
+        for i in range(3):
+            await bot.notify_upload_success(success(f'ok{i}.mp4'))
+        await bot.notify_upload_failure(failure('f1', regular_error='timeout'))
+        await bot.notify_upload_failure(failure('f2', premium_error='quota'))
+        await asyncio.sleep(0.2)
+        return client, bot
+
+    client, bot = asyncio.run(scenario())
+    assert sorted(chat_id for chat_id, _, _ in client.messages) == [101, 102]
+    text, keyboard = client.messages[0][1], client.messages[0][2]
+    assert '**Failed:** 2' in text and '**Uploaded:** 3' in text
+    assert keyboard is not None
+    assert bot.get_stats()['digests_sent'] == 1
+    assert bot.get_stats()['coalesced'] == 5
+    assert bot.supabase.logged[0]['notification_type'] == 'upload_failure_digest'
+
+def test_first_critical_failure_is_sent_at_once():
+    async def scenario():
+        client = FakeTelegram()
+        bot = make_bot(client, 3600)
+        await bot.notify_upload_failure(failure('f1', regular_error='down', premium_error='down'))
+        immediate = len(client.messages)
+        await bot.notify_upload_failure(failure('f2', regular_error='down', premium_error='down'))
+        await bot.close()
+        return client, bot, immediate
+
+    client, bot, immediate = asyncio.run(scenario())
+    assert immediate == len(ADMINS)
+    assert bot.immediate_alerts == 1
+    # The repeat waited for the digest, which close() sent
+    assert len(client.messages) == 2 * len(ADMINS)
+    assert 'Upload Digest' in client.messages[-1][1]
+
+def test_close_cancels_the_timer_and_sends_the_pending_digest():
+    async def scenario():
+        client = FakeTelegram()
+        bot = make_bot(client, 3600)
+        await bot.notify_upload_success(success('ok.mp4'))
+        timer = bot._digest_task
+        await asyncio.wait_for(bot.close(), 1)
+        return client, bot, timer
+
+    client, bot, timer = asyncio.run(scenario())
+    assert timer.cancelled()
+    assert len(client.messages) == len(ADMINS)
+    assert bot.get_stats()['digest_pending'] == 0
+
+def test_close_waits_for_a_digest_already_being_sent():
+    async def scenario():
+        client = FakeTelegram(hold_first=True)
+        bot = make_bot(client, 0.01)
+        await bot.notify_upload_success(success('ok.mp4'))
+        await asyncio.wait_for(client.sending.wait(), 1)
+        closing = asyncio.create_task(bot.close())
+        await asyncio.sleep(0.05)
+        assert not closing.done()
+        client.release.set()
+        await asyncio.wait_for(closing, 1)
+        return client
+
+    client = asyncio.run(scenario())
+    # Sent once to each admin: neither cut short nor repeated by close()
+    assert sorted(chat_id for chat_id, _, _ in client.messages) == [101, 102]
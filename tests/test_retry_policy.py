@@ -0,0 +1,56 @@
+"""
+Upload failure classification and per-class retry decisions
+"""
+
+import pytest
+
+from utils.retry_policy import (
+    PERMANENT, THROTTLED, TRANSIENT,
+    FailureClassification, RetryEngine, RetryPolicy, classify_failure
+)
+
+@pytest.mark.parametrize('result, category', [
+    (None, TRANSIENT),
+    ({'success': False, 'error': 'Read timed out', 'exception_type': 'ReadTimeout'}, TRANSIENT),
+    ({'success': False, 'error': 'Bad gateway', 'status_code': 502}, TRANSIENT),
+    ({'success': False, 'error': 'something odd'}, TRANSIENT),
+    ({'success': False, 'error': 'slow down', 'status_code': 429}, THROTTLED),
+    ({'success': False, 'error': 'Rate limit exceeded'}, THROTTLED),
+    ({'success': False, 'error': 'busy', 'retry_after': '12'}, THROTTLED),
+    ({'success': False, 'error': 'Invalid API key'}, PERMANENT),
+    ({'success': False, 'error': 'nope', 'status_code': 413}, PERMANENT),
+    # A provider's own error outranks the wrapping status
+    ({'success': False, 'error': 'Dual upload failed', 'status_code': 500,
+      'regular_result': {'success': False, 'error': 'File too large'}}, PERMANENT),
+])
+def test_classify_failure(result, category):
+    assert classify_failure(result).category == category
+
+def test_classify_keeps_retry_after():
+    classification = classify_failure({'success': False, 'error': 'busy', 'status_code': 429, 'retry_after': '45'})
+    assert classification.retry_after == 45.0
+
+def test_transient_failures_back_off_within_the_policy_ceiling():
+    engine = RetryEngine({TRANSIENT: RetryPolicy(max_attempts=4, base_delay=4.0, max_delay=10.0)})
+    transient = FailureClassification(TRANSIENT, 'timeout')
+    for attempt, ceiling in ((1, 4.0), (2, 8.0), (3, 10.0)):
+        delay = engine.decide(transient, attempt)
+        assert ceiling / 2 <= delay <= ceiling
+    assert engine.decide(transient, 4) is None
+    assert engine.get_stats()['retries'] == 3
+    assert engine.dead_lettered == 1
+
+def test_throttled_failures_wait_for_retry_after_up_to_max_delay():
+    engine = RetryEngine()
+    assert engine.decide(FailureClassification(THROTTLED, '429', retry_after=42.0), 1) == 42.0
+    assert engine.decide(FailureClassification(THROTTLED, '429', retry_after=10_000.0), 1) == 300.0
+
+def test_permanent_failures_are_dead_lettered_at_once():
+    engine = RetryEngine()
+    assert engine.decide(FailureClassification(PERMANENT, 'invalid key'), 1, attempt_seconds=2.0) is None
+    stats = engine.get_stats()
+    assert stats['dead_lettered'] == 1
+    assert stats['decisions'][PERMANENT] == 1
+    # The old fixed loop would have made two more attempts with 5s and 10s sleeps
+    assert stats['attempts_saved'] == 2
+    assert stats['seconds_saved'] == pytest.approx(5 + 10 + 2 * 2.0)
@@ -0,0 +1,338 @@
+"""
+Shared upload job queue against a local Postgres (UPLOAD_MODE=shared)
+
+Runs the queue migration in a scratch database and checks claim, lease expiry,
+heartbeats and release under FOR UPDATE SKIP LOCKED, both through the SQL
+functions and through SharedUploadQueue workers.
+
+    pip install "psycopg[binary]" pytest
+    TEST_DATABASE_URL=postgresql://postgres@localhost:5432/postgres pytest tests/test_shared_upload_queue.py
+
+Skipped when TEST_DATABASE_URL is not set.
+"""
+
+import asyncio
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+psycopg = pytest.importorskip('psycopg')
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+
+from utils.shared_upload_queue import SharedUploadQueue
+from utils.supabase_client import SupabaseManager
+from utils.upload_stats import RollingUploadStats
+from utils.upload_write_buffer import UploadWriteBuffer
+
+DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+MIGRATIONS = Path(__file__).resolve().parent.parent / 'supabase' / 'migrations'
+QUEUE_MIGRATION = next(MIGRATIONS.glob('20261017100000_*.sql'))
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason='TEST_DATABASE_URL not set')
+
+# telegram_uploads as created by the base migration (without the videos foreign key)
+BASE_SCHEMA = """
+CREATE TABLE public.telegram_uploads (
+  id UUID NOT NULL DEFAULT gen_random_uuid() PRIMARY KEY,
+  telegram_file_id TEXT NOT NULL,
+  telegram_file_unique_id TEXT NOT NULL UNIQUE,
+  telegram_message_id BIGINT NOT NULL,
+  telegram_chat_id BIGINT NOT NULL,
+  telegram_user_id BIGINT NOT NULL,
+  original_filename TEXT,
+  file_size BIGINT,
+  mime_type TEXT,
+  video_id UUID,
+  doodstream_file_code TEXT,
+  upload_status TEXT NOT NULL DEFAULT 'pending',
+  error_message TEXT,
+  processed_at TIMESTAMP WITH TIME ZONE,
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+"""
+
+@pytest.fixture(scope='module')
+def queue_db():
+    """Scratch database with telegram_uploads and the queue migration applied"""
+    name = f"userbot_queue_test_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(DATABASE_URL, autocommit=True) as admin:
+        admin.execute(f'CREATE DATABASE {name}')
+    url = make_conninfo(DATABASE_URL, dbname=name)
+    try:
+        with psycopg.connect(url, autocommit=True) as conn:
+            conn.execute(BASE_SCHEMA)
+            conn.execute(QUEUE_MIGRATION.read_text())
+        yield url
+    finally:
+        with psycopg.connect(DATABASE_URL, autocommit=True) as admin:
+            admin.execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+
+@pytest.fixture
+def db(queue_db):
+    with psycopg.connect(queue_db, autocommit=True, row_factory=dict_row) as conn:
+        conn.execute('TRUNCATE public.telegram_uploads')
+        yield conn
+
+def enqueue(conn, file_unique_id: str) -> dict:
+    return conn.execute('SELECT * FROM public.enqueue_telegram_upload(%s)', (Jsonb({
+        'telegram_file_id': f'file-{file_unique_id}',
+        'telegram_file_unique_id': file_unique_id,
+        'telegram_message_id': 1,
+        'telegram_chat_id': -100,
+        'telegram_user_id': 7,
+        'original_filename': f'{file_unique_id}.mp4',
+        'file_size': 1024,
+        'mime_type': 'video/mp4',
+        'job_payload': {'file_info': {'file_unique_id': file_unique_id}, 'source': {}}
+    }),)).fetchone()
+
+def claim(conn, worker_id: str, limit: int = 1, lease_seconds: int = 300, max_attempts: int = 3) -> list:
+    return conn.execute(
+        'SELECT * FROM public.claim_telegram_upload_jobs(%s, %s, %s, %s)',
+        (worker_id, limit, lease_seconds, max_attempts)
+    ).fetchall()
+
+def heartbeat(conn, worker_id: str, ids: list, lease_seconds: int = 300) -> set:
+    rows = conn.execute(
+        'SELECT * FROM public.heartbeat_telegram_upload_jobs(%s, %s::uuid[], %s)',
+        (worker_id, [str(i) for i in ids], lease_seconds)
+    ).fetchall()
+    return {row['upload_id'] for row in rows}
+
+def release(conn, worker_id: str, ids: list) -> int:
+    return conn.execute(
+        'SELECT public.release_telegram_upload_jobs(%s, %s::uuid[]) AS released',
+        (worker_id, [str(i) for i in ids])
+    ).fetchone()['released']
+
+def row(conn, upload_id) -> dict:
+    return conn.execute('SELECT * FROM public.telegram_uploads WHERE id = %s', (upload_id,)).fetchone()
+
+def expire_lease(conn, upload_id):
+    conn.execute("UPDATE public.telegram_uploads SET lease_expires_at = now() - interval '1 second' WHERE id = %s", (upload_id,))
+
+# ---- SQL functions ----
+
+def test_enqueue_is_idempotent_per_file(db):
+    first = enqueue(db, 'a')
+    second = enqueue(db, 'a')
+    assert first['created'] is True
+    assert second == {'upload_id': first['upload_id'], 'created': False}
+    assert db.execute('SELECT count(*) AS n FROM public.telegram_uploads').fetchone()['n'] == 1
+
+def test_claim_takes_oldest_jobs_under_a_lease(db):
+    ids = [enqueue(db, f'f{i}')['upload_id'] for i in range(3)]
+    claimed = claim(db, 'w1', limit=2)
+    assert {r['id'] for r in claimed} == set(ids[:2])
+    for r in claimed:
+        assert r['upload_status'] == 'processing'
+        assert r['claimed_by'] == 'w1'
+        assert r['claim_attempts'] == 1
+        assert r['lease_expires_at'] > datetime.now(r['lease_expires_at'].tzinfo)
+    assert row(db, ids[2])['upload_status'] == 'pending'
+
+def test_claim_skips_rows_locked_by_another_claimer(queue_db, db):
+    ids = {enqueue(db, f'f{i}')['upload_id'] for i in range(6)}
+    with psycopg.connect(queue_db, row_factory=dict_row) as holder, \
+         psycopg.connect(queue_db, autocommit=True, row_factory=dict_row) as other:
+        # holder claims inside an open transaction, so its rows stay locked
+        held = {r['id'] for r in claim(holder, 'w1', limit=3)}
+        other.execute("SET statement_timeout = '2s'")
+        taken = {r['id'] for r in claim(other, 'w2', limit=10)}
+        holder.commit()
+    assert len(held) == 3 and len(taken) == 3
+    assert held.isdisjoint(taken)
+    assert held | taken == ids
+
+def test_parallel_claimers_get_each_job_once(queue_db, db):
+    ids = {enqueue(db, f'f{i}')['upload_id'] for i in range(60)}
+    claimed = []
+    lock = threading.Lock()
+
+    def drain(worker_id: str):
+        with psycopg.connect(queue_db, autocommit=True, row_factory=dict_row) as conn:
+            while True:
+                rows = claim(conn, worker_id, limit=3)
+                if not rows:
+                    return
+                with lock:
+                    claimed.extend(r['id'] for r in rows)
+
+    threads = [threading.Thread(target=drain, args=(f'w{i}',)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    assert sorted(claimed) == sorted(ids)
+
+def test_expired_lease_is_reclaimed_and_old_worker_loses_it(db):
+    upload_id = enqueue(db, 'a')['upload_id']
+    claim(db, 'w1')
+    assert claim(db, 'w2') == []  # lease still valid
+
+    expire_lease(db, upload_id)
+    reclaimed = claim(db, 'w2')
+    assert [r['id'] for r in reclaimed] == [upload_id]
+    assert reclaimed[0]['claim_attempts'] == 2
+
+    assert heartbeat(db, 'w1', [upload_id]) == set()
+    assert heartbeat(db, 'w2', [upload_id]) == {upload_id}
+
+def test_job_fails_once_its_leases_expire_max_attempts_times(db):
+    upload_id = enqueue(db, 'a')['upload_id']
+    for attempt in range(2):
+        assert claim(db, f'w{attempt}', max_attempts=2)
+        expire_lease(db, upload_id)
+
+    assert claim(db, 'w9', max_attempts=2) == []
+    failed = row(db, upload_id)
+    assert failed['upload_status'] == 'failed'
+    assert failed['claimed_by'] is None
+    assert 'after 2 attempts' in failed['error_message']
+
+def test_heartbeat_extends_only_own_leases(db):
+    upload_id = enqueue(db, 'a')['upload_id']
+    claim(db, 'w1', lease_seconds=60)
+    before = row(db, upload_id)['lease_expires_at']
+
+    assert heartbeat(db, 'w2', [upload_id], lease_seconds=600) == set()
+    assert row(db, upload_id)['lease_expires_at'] == before
+
+    assert heartbeat(db, 'w1', [upload_id], lease_seconds=600) == {upload_id}
+    assert (row(db, upload_id)['lease_expires_at'] - before).total_seconds() > 500
+
+def test_release_hands_only_own_jobs_back(db):
+    ids = [enqueue(db, f'f{i}')['upload_id'] for i in range(2)]
+    claim(db, 'w1', limit=2)
+
+    assert release(db, 'w2', ids) == 0
+    assert release(db, 'w1', ids) == 2
+    for upload_id in ids:
+        released = row(db, upload_id)
+        assert released['upload_status'] == 'pending'
+        assert released['claimed_by'] is None
+        assert released['claim_attempts'] == 0
+    assert len(claim(db, 'w2', limit=5)) == 2
+
+# ---- SharedUploadQueue workers ----
+
+class PgRpcClient:
+    """Stands in for the PostgREST client: rpc(name, params).execute() calls the SQL function"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def rpc(self, function: str, params=None):
+        return _PgRpc(self.conn, function, params or {})
+
+class _PgRpc:
+    def __init__(self, conn, function: str, params: dict):
+        self.conn = conn
+        self.function = function
+        self.params = params
+
+    @staticmethod
+    def _adapt(value):
+        if isinstance(value, dict):
+            return Jsonb(value)
+        if isinstance(value, list):
+            return [uuid.UUID(str(v)) for v in value]  # the queue functions' arrays are UUID[]
+        return value
+
+    @staticmethod
+    def _json(value):
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    async def execute(self):
+        args = ', '.join(f'{name} => %({name})s' for name in self.params)
+        async with self.conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(f'SELECT * FROM public.{self.function}({args})',
+                              {name: self._adapt(v) for name, v in self.params.items()})
+            rows = [{k: self._json(v) for k, v in r.items()} for r in await cur.fetchall()]
+        # Scalar functions come back as the bare value, as PostgREST returns them
+        if len(rows) == 1 and list(rows[0]) == [self.function]:
+            return SimpleNamespace(data=rows[0][self.function])
+        return SimpleNamespace(data=rows)
+
+def make_manager(conn) -> SupabaseManager:
+    manager = SupabaseManager.__new__(SupabaseManager)
+    manager.client = PgRpcClient(conn)
+    manager.upload_stats = RollingUploadStats()
+    manager.upload_writes = UploadWriteBuffer(manager.client)
+    return manager
+
+async def run_workers(queue_db: str, count: int, worker):
+    conns = [await psycopg.AsyncConnection.connect(queue_db, autocommit=True) for _ in range(count)]
+    queues = [
+        SharedUploadQueue(make_manager(conn), worker, f'w{i}', concurrency=2, poll_interval=0.05)
+        for i, conn in enumerate(conns)
+    ]
+    return conns, queues
+
+def test_workers_share_jobs_without_running_any_twice(queue_db, db):
+    ids = {str(enqueue(db, f'f{i}')['upload_id']) for i in range(20)}
+
+    async def scenario():
+        ran = []
+        done = asyncio.Event()
+
+        async def worker(job):
+            ran.append(job['id'])
+            await asyncio.sleep(0.01)
+            if len(ran) == len(ids):
+                done.set()
+
+        conns, queues = await run_workers(queue_db, 3, worker)
+        try:
+            for queue in queues:
+                queue.start()
+            await asyncio.wait_for(done.wait(), 15)
+        finally:
+            for queue in queues:
+                await queue.stop()
+            for conn in conns:
+                await conn.close()
+        return ran, queues
+
+    ran, queues = asyncio.run(scenario())
+    assert sorted(ran) == sorted(ids)
+    assert sum(q.claimed for q in queues) == len(ids)
+    assert all(q.get_stats()['lost_leases'] == 0 for q in queues)
+
+def test_stop_releases_running_jobs_to_the_queue(queue_db, db):
+    ids = {str(enqueue(db, f'f{i}')['upload_id']) for i in range(2)}
+
+    async def scenario():
+        started = []
+
+        async def worker(job):
+            started.append(job['id'])
+            await asyncio.sleep(3600)
+
+        conns, queues = await run_workers(queue_db, 1, worker)
+        queue = queues[0]
+        try:
+            queue.start()
+            while len(started) < 2:
+                await asyncio.sleep(0.01)
+            await queue.stop()
+        finally:
+            await conns[0].close()
+        return queue
+
+    queue = asyncio.run(asyncio.wait_for(scenario(), 15))
+    assert queue.released == 2
+    statuses = db.execute('SELECT upload_status, claimed_by FROM public.telegram_uploads').fetchall()
+    assert statuses == [{'upload_status': 'pending', 'claimed_by': None}] * len(ids)
@@ -0,0 +1,79 @@
+"""
+TieredRingStore: raw ring wrap-around, minute/hour rollups and tier selection
+"""
+
+import pytest
+
+from utils.timeseries import TieredRingStore
+
+T0 = 1_800_000_000.0  # a whole hour
+
+def filled(count: int, step: float, **capacities) -> TieredRingStore:
+    store = TieredRingStore(('cpu', 'queue'), **capacities)
+    for i in range(count):
+        store.append({'cpu': float(i), 'queue': None if i % 2 else i}, timestamp=T0 + i * step)
+    return store
+
+def test_summary_over_raw_samples():
+    store = filled(10, 10.0)
+    summary = store.summary(1000, now=T0 + 90)
+    assert summary['resolution'] == 'raw'
+    cpu = summary['fields']['cpu']
+    assert (cpu['count'], cpu['min'], cpu['max'], cpu['avg']) == (10, 0.0, 9.0, 4.5)
+    # Missing values are skipped, not counted as zero
+    assert summary['fields']['queue']['count'] == 5
+    assert summary['fields']['queue']['avg'] == pytest.approx(4.0)
+
+def test_window_only_counts_recent_samples():
+    store = filled(10, 10.0)
+    cpu = store.summary(30, now=T0 + 90)['fields']['cpu']
+    assert (cpu['count'], cpu['min'], cpu['max']) == (4, 6.0, 9.0)
+
+def test_raw_ring_keeps_the_newest_samples_in_order():
+    store = filled(7, 10.0, raw_capacity=4)
+    assert len(store) == 4
+    assert [value for _, value in store.series('cpu', 30, now=T0 + 60)] == [3.0, 4.0, 5.0, 6.0]
+    assert store.latest()['cpu'] == 6.0
+    assert store.latest()['queue'] == 6.0
+    assert [row['cpu'] for _, row in store.since(T0 + 40)] == [5.0, 6.0]
+
+def test_long_windows_fall_back_to_minute_rollups():
+    # Three minutes of 10s samples with room for only six raw samples
+    store = filled(18, 10.0, raw_capacity=6)
+    summary = store.summary(180, now=T0 + 179)
+    assert summary['resolution'] == '1m'
+    cpu = summary['fields']['cpu']
+    # The open minute bucket is included, so the rollup still sees every sample
+    assert (cpu['count'], cpu['min'], cpu['max']) == (18, 0.0, 17.0)
+    assert cpu['avg'] == pytest.approx(8.5)
+    assert store.series('cpu', 180, now=T0 + 179) == [(T0, 2.5), (T0 + 60, 8.5), (T0 + 120, 14.5)]
+
+def test_minute_buckets_roll_into_hours():
+    store = filled(3 * 60 + 1, 60.0, raw_capacity=2, minute_capacity=10)
+    assert store.get_stats()['hours'] == 2
+    summary = store.summary(4 * 3600, now=T0 + 3 * 3600)
+    assert summary['resolution'] == '1h'
+    # Hours fold in closed minutes; the newest minute is still open in the minute tier
+    assert summary['fields']['cpu']['count'] == 3 * 60
+
+def test_clock_stepping_back_keeps_rings_ordered():
+    store = TieredRingStore(('cpu',))
+    store.append({'cpu': 1}, timestamp=T0 + 10)
+    store.append({'cpu': 2}, timestamp=T0)
+    assert [ts for ts, _ in store.series('cpu', 100, now=T0 + 10)] == [T0 + 10, T0 + 10]
+
+def test_trend_and_empty_store():
+    store = TieredRingStore(('cpu',))
+    assert store.latest() is None
+    assert store.trend('cpu', 60, now=T0) == 0.0
+    assert store.summary(60, now=T0)['fields']['cpu']['avg'] is None
+    for i in range(4):
+        store.append({'cpu': i * 3}, timestamp=T0 + i)
+    assert store.trend('cpu', 60, now=T0 + 3) == pytest.approx(9 / 4)
+
+def test_memory_is_allocated_up_front():
+    store = TieredRingStore(('cpu', 'queue'), raw_capacity=10, minute_capacity=10, hour_capacity=10)
+    before = store.memory_bytes()
+    for i in range(1000):
+        store.append({'cpu': i, 'queue': i}, timestamp=T0 + i)
+    assert store.memory_bytes() == before
@@ -0,0 +1,146 @@
+"""
+Group uploads on the bounded worker pool: jobs run on at most `workers` workers, a full
+queue turns jobs away, stop() cancels in-flight jobs, and the handler's cached checks
+keep messages that would be refused anyway out of the queue
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from handlers.upload_handler import UploadHandler
+from utils.upload_queue import UploadQueue
+
+class Jobs:
+    """Worker callable whose jobs block on `gate`; job 'boom' raises"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.running = 0
+        self.peak = 0
+        self.done = []
+
+    async def __call__(self, job):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await self.gate.wait()
+            if job == 'boom':
+                raise RuntimeError('upload failed')
+            self.done.append(job)
+        finally:
+            self.running -= 1
+
+async def until(condition, timeout: float = 5.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.001)
+    await asyncio.wait_for(poll(), timeout)
+
+def test_workers_run_jobs_up_to_the_pool_size():
+    async def scenario():
+        jobs = Jobs()
+        queue = UploadQueue(jobs, workers=2, maxsize=10)
+        queue.start()
+        for job in ('a', 'b', 'boom', 'c'):
+            assert queue.submit(job)
+        await until(lambda: jobs.running == 2)
+        busy = queue.get_stats()
+        jobs.gate.set()
+        await until(lambda: queue.completed + queue.failed == 4)
+        await queue.stop()
+        return jobs, queue, busy
+
+    jobs, queue, busy = asyncio.run(scenario())
+    assert jobs.peak == 2
+    assert (busy['busy_workers'], busy['queue_depth']) == (2, 2)
+    assert sorted(jobs.done) == ['a', 'b', 'c']
+    stats = queue.get_stats()
+    assert (stats['enqueued'], stats['completed'], stats['failed']) == (4, 3, 1)
+    assert stats['busy_workers'] == 0
+    assert stats['max_wait_seconds'] > 0
+
+def test_full_queue_rejects_without_waiting():
+    async def scenario():
+        queue = UploadQueue(Jobs(), workers=1, maxsize=2)
+        # Not started: nothing drains the queue
+        return queue, [queue.submit(job) for job in ('a', 'b', 'c')]
+
+    queue, accepted = asyncio.run(scenario())
+    assert accepted == [True, True, False]
+    stats = queue.get_stats()
+    assert (stats['queue_depth'], stats['queue_capacity'], stats['rejected']) == (2, 2, 1)
+
+def test_stop_cancels_in_flight_jobs():
+    async def scenario():
+        jobs = Jobs()
+        queue = UploadQueue(jobs, workers=1, maxsize=10)
+        queue.start()
+        queue.submit('a')
+        queue.submit('b')
+        await until(lambda: jobs.running == 1)
+        await asyncio.wait_for(queue.stop(), 1)
+        return jobs, queue
+
+    jobs, queue = asyncio.run(scenario())
+    assert not queue.is_running
+    assert jobs.running == 0 and jobs.done == []
+    assert queue.get_stats()['queue_depth'] == 1
+
+class FakeMembership:
+    def __init__(self, premium_groups, admins):
+        self.premium_groups = premium_groups
+        self.admins = admins
+
+    async def is_premium_group(self, chat_id):
+        return chat_id in self.premium_groups
+
+    async def is_admin(self, telegram_user_id):
+        return telegram_user_id in self.admins
+
+class FakeIndex:
+    ready = True
+
+    def __init__(self, uploaded):
+        self.uploaded = uploaded
+
+    def might_contain(self, file_unique_id):
+        return file_unique_id in self.uploaded
+
+    def contains(self, file_unique_id):
+        return file_unique_id in self.uploaded
+
+def message(message_id: int, chat_id: int = -100, user_id: int = 7, file_unique_id: str = None, media: bool = True):
+    video = SimpleNamespace(file_unique_id=file_unique_id or f'file-{message_id}')
+    return SimpleNamespace(
+        id=message_id,
+        chat=SimpleNamespace(id=chat_id),
+        from_user=SimpleNamespace(id=user_id),
+        video=video if media else None,
+        document=None
+    )
+
+def test_group_uploads_are_filtered_before_queueing():
+    handler = UploadHandler(
+        None,
+        upload_workers=1,
+        upload_queue_size=1,
+        membership_cache=FakeMembership(premium_groups={-100}, admins={7}),
+        duplicate_index=FakeIndex(uploaded={'seen'})
+    )
+
+    async def scenario():
+        for msg in (
+            message(1, media=False),
+            message(2, chat_id=-200),
+            message(3, user_id=8),
+            message(4, file_unique_id='seen'),
+            message(5),
+            message(6),
+        ):
+            await handler.handle_group_upload(None, msg)
+
+    asyncio.run(scenario())
+    stats = handler.get_queue_stats()
+    # Messages 1-4 never reach the queue; 6 finds it full behind 5
+    assert (stats['filtered_messages'], stats['enqueued'], stats['dropped_messages']) == (4, 1, 1)
+    assert handler.upload_queue._queue.get_nowait()[1][2].id == 5
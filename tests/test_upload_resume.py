@@ -0,0 +1,146 @@
+"""
+Upload pipeline resumed from the upload journal: each journaled stage is skipped,
+and the telegram_uploads row still ends up 'completed' with its file code and video_id
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from handlers.upload_handler import UploadHandler
+from utils.supabase_client import SupabaseManager
+from utils.upload_journal import UploadJournal, STAGE_LOGGED, STAGE_RECORDED, STAGE_UPLOADED
+from utils.upload_stats import RollingUploadStats
+from utils.upload_write_buffer import UploadWriteBuffer
+
+FILE_INFO = {
+    'file_id': 'tg-file-1',
+    'file_unique_id': 'uniq-1',
+    'original_name': 'clip.mp4',
+    'random_filename': 'abc123_clip.mp4',
+    'file_size': 50 * 1024 * 1024,
+    'file_size_mb': 50.0,
+    'mime_type': 'video/mp4',
+    'duration': 120
+}
+SOURCE = {'chat_id': -100, 'chat_title': 'Group', 'user_id': 7, 'message_id': 42}
+UPLOADED = {'success': True, 'file_code': 'reg-code', 'premium_file_code': 'prem-code'}
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+        self.status_code = 200
+        self.headers = {}
+
+    async def execute(self):
+        return self
+
+class FakePostgrest:
+    """The parts of AsyncSupabaseClient the pipeline touches, over in-memory tables"""
+
+    def __init__(self):
+        self.uploads = {}
+        self.videos = []
+        self.invocations = 0
+        self.functions = SimpleNamespace(invoke=self._invoke)
+
+    def _invoke(self, function, body):
+        self.invocations += 1
+        return _Result({
+            'success': True,
+            'regular_result': {'file_code': 'new-reg-code'},
+            'premium_result': {'file_code': 'new-prem-code'}
+        })
+
+    def rpc(self, function, params):
+        assert function == 'update_telegram_uploads'
+        for row in params['p_rows']:
+            self.uploads[row['id']].update({k: v for k, v in row.items() if k != 'id'})
+        return _Result(len(params['p_rows']))
+
+    def table(self, name):
+        assert name == 'videos'
+        return SimpleNamespace(insert=self._insert_video)
+
+    def _insert_video(self, video):
+        self.videos.append(video)
+        return _Result([{'id': f'video-{len(self.videos)}'}])
+
+class FakeTelegram:
+    def __init__(self):
+        self.reactions = []
+
+    async def send_reaction(self, chat_id, message_id, emoji):
+        self.reactions.append(emoji)
+
+def make_manager(client: FakePostgrest) -> SupabaseManager:
+    manager = SupabaseManager.__new__(SupabaseManager)
+    manager.client = client
+    manager.upload_stats = RollingUploadStats()
+    manager.upload_writes = UploadWriteBuffer(client, interval=3600)
+    return manager
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = UploadJournal(str(tmp_path / 'journal.db'))
+    journal.open()
+    yield journal
+    journal.close()
+
+def interrupted_at(journal: UploadJournal, stage: str, postgrest: FakePostgrest) -> dict:
+    """Journal and telegram_uploads as a crash after `stage` leaves them (buffered writes lost)"""
+    postgrest.uploads['upload-1'] = {'upload_status': 'processing', 'doodstream_file_code': None, 'video_id': None}
+    journal.begin(FILE_INFO['file_unique_id'], FILE_INFO, SOURCE)
+    journal.advance(FILE_INFO['file_unique_id'], STAGE_LOGGED, upload_id='upload-1')
+    if stage in (STAGE_UPLOADED, STAGE_RECORDED):
+        journal.advance(FILE_INFO['file_unique_id'], STAGE_UPLOADED, doodstream_result=UPLOADED)
+    if stage == STAGE_RECORDED:
+        postgrest.videos.append({'file_code': UPLOADED['file_code']})
+        journal.advance(FILE_INFO['file_unique_id'], STAGE_RECORDED, video_id='video-1')
+    [entry] = journal.unfinished()
+    return entry
+
+def resume(journal: UploadJournal, postgrest: FakePostgrest, entry: dict) -> bool:
+    async def scenario():
+        manager = make_manager(postgrest)
+        manager.upload_writes.start()  # buffered like in production: only flushed writes land
+        handler = UploadHandler(manager, upload_journal=journal)
+        try:
+            return await handler.resume_upload(FakeTelegram(), entry)
+        finally:
+            await manager.upload_writes.stop()
+    return asyncio.run(scenario())
+
+@pytest.mark.parametrize('stage, file_code, uploads', [
+    (STAGE_LOGGED, 'new-reg-code', 1),
+    (STAGE_UPLOADED, 'reg-code', 0),
+    (STAGE_RECORDED, 'reg-code', 0),
+])
+def test_resumed_job_completes_its_row(journal, stage, file_code, uploads):
+    postgrest = FakePostgrest()
+    entry = interrupted_at(journal, stage, postgrest)
+    assert resume(journal, postgrest, entry)
+
+    row = postgrest.uploads['upload-1']
+    assert row['upload_status'] == 'completed'
+    assert row['doodstream_file_code'] == file_code
+    assert row['video_id'] == 'video-1'
+    # Finished stages are not redone
+    assert postgrest.invocations == uploads
+    assert len(postgrest.videos) == 1
+    assert journal.pending_count() == 0
+
+def test_resume_gives_up_after_repeated_interruptions(journal):
+    postgrest = FakePostgrest()
+    interrupted_at(journal, STAGE_UPLOADED, postgrest)
+    for _ in range(UploadHandler.MAX_JOURNAL_RESUMES):
+        journal.mark_resumed(FILE_INFO['file_unique_id'])
+
+    async def scenario():
+        handler = UploadHandler(make_manager(postgrest), upload_journal=journal)
+        return await handler.resume_unfinished_uploads(FakeTelegram())
+
+    assert asyncio.run(scenario()) == 0
+    assert postgrest.uploads['upload-1']['upload_status'] == 'failed'
+    assert journal.pending_count() == 0
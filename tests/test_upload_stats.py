@@ -0,0 +1,101 @@
+"""
+RollingUploadStats: windowed counts moved by created/transition events and seeded from aggregates
+"""
+
+import pytest
+
+from utils import upload_stats
+from utils.upload_stats import RollingUploadStats, parse_timestamp
+
+T0 = 1_800_000_000.0  # a whole hour
+
+pytestmark = pytest.mark.clock(upload_stats, start=T0)
+
+def test_parse_timestamp():
+    assert parse_timestamp('2027-01-15T08:00:00Z') == parse_timestamp('2027-01-15T08:00:00+00:00')
+    assert parse_timestamp(12) == 12.0
+    assert parse_timestamp(None) is None
+    assert parse_timestamp('not a date') is None
+
+def test_created_rows_count_in_every_window(clock):
+    stats = RollingUploadStats()
+    stats.created('a', 'pending', file_size=1024 * 1024)
+    stats.created('b', 'pending', file_size=3 * 1024 * 1024)
+    for name in ('1h', '24h', '7d'):
+        window = stats.window(name)
+        assert window['total_uploads'] == 2
+        assert window['pending_uploads'] == 2
+        assert window['avg_size_mb'] == pytest.approx(2.0)
+
+def test_transitions_move_counts_and_time_completions(clock):
+    stats = RollingUploadStats()
+    stats.created('a', 'pending')
+    stats.created('b', 'pending')
+    clock.value += 30
+    stats.transition('a', 'processing')
+    stats.transition('a', 'completed')
+    stats.transition('b', 'failed')
+    window = stats.window('1h')
+    assert window['total_uploads'] == 2
+    assert (window['pending_uploads'], window['successful_uploads'], window['failed_uploads']) == (0, 1, 1)
+    assert window['success_rate'] == 50
+    assert window['avg_processing_time'] == pytest.approx(30)
+
+def test_leaving_completed_removes_its_processing_time(clock):
+    stats = RollingUploadStats()
+    stats.created('a', 'processing')
+    clock.value += 10
+    stats.transition('a', 'completed')
+    stats.transition('a', 'retrying')
+    window = stats.window('1h')
+    assert (window['successful_uploads'], window['retrying_uploads']) == (0, 1)
+    assert window['avg_processing_time'] == 0
+
+def test_rows_slide_out_of_short_windows(clock):
+    stats = RollingUploadStats()
+    stats.created('a', 'completed')
+    clock.value += 2 * 3600
+    assert stats.window('1h')['total_uploads'] == 0
+    assert stats.window('24h')['total_uploads'] == 1
+    clock.value += 8 * 86400
+    assert stats.snapshot()['7d']['total_uploads'] == 0
+
+def test_status_changes_count_in_the_bucket_the_row_was_created_in(clock):
+    stats = RollingUploadStats()
+    stats.created('old', 'processing', created_at=T0 - 2 * 3600)
+    stats.transition('old', 'completed')
+    assert stats.window('1h')['successful_uploads'] == 0
+    assert stats.window('24h')['successful_uploads'] == 1
+
+def test_untracked_transitions_are_counted_not_applied(clock):
+    stats = RollingUploadStats(max_tracked=1)
+    stats.created('a', 'pending')
+    stats.created('b', 'pending')
+    stats.transition('a', 'completed')
+    assert stats.window('1h')['successful_uploads'] == 0
+    assert stats.get_stats()['untracked'] == 1
+
+def test_load_replaces_counters_and_tracks_open_rows(clock):
+    stats = RollingUploadStats()
+    stats.created('stale', 'pending')
+    minute = int(T0 // 60)
+    stats.load(
+        [('1h', [{'bucket': minute - 5, 'uploads': 3, 'bytes': 300, 'completed': 2, 'processing': 1,
+                  'processing_seconds': 20, 'timed': 2}])],
+        open_rows=[{'id': 'p', 'created_at': T0 - 300, 'upload_status': 'processing'}]
+    )
+    window = stats.window('1h')
+    assert (window['total_uploads'], window['successful_uploads'], window['processing_uploads']) == (3, 2, 1)
+    assert window['avg_processing_time'] == pytest.approx(10)
+    assert stats.window('24h')['total_uploads'] == 0
+
+    stats.transition('p', 'completed')
+    assert stats.window('1h')['successful_uploads'] == 3
+    assert stats.get_stats()['seeded']
+    assert stats.get_stats()['tracked_rows'] == 1
+
+def test_track_ignores_rows_older_than_the_longest_window(clock):
+    stats = RollingUploadStats()
+    stats.track({'id': 'ancient', 'created_at': T0 - 8 * 86400, 'upload_status': 'pending'})
+    stats.track({'id': 'recent', 'created_at': T0 - 60, 'upload_status': 'pending'})
+    assert stats.get_stats()['tracked_rows'] == 1